@@ -2,14 +2,37 @@
 UCU Study Room Reservation System - Flask Web Application
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, Response, stream_with_context, has_request_context
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import logging
+import math
+import secrets
+from time import perf_counter
 from datetime import datetime, date, timedelta
-from main import DatabaseManager, DataInitializer
+from main import DatabaseManager, recurrence_slots
+from db_config import load_db_config, save_db_config
+from migrate import pending_migrations, SchemaOutdated
 from database_service import DatabaseService
+from token_cache import TokenCache
+from password_hasher import PasswordHasher, LoginThrottle, HasherBusy
+from signed_tokens import TokenSigner
+from reservation_finalizer import ReservationFinalizer
+from report_snapshots import ReportSnapshotEngine
+from maintenance import MaintenanceScheduler, purge_expired_tokens, purge_old_sanctions, purge_idempotency_keys
+from pagination import clamp_page_size
+from export_data import EXPORT_FORMATS, stream_export, export_filename
+from query_stats import QueryStats
+from metrics import registry as metrics
+from mysql.connector import Error as DatabaseError
 
 app = Flask(__name__)
+# Number of reverse proxies in front of the app whose X-Forwarded-For is trusted
+# (request.remote_addr then is the client's address instead of the proxy's)
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 # Configure session lifetime for permanent sessions (7 days)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
@@ -17,107 +40,319 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 # Database configuration - will be set dynamically
 DB_CONFIG = {}
 
-# Global database manager and service (will be initialized after DB_CONFIG is set)
+# Connection pool settings (DB_POOL_SIZE=0 keeps the single shared connection)
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', '0')),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    'pool_max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+}
+
+# Per-process database manager and service, created by init_db() in the process
+# that serves requests (each WSGI worker opens its own, see _reset_after_fork)
 db = None
 db_service = None
-
-
-def get_db_config():
-    """Prompt user for database configuration"""
-    # Check for environment variables first (Docker mode)
-    if os.environ.get('DB_HOST'):
-        config = {
-            'host': os.environ.get('DB_HOST', 'db'),
-            'user': os.environ.get('DB_USER', 'root'),
-            'password': os.environ.get('DB_PASSWORD', 'rootpassword'),
-            'database': os.environ.get('DB_NAME', 'UCU_SalasDeEstudio')
-        }
-        print("\n" + "="*60)
-        print("Database Configuration")
-        print("="*60)
-        print("\nUsing environment variables for database connection...")
-        return config
-    
-    # Built-in default credentials
-    builtin_config = {
-        'host': '127.0.0.1',
-        'user': 'root',
-        'password': 'rootpassword',
-        'database': 'UCU_SalasDeEstudio'
-    }
-    
-    # Check if stdin is available (not running in background/non-interactive mode)
-    import sys
-    if not sys.stdin.isatty():
-        # Non-interactive mode - use built-in credentials
-        print("\n" + "="*60)
-        print("Database Configuration")
-        print("="*60)
-        print("\nNon-interactive mode detected. Using built-in credentials...")
-        return builtin_config
-    
+# Phase timings (ms) of this process's first init_db(), see /admin/db/startup
+startup_report = {}
+
+# Validated access tokens, shared across reconnects
+token_cache = TokenCache(
+    max_entries=int(os.environ.get('TOKEN_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('TOKEN_CACHE_TTL', '60')),
+    flush_interval=float(os.environ.get('TOKEN_TOUCH_FLUSH_INTERVAL', '30'))
+)
+
+# TOKEN_MODE=signed replaces the access_token lookup with HMAC-signed cookies checked in
+# memory (key TOKEN_SECRET, else SECRET_KEY); other workers' revocations (logout, deleted
+# participants) are re-read every TOKEN_REVOCATION_REFRESH seconds. Default: db
+TOKEN_MODE = os.environ.get('TOKEN_MODE', 'db')
+token_signer = None
+if TOKEN_MODE == 'signed':
+    token_signer = TokenSigner((os.environ.get('TOKEN_SECRET') or app.secret_key).encode('utf-8'))
+TOKEN_REVOCATION_REFRESH = float(os.environ.get('TOKEN_REVOCATION_REFRESH', '30'))
+
+# bcrypt runs in PASSWORD_HASH_WORKERS processes per worker (0 = on the request thread);
+# past PASSWORD_HASH_MAX_PENDING queued calls logins are told to retry instead of waiting
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('PASSWORD_HASH_ROUNDS', '12')),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+)
+
+# Failed logins per email (and, if LOGIN_IP_MAX_FAILURES is set, per client address)
+# before a growing lockout. The address limit is off by default: behind the campus NAT
+# or a proxy without TRUSTED_PROXIES every user shares one address. Counted per worker
+login_throttle = LoginThrottle(
+    max_failures=int(os.environ.get('LOGIN_MAX_FAILURES', '5')),
+    ip_max_failures=int(os.environ.get('LOGIN_IP_MAX_FAILURES', '0')),
+    lockout=float(os.environ.get('LOGIN_LOCKOUT_SECONDS', '30'))
+)
+
+# Maximum age in seconds of the report snapshots: the maintenance thread recomputes the
+# older ones; report pages always read the stored copy (0 leaves it to cron / ?refresh=1)
+REPORT_MAX_AGE = float(os.environ.get('REPORT_SNAPSHOT_MAX_AGE', '300'))
+
+# Job closing reservations whose turno is over (interval 0 disables it)
+FINALIZER_CONFIG = {
+    'interval': float(os.environ.get('FINALIZER_INTERVAL', '300')),
+    'batch_size': int(os.environ.get('FINALIZER_BATCH_SIZE', '500')),
+    'grace_minutes': int(os.environ.get('FINALIZER_GRACE_MINUTES', '120')),
+    # Sanctions only for reservations from this date on (default: when migration 011 ran)
+    'since': date.fromisoformat(os.environ['FINALIZER_SINCE']) if os.environ.get('FINALIZER_SINCE') else None
+}
+finalizer = None
+
+# Housekeeping run by the maintenance thread of each process (see maintenance.py);
+# an interval of 0 disables a job. Sanctions are kept forever unless
+# SANCTION_RETENTION_DAYS is set
+MAINTENANCE_CONFIG = {
+    'token_interval': float(os.environ.get('TOKEN_CLEANUP_INTERVAL', '300')),
+    'sanction_interval': float(os.environ.get('SANCTION_CLEANUP_INTERVAL', '86400')),
+    'sanction_retention_days': int(os.environ.get('SANCTION_RETENTION_DAYS', '0')),
+    'idempotency_interval': float(os.environ.get('IDEMPOTENCY_CLEANUP_INTERVAL', '3600')),
+    'idempotency_ttl_hours': int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24')),
+    'batch_size': int(os.environ.get('MAINTENANCE_BATCH_SIZE', '1000'))
+}
+maintenance = None
+
+# Rows per page on the admin list pages (overridable with ?page_size=)
+ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', '50'))
+
+# Per-statement/per-endpoint query counters; statements slower than SLOW_QUERY_MS
+# are logged with their EXPLAIN plan (to SLOW_QUERY_LOG if set, else stderr)
+query_stats = QueryStats(slow_ms=float(os.environ.get('SLOW_QUERY_MS', '200')))
+if os.environ.get('SLOW_QUERY_LOG'):
+    _slow_handler = logging.FileHandler(os.environ['SLOW_QUERY_LOG'])
+    _slow_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logging.getLogger('ucu.slow_queries').addHandler(_slow_handler)
+
+# /metrics in Prometheus text format. Multiple worker processes share their values
+# through METRICS_DIR; METRICS_TOKEN, if set, is required as a Bearer token.
+# Without a token it is open on the development server only: create_app()
+# closes it unless METRICS_PUBLIC=1.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+metrics_public = True
+metrics.configure(os.environ.get('METRICS_DIR'),
+                  flush_interval=float(os.environ.get('METRICS_FLUSH_INTERVAL', '5')))
+
+
+def prompt_db_config():
+    """Ask for the database settings (python app.py --configure); saved for later runs"""
+    current = load_db_config()
     print("\n" + "="*60)
     print("Database Configuration")
     print("="*60)
-    print("\nChoose an option:")
-    print("1. Use built-in access credentials")
-    print("2. Input new credentials")
-    
-    while True:
-        try:
-            choice = input("\nEnter your choice (1 or 2): ").strip()
-        except (EOFError, KeyboardInterrupt):
-            # If input is not available, default to built-in credentials
-            print("\nInput not available. Using built-in credentials...")
-            return builtin_config
-        
-        if choice == '1':
-            print("\nUsing built-in credentials...")
-            return builtin_config
-        elif choice == '2':
-            print("\nPlease enter database credentials (press Enter to use default):")
-            try:
-                host = input("Host (default: 100.100.101.1): ").strip() or '100.100.101.1'
-                user = input("User (default: root): ").strip() or 'root'
-                password = input("Password (default: 220505): ").strip() or '220505'
-                database = input("Database (default: UCU_SalasDeEstudio): ").strip() or 'UCU_SalasDeEstudio'
-            except (EOFError, KeyboardInterrupt):
-                print("\nInput interrupted. Using built-in credentials...")
-                return builtin_config
-            
-            return {
-                'host': host,
-                'user': user,
-                'password': password,
-                'database': database
-            }
-        else:
-            print("Invalid choice. Please enter 1 or 2.")
+    print("\nPlease enter database credentials (press Enter to keep the current value):")
+    try:
+        config = {
+            'host': input(f"Host (current: {current['host']}): ").strip() or current['host'],
+            'user': input(f"User (current: {current['user']}): ").strip() or current['user'],
+            'password': input("Password (Enter keeps the current one): ").strip() or current['password'],
+            'database': input(f"Database (current: {current['database']}): ").strip() or current['database']
+        }
+    except (EOFError, KeyboardInterrupt):
+        print("\nInput interrupted. Keeping the current settings...")
+        return current
+    print(f"✓ Saved to {save_db_config(config)}")
+    return config
 
 
 def init_db():
-    """Initialize database connection and service"""
+    """Connect this process and build its service; later calls only reconnect
+    
+    Never seeds or migrates (that is `python migrate.py --seed`), so a
+    reconnect after the server dropped the connection costs one connect.
+    Returns False if the database is unreachable and raises SchemaOutdated
+    if migrations are pending: request code never creates or alters tables.
+    """
     global db, db_service
+    started = perf_counter()
     
     # Initialize database manager if not already done
     if db is None:
-        db = DatabaseManager(**DB_CONFIG)
+        db = DatabaseManager(**DB_CONFIG, **POOL_CONFIG)
+        query_stats.attach(db)
+        db.add_listener(record_query_metric)
     
-    if not db.connection or not db.connection.is_connected():
+    if not db.is_connected():
         db.config.update(DB_CONFIG)
         if not db.connect():
+            metrics.inc('ucu_db_connects_total', ('failed',))
             return False
+        metrics.inc('ucu_db_connects_total', ('ok',))
+    
+    # Reconnect: keep the service and its caches
+    if db_service is not None:
+        return True
+    connected = perf_counter()
     
-    # Initialize database service
-    db_service = DatabaseService(db)
+    pending = pending_migrations(db)
+    if pending:
+        raise SchemaOutdated(f"{len(pending)} pending migration(s): {', '.join(pending)}. Run 'python migrate.py'")
+    if pending is None:
+        print("✗ Could not check for pending migrations")
+    checked = perf_counter()
     
-    # Initialize sample data if needed
-    initializer = DataInitializer(db)
-    initializer.check_and_populate()
+    db_service = DatabaseService(db, token_cache=token_cache, hasher=password_hasher,
+                                 token_signer=token_signer, revocation_refresh=TOKEN_REVOCATION_REFRESH)
+    start_maintenance()
+    finished = perf_counter()
     
+    startup_report.update({
+        'connect_ms': round((connected - started) * 1000, 1),
+        'migration_check_ms': round((checked - connected) * 1000, 1),
+        'service_ms': round((finished - checked) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1),
+        'pending_migrations': pending,
+    })
+    metrics.observe('ucu_startup_seconds', (), finished - started)
+    print(f"✓ Database ready in {startup_report['total_ms']:.0f} ms "
+          f"(connect {startup_report['connect_ms']:.0f} ms, migration check {startup_report['migration_check_ms']:.0f} ms, "
+          f"service {startup_report['service_ms']:.0f} ms)")
     return True
 
 
+def _reset_after_fork():
+    # A forked worker must open its own connections (sockets shared with the
+    # parent would interleave packets) and the parent's threads are not copied
+    global db, db_service, finalizer, maintenance
+    db = db_service = finalizer = maintenance = None
+    startup_report.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def create_app(db_config: dict = None):
+    """Application factory for WSGI servers (see wsgi.py and gunicorn.conf.py)
+    
+    Only records the configuration: no connection is opened here, so the
+    app can be imported before the server forks. Each worker process
+    connects in init_db(), from gunicorn's post_worker_init hook or on its
+    first request.
+    """
+    global metrics_public
+    DB_CONFIG.update(db_config or load_db_config())
+    metrics_public = os.environ.get('METRICS_PUBLIC', '0') == '1'
+    if not METRICS_TOKEN and not metrics_public:
+        print("✗ METRICS_TOKEN is not set: /metrics answers 403 (METRICS_PUBLIC=1 serves it without a token)")
+    if POOL_CONFIG['pool_size'] == 0:
+        print("✗ DB_POOL_SIZE=0: worker threads will share one connection; set it to the thread count")
+    return app
+
+
+def shutdown_worker():
+    """Stop this process's maintenance thread and write out what is still buffered"""
+    if maintenance is not None:
+        maintenance.stop()
+    if finalizer is not None:
+        finalizer.stop()
+    if db_service is not None:
+        db_service.flush_token_access(force=True)
+    password_hasher.close()
+    metrics.flush()
+    if db is not None:
+        db.disconnect()
+
+
+def record_query_metric(event):
+    """DatabaseManager listener feeding the per-route query histogram"""
+    endpoint = (request.endpoint or '-') if has_request_context() else '-'
+    if event['error']:
+        metrics.inc('ucu_db_query_errors_total', (endpoint,))
+    metrics.observe('ucu_db_query_duration_seconds', (endpoint,), event['duration_ms'] / 1000.0)
+
+
+def start_maintenance():
+    """Start the maintenance thread once per process, on its own connection"""
+    global finalizer, maintenance
+    if maintenance is not None:
+        return
+    scheduler = MaintenanceScheduler(db.spawn())
+    batch_size = MAINTENANCE_CONFIG['batch_size']
+    scheduler.add('tokens', lambda job_db: purge_expired_tokens(job_db, batch_size, scheduler.stopping),
+                  MAINTENANCE_CONFIG['token_interval'])
+    if token_signer is None:
+        def flush_token_access(job_db):
+            return db_service.flush_token_access(force=True, db=job_db) if db_service is not None else 0
+        
+        # Every worker has its own pending touches: not exclusive
+        scheduler.add('ultimo_acceso', flush_token_access, token_cache.flush_interval, exclusive=False)
+    scheduler.add('idempotencia', lambda job_db: purge_idempotency_keys(
+        job_db, MAINTENANCE_CONFIG['idempotency_ttl_hours'], batch_size, scheduler.stopping),
+        MAINTENANCE_CONFIG['idempotency_interval'])
+    if MAINTENANCE_CONFIG['sanction_retention_days'] > 0:
+        scheduler.add('sanciones', lambda job_db: purge_old_sanctions(
+            job_db, MAINTENANCE_CONFIG['sanction_retention_days'], batch_size, scheduler.stopping),
+            MAINTENANCE_CONFIG['sanction_interval'])
+    reports = ReportSnapshotEngine(scheduler.db)
+    
+    def refresh_reports(job_db):
+        timings = reports.refresh_all(max_age=REPORT_MAX_AGE)
+        failed = [nombre for nombre, elapsed in timings.items() if elapsed is None]
+        if failed:
+            raise DatabaseError(msg=f"report refresh failed: {', '.join(failed)}")
+        return len(timings)
+    
+    # Checked every minute at most, so a report is refreshed soon after it ages out
+    scheduler.add('reportes', refresh_reports, min(REPORT_MAX_AGE, 60.0))
+    if FINALIZER_CONFIG['interval'] > 0:
+        finalizer = ReservationFinalizer(scheduler.db, batch_size=FINALIZER_CONFIG['batch_size'],
+                                         grace_minutes=FINALIZER_CONFIG['grace_minutes'],
+                                         since=FINALIZER_CONFIG['since'])
+        
+        def on_run(result):
+            # Finalized reservations free their slots; let the index reload
+            if (result['finalizadas'] or result['sin_asistencia']) and db_service is not None:
+                db_service.availability.invalidate()
+        
+        def finalize(job_db):
+            result = finalizer.run()
+            if result['error']:
+                raise DatabaseError(msg=result['error'])
+            return result['finalizadas'] + result['sin_asistencia']
+        
+        finalizer.on_run = on_run
+        scheduler.add('finalizar_reservas', finalize, FINALIZER_CONFIG['interval'])
+    if not scheduler.jobs:
+        return
+    if not scheduler.db.connect():
+        print("✗ Maintenance database connection unavailable; every run will retry it")
+    maintenance = scheduler
+    maintenance.start()
+
+
+def list_request_args(*filtros):
+    """Filters, cursor and page size for an admin list page from the query string"""
+    values = {}
+    for nombre in filtros:
+        value = request.args.get(nombre, '').strip()
+        if not value:
+            continue
+        if nombre.startswith('fecha_'):
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                flash('Fecha de filtro inválida.', 'error')
+                continue
+        values[nombre] = value
+    return {
+        'filtros': values,
+        'cursor': request.args.get('cursor'),
+        'page_size': clamp_page_size(request.args.get('page_size'), ADMIN_PAGE_SIZE)
+    }
+
+
+def get_token_user():
+    """Validate the access_token cookie at most once per request"""
+    if 'token_user' not in g:
+        access_token = request.cookies.get('access_token')
+        g.token_user = None
+        if access_token and db_service is not None:
+            g.token_user = db_service.validate_access_token(access_token)
+    return g.token_user
+
+
 def login_required(f):
     """Decorator to require login"""
     @wraps(f)
@@ -151,7 +386,7 @@ def admin_required(f):
         
         if access_token:
             try:
-                token_user = db_service.validate_access_token(access_token)
+                token_user = get_token_user()
                 if token_user:
                     token_valid = True
                     is_admin_token = token_user.get('is_admin', False)
@@ -184,23 +419,39 @@ def admin_required(f):
     return decorated_function
 
 
+def schema_outdated_response(error: SchemaOutdated) -> Response:
+    """503 for requests reaching a worker whose database still needs migrate.py"""
+    print(f"✗ {error}")
+    return Response(f'Service unavailable: {error}\n', status=503, mimetype='text/plain')
+
+
 @app.before_request
 def before_request():
     """Initialize database before each request and check for access tokens"""
-    if db is None or not db.connection or not db.connection.is_connected():
-        init_db()
+    g.request_started = perf_counter()
+    query_stats.begin_request(request.endpoint)
+    # A worker that booted without the database reconnects here and may find it un-migrated
+    try:
+        if db is None or not db.is_connected():
+            init_db()
+    except SchemaOutdated as e:
+        return schema_outdated_response(e)
     
-    # Cleanup expired tokens periodically (every 100 requests, approximate)
-    # Only if db_service is initialized
-    if db_service is not None:
-        import random
-        if random.randint(1, 100) == 1:
-            db_service.cleanup_expired_tokens()
+    # In pooled mode, pin one connection to this request (released in teardown)
+    if db is not None and db.pool is not None:
+        try:
+            db.checkout()
+        except Exception as e:
+            # Statements will still try to borrow a connection individually
+            print(f"✗ Could not check out a database connection: {e}")
     
     # Ensure db_service is initialized before using it
     if db_service is None:
-        if not init_db():
-            return  # Can't proceed without database
+        try:
+            if not init_db():
+                return  # Can't proceed without database
+        except SchemaOutdated as e:
+            return schema_outdated_response(e)
     
     # If user is already in session, keep it (don't clear on first request after login)
     # Only validate/update from token if no session exists or if token is present
@@ -210,7 +461,7 @@ def before_request():
         # Session exists - validate token if present, but don't clear session if token is missing
         # (token might not be set yet on the first request after login)
         if access_token:
-            token_user = db_service.validate_access_token(access_token)
+            token_user = get_token_user()
             if token_user:
                 # Token is valid, update session with latest info
                 session['user'] = token_user
@@ -221,7 +472,7 @@ def before_request():
     else:
         # No session - try to restore from token
         if access_token:
-            token_user = db_service.validate_access_token(access_token)
+            token_user = get_token_user()
             if token_user:
                 # Token is valid, restore session
                 session['user'] = token_user
@@ -229,6 +480,25 @@ def before_request():
                 session.modified = True
 
 
+@app.after_request
+def after_request(response):
+    """Record the request latency by route"""
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe('ucu_http_request_duration_seconds',
+                        (request.endpoint or '-', request.method, str(response.status_code)),
+                        perf_counter() - started)
+    return response
+
+
+@app.teardown_request
+def teardown_request(exception=None):
+    """Return the request's pooled connection"""
+    query_stats.end_request()
+    if db is not None:
+        db.release()
+
+
 @app.route('/')
 def index():
     """Home page"""
@@ -252,17 +522,33 @@ def login():
             flash('Por favor, completa todos los campos.', 'error')
             return render_template('login.html')
         
+        # Locked out attempts are refused before any password hashing
+        client = request.remote_addr or '-'
+        retry_after = math.ceil(login_throttle.retry_after(email, client))
+        if retry_after:
+            metrics.inc('ucu_login_attempts_total', ('throttled',))
+            flash(f'Demasiados intentos fallidos. Intenta nuevamente en {retry_after} segundos.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+        
         # Ensure db_service is initialized
         if db_service is None:
             if not init_db():
                 flash('Error de conexión a la base de datos. Por favor, intenta nuevamente.', 'error')
                 return render_template('login.html')
         
-        user = db_service.login(email, password)
+        try:
+            user = db_service.login(email, password)
+        except HasherBusy:
+            metrics.inc('ucu_login_attempts_total', ('busy',))
+            flash('El servidor está ocupado, intenta nuevamente en unos segundos.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
+        
         if user:
+            login_throttle.success(email)
+            metrics.inc('ucu_login_attempts_total', ('ok',))
             # Generate access token
             is_admin = user.get('is_admin', False)
-            access_token = db_service.generate_access_token(user['ci'], is_admin)
+            access_token = db_service.generate_access_token(user['ci'], is_admin, user)
             
             if access_token:
                 # Set session and mark as permanent to ensure it's saved
@@ -289,6 +575,8 @@ def login():
             else:
                 flash('Error al generar token de acceso. Por favor, intenta nuevamente.', 'error')
         else:
+            login_throttle.failure(email, client)
+            metrics.inc('ucu_login_attempts_total', ('failed',))
             flash('Email o contraseña incorrectos.', 'error')
     
     return render_template('login.html')
@@ -316,7 +604,13 @@ def register():
             flash('Las contraseñas no coinciden.', 'error')
             return render_template('register.html', programas=db_service.get_programas())
         
-        if db_service.register(ci, nombre, apellido, email, password):
+        try:
+            registered = db_service.register(ci, nombre, apellido, email, password)
+        except HasherBusy:
+            flash('El servidor está ocupado, intenta nuevamente en unos segundos.', 'error')
+            return render_template('register.html', programas=db_service.get_programas()), 503, {'Retry-After': '2'}
+        
+        if registered:
             # Associate with program if provided
             if nombre_programa and id_facultad:
                 success, message = db_service.add_participante_program(ci, nombre_programa, int(id_facultad), rol)
@@ -337,6 +631,7 @@ def logout():
     # Revoke access token if present
     access_token = request.cookies.get('access_token')
     if access_token:
+        # Also evicts it from the token cache
         db_service.revoke_access_token(access_token)
     
     # Clear session
@@ -453,24 +748,23 @@ def view_rooms():
         except ValueError:
             flash('Fecha inválida.', 'error')
     
-    # Get all turnos to find the selected ones
+    # Look up the selected turnos in the reference cache
     turnos = db_service.get_turnos()
-    turnos_dict = {t['id_turno']: t for t in turnos}
     
     if id_turno_inicio:
         try:
-            turno_id = int(id_turno_inicio)
-            if turno_id in turnos_dict:
-                hora_inicio = turnos_dict[turno_id]['hora_inicio']
-        except (ValueError, KeyError):
+            turno = db_service.get_turno(int(id_turno_inicio))
+            if turno:
+                hora_inicio = turno['hora_inicio']
+        except ValueError:
             flash('Turno de inicio inválido.', 'error')
     
     if id_turno_fin:
         try:
-            turno_id = int(id_turno_fin)
-            if turno_id in turnos_dict:
-                hora_fin = turnos_dict[turno_id]['hora_fin']
-        except (ValueError, KeyError):
+            turno = db_service.get_turno(int(id_turno_fin))
+            if turno:
+                hora_fin = turno['hora_fin']
+        except ValueError:
             flash('Turno de fin inválido.', 'error')
     
     # Validate time range
@@ -491,6 +785,33 @@ def view_rooms():
                          fecha=fecha_str, id_turno_inicio=id_turno_inicio, id_turno_fin=id_turno_fin)
 
 
+@app.route('/rooms/alternatives')
+@login_required
+def room_alternatives():
+    """Nearest free slots to a requested sala/fecha/turno, as JSON - user-facing"""
+    try:
+        fecha = datetime.strptime(request.args.get('fecha', ''), "%Y-%m-%d").date()
+        id_turno = int(request.args.get('id_turno', ''))
+    except ValueError:
+        return jsonify({'error': 'fecha (YYYY-MM-DD) e id_turno son obligatorios'}), 400
+    nombre_sala = request.args.get('sala', '').strip()
+    edificio = request.args.get('edificio', '').strip()
+    if not edificio:
+        return jsonify({'error': 'edificio es obligatorio'}), 400
+    
+    user_role = db_service.get_user_role(session['user']['ci']) or {}
+    alternativas = db_service.find_free_alternatives(
+        nombre_sala, edificio, fecha, id_turno,
+        user_role.get('rol', 'alumno'), user_role.get('tipo', 'grado'),
+        k=min(request.args.get('k', 5, type=int), 50),
+        day_radius=min(request.args.get('dias', 3, type=int), 14),
+        capacidad_min=request.args.get('capacidad', 1, type=int)
+    )
+    return jsonify([{**a, 'fecha': a['fecha'].isoformat(),
+                     'hora_inicio': str(a['hora_inicio']), 'hora_fin': str(a['hora_fin'])}
+                    for a in alternativas])
+
+
 @app.route('/my-sanctions')
 @login_required
 def my_sanctions():
@@ -522,6 +843,11 @@ def cancel_my_reserva(id_reserva):
     return redirect(url_for('my_reservations'))
 
 
+def booking_form_key() -> str:
+    """Idempotency key for a booking form; a failed submit keeps the one it was sent with"""
+    return request.form.get('idempotency_key', '').strip()[:64] or secrets.token_urlsafe(16)
+
+
 @app.route('/make-appointment', methods=['GET', 'POST'])
 @login_required
 def make_appointment():
@@ -536,6 +862,7 @@ def make_appointment():
     rol = user_role.get('rol', 'alumno')
     tipo_programa = user_role.get('tipo', 'grado')
     salas = db_service.get_salas_for_user(rol, tipo_programa)
+    alternativas = []
     
     if request.method == 'POST':
         nombre_sala = request.form.get('nombre_sala', '').strip()
@@ -548,7 +875,8 @@ def make_appointment():
             flash('Por favor, completa todos los campos obligatorios.', 'error')
             return render_template('user/make_appointment.html', 
                                  salas=salas, 
-                                 turnos=db_service.get_turnos())
+                                 turnos=db_service.get_turnos(),
+                                 idempotency_key=booking_form_key())
         
         try:
             fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
@@ -559,26 +887,99 @@ def make_appointment():
             if session['user']['ci'] not in participantes:
                 participantes.insert(0, session['user']['ci'])
             
-            success, message, id_reserva = db_service.create_reserva(
+            success, message, id_reserva, codes = db_service.create_reserva(
                 session['user']['ci'],
                 nombre_sala,
                 edificio,
                 fecha,
                 id_turno_int,
-                participantes
+                participantes,
+                idempotency_key=request.form.get('idempotency_key', '').strip()[:64] or None
             )
             
             if success:
                 flash('Reserva creada exitosamente.', 'success')
                 return redirect(url_for('my_reservations'))
+            elif 'idempotency_mismatch' in codes:
+                # The key belongs to another booking: a fresh form with a new key
+                flash('Este formulario ya se envió con otros datos. Revisa tus reservas antes de volver a enviarlo.', 'error')
+                return render_template('user/make_appointment.html',
+                                     salas=salas,
+                                     turnos=db_service.get_turnos(),
+                                     idempotency_key=secrets.token_urlsafe(16)), 409
             else:
                 flash(f'Error al crear reserva: {message}', 'error')
+                if 'room_taken' in codes:
+                    alternativas = db_service.find_free_alternatives(
+                        nombre_sala, edificio, fecha, id_turno_int, rol, tipo_programa,
+                        capacidad_min=len(participantes)
+                    )
         except ValueError as e:
             flash(f'Error en los datos ingresados: {str(e)}', 'error')
     
     return render_template('user/make_appointment.html', 
                          salas=salas, 
-                         turnos=db_service.get_turnos())
+                         turnos=db_service.get_turnos(),
+                         alternativas=alternativas,
+                         idempotency_key=booking_form_key())
+
+
+@app.route('/make-appointment/recurring', methods=['GET', 'POST'])
+@login_required
+def make_recurring_appointment():
+    """Book the same room on several weekdays and turnos over a date range - user-facing"""
+    user_role = db_service.get_user_role(session['user']['ci'])
+    if not user_role:
+        flash('No tienes un programa académico asociado. Por favor, agrega tu programa académico antes de hacer reservas.', 'error')
+        return redirect(url_for('add_program'))
+    
+    salas = db_service.get_salas_for_user(user_role.get('rol', 'alumno'), user_role.get('tipo', 'grado'))
+    turnos = db_service.get_turnos()
+    conflicts = []
+    
+    if request.method == 'POST':
+        nombre_sala = request.form.get('nombre_sala', '').strip()
+        edificio = request.form.get('edificio', '').strip()
+        participantes_str = request.form.get('participantes', '').strip()
+        try:
+            fecha_desde = datetime.strptime(request.form.get('fecha_desde', ''), "%Y-%m-%d").date()
+            fecha_hasta = datetime.strptime(request.form.get('fecha_hasta', ''), "%Y-%m-%d").date()
+            dias = [int(d) for d in request.form.getlist('dias')]
+            turno_ids = [t['id_turno'] for t in turnos]
+            desde = turno_ids.index(int(request.form.get('turno_desde', '')))
+            hasta = turno_ids.index(int(request.form.get('turno_hasta', '')))
+        except ValueError:
+            flash('Por favor, completa correctamente las fechas, los días y los turnos.', 'error')
+            return render_template('user/make_recurring_appointment.html', salas=salas, turnos=turnos,
+                                   idempotency_key=booking_form_key())
+        
+        if not nombre_sala or not edificio or not dias or fecha_hasta < fecha_desde or hasta < desde:
+            flash('Por favor, completa todos los campos obligatorios con un rango válido.', 'error')
+            return render_template('user/make_recurring_appointment.html', salas=salas, turnos=turnos,
+                                   idempotency_key=booking_form_key())
+        
+        participantes = [ci.strip() for ci in participantes_str.split(',') if ci.strip()]
+        if session['user']['ci'] not in participantes:
+            participantes.insert(0, session['user']['ci'])
+        
+        slots = recurrence_slots(fecha_desde, fecha_hasta, dias, turno_ids[desde:hasta + 1])
+        success, ids, conflicts = db_service.create_reserva_series(
+            session['user']['ci'], nombre_sala, edificio, slots, participantes,
+            idempotency_key=request.form.get('idempotency_key', '').strip()[:64] or None
+        )
+        if success:
+            flash(f'Se crearon {len(ids)} reservas.', 'success')
+            return redirect(url_for('my_reservations'))
+        if any(c['code'] == 'idempotency_mismatch' for c in conflicts):
+            flash('Este formulario ya se envió con otros datos. Revisa tus reservas antes de volver a enviarlo.', 'error')
+            return render_template('user/make_recurring_appointment.html', salas=salas, turnos=turnos,
+                                   idempotency_key=secrets.token_urlsafe(16)), 409
+        flash('No se creó ninguna reserva: revisa los conflictos.', 'error')
+    
+    return render_template('user/make_recurring_appointment.html',
+                           salas=salas, turnos=turnos, conflicts=conflicts,
+                           turnos_by_id={t['id_turno']: t for t in turnos},
+                           idempotency_key=booking_form_key())
 
 
 # ==================== ADMIN ROUTES - PARTICIPANTS ====================
@@ -587,8 +988,8 @@ def make_appointment():
 @admin_required
 def admin_list_participantes():
     """List all participants - admin only"""
-    participantes = db_service.get_all_participantes()
-    return render_template('participantes/list.html', participantes=participantes)
+    page = db_service.list_participantes(**list_request_args('ci'))
+    return render_template('participantes/list.html', participantes=page['rows'], page=page)
 
 
 @app.route('/admin/participantes/create', methods=['GET', 'POST'])
@@ -775,8 +1176,9 @@ def admin_delete_programa(nombre_programa, id_facultad):
 @admin_required
 def admin_list_salas():
     """List all rooms - admin only"""
-    salas = db_service.get_all_salas()
-    return render_template('salas/list.html', salas=salas)
+    page = db_service.list_salas(**list_request_args('edificio'))
+    return render_template('salas/list.html', salas=page['rows'], page=page,
+                           edificios=db_service.get_edificios())
 
 
 @app.route('/admin/salas/create', methods=['GET', 'POST'])
@@ -852,8 +1254,9 @@ def admin_delete_sala(edificio, nombre_sala):
 @admin_required
 def admin_list_reservas():
     """List all reservations - admin only"""
-    reservas = db_service.get_all_reservas()
-    return render_template('reservas/list.html', reservas=reservas)
+    page = db_service.list_reservas(**list_request_args('fecha_desde', 'fecha_hasta', 'edificio', 'estado', 'ci'))
+    return render_template('reservas/list.html', reservas=page['rows'], page=page,
+                           edificios=db_service.get_edificios())
 
 
 @app.route('/admin/reservas/<int:id_reserva>/edit', methods=['GET', 'POST'])
@@ -906,6 +1309,44 @@ def admin_update_attendance(id_reserva):
     return render_template('reservas/attendance.html', reserva=reserva, participantes=participantes)
 
 
+@app.route('/admin/reservas/attendance/bulk', methods=['GET', 'POST'])
+@admin_required
+def admin_bulk_attendance():
+    """Close out attendance for every reservation of a day or turno - admin only"""
+    try:
+        fecha = datetime.strptime(request.values.get('fecha') or date.today().isoformat(), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Fecha inválida.', 'error')
+        fecha = date.today()
+    id_turno = request.values.get('id_turno', type=int)
+    
+    if request.method == 'POST':
+        asistieron = set(request.form.getlist('asistio'))
+        marks = []
+        for value in request.form.getlist('participante'):
+            id_reserva, _, ci = value.partition(':')
+            if id_reserva.isdigit() and ci:
+                marks.append((int(id_reserva), ci, value in asistieron))
+        
+        # The form can be edited client-side: only participants of turnos already over are accepted
+        allowed = {(r['id_reserva'], p['ci_participante'])
+                   for r in db_service.get_attendance_sheet(fecha, id_turno) for p in r['participantes']}
+        if not marks:
+            flash('No hay reservas para registrar.', 'warning')
+        elif any((id_reserva, ci) not in allowed for id_reserva, ci, _ in marks):
+            flash('Solo se puede registrar la asistencia de reservas activas cuyo turno ya terminó.', 'error')
+        else:
+            success, message = db_service.close_attendance(marks)
+            if success:
+                flash(message, 'success')
+                return redirect(url_for('admin_list_reservas'))
+            flash(f'Error: {message}', 'error')
+    
+    reservas = db_service.get_attendance_sheet(fecha, id_turno)
+    return render_template('reservas/attendance_bulk.html', reservas=reservas, fecha=fecha,
+                           id_turno=id_turno, turnos=db_service.get_turnos())
+
+
 @app.route('/admin/reservas/<int:id_reserva>/delete', methods=['POST'])
 @admin_required
 def admin_delete_reserva(id_reserva):
@@ -924,9 +1365,10 @@ def admin_delete_reserva(id_reserva):
 @admin_required
 def admin_list_sanciones():
     """List all sanctions - admin only"""
-    sanciones = db_service.get_all_sanciones()
+    page = db_service.list_sanciones(**list_request_args('ci', 'fecha_desde', 'fecha_hasta'))
+    sanciones = page['rows']
     today = date.today()
-    return render_template('sanciones/list.html', sanciones=sanciones, today=today)
+    return render_template('sanciones/list.html', sanciones=sanciones, today=today, page=page)
 
 
 @app.route('/admin/sanciones/create', methods=['GET', 'POST'])
@@ -999,8 +1441,185 @@ def admin_delete_sancion(id_sancion):
     return redirect(url_for('admin_list_sanciones'))
 
 
+# ==================== ADMIN ROUTES - DATABASE ====================
+
+@app.route('/admin/db/pool')
+@admin_required
+def admin_pool_stats():
+    """Connection pool metrics - admin only"""
+    stats = db.pool_stats()
+    if stats is None:
+        return jsonify({'pooled': False})
+    return jsonify({'pooled': True, **stats})
+
+
+@app.route('/admin/auth/stats')
+@admin_required
+def admin_auth_stats():
+    """Password hashing pool, login throttle and token revocation state of this worker - admin only"""
+    tokens = {'mode': TOKEN_MODE}
+    if db_service.revocations is not None:
+        tokens.update(db_service.revocations.stats())
+    return jsonify({'pid': os.getpid(), 'hasher': password_hasher.stats(), 'throttle': login_throttle.stats(),
+                    'tokens': tokens})
+
+
+@app.route('/admin/db/startup')
+@admin_required
+def admin_startup_report():
+    """This worker's startup timings and pending migrations - admin only"""
+    return jsonify({'pid': os.getpid(), **startup_report})
+
+
+@app.route('/admin/db/availability-check')
+@admin_required
+def admin_availability_check():
+    """Compare the in-memory availability index with MySQL - admin only"""
+    mismatches = db_service.availability.verify()
+    return jsonify({'consistent': not mismatches, 'mismatches': mismatches})
+
+
+@app.route('/admin/db/reference-cache')
+@admin_required
+def admin_reference_cache_stats():
+    """Reference data cache counters - admin only"""
+    return jsonify(db_service.reference.stats())
+
+
+@app.route('/admin/db/role-cache')
+@admin_required
+def admin_role_cache_stats():
+    """Role cache counters - admin only"""
+    return jsonify(db_service.roles.stats())
+
+
+@app.route('/admin/db/quota-ledger')
+@admin_required
+def admin_quota_ledger_check():
+    """Compare the quota ledger with reserva - admin only"""
+    mismatches = db_service.quota.verify()
+    return jsonify({'consistent': not any(mismatches.values()), 'mismatches': mismatches})
+
+
+@app.route('/admin/db/quota-ledger/rebuild', methods=['POST'])
+@admin_required
+def admin_quota_ledger_rebuild():
+    """Recompute the quota ledger from reserva - admin only"""
+    result = db_service.quota.rebuild()
+    if result is None:
+        return jsonify({'rebuilt': False}), 500
+    return jsonify({'rebuilt': True, 'diaria': result[0], 'semanal': result[1]})
+
+
+@app.route('/admin/db/query-stats')
+@admin_required
+def admin_query_stats():
+    """Query counters by statement, service method and endpoint - admin only"""
+    return jsonify(query_stats.stats(top=request.args.get('top', 25, type=int)))
+
+
+@app.route('/admin/db/query-stats/reset', methods=['POST'])
+@admin_required
+def admin_query_stats_reset():
+    """Clear the query counters - admin only"""
+    query_stats.reset()
+    return jsonify({'reset': True})
+
+
+@app.route('/admin/jobs/finalizer')
+@admin_required
+def admin_finalizer_stats():
+    """Reservation finalizer metrics - admin only"""
+    if finalizer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **finalizer.stats(db)})
+
+
+@app.route('/admin/jobs/finalizer/run', methods=['POST'])
+@admin_required
+def admin_finalizer_run():
+    """Wake the reservation finalizer now - admin only"""
+    if finalizer is None:
+        return jsonify({'enabled': False}), 409
+    maintenance.trigger('finalizar_reservas')
+    return jsonify({'enabled': True, 'triggered': True})
+
+
+@app.route('/admin/jobs')
+@admin_required
+def admin_maintenance_stats():
+    """Interval, last run (duration, rows) and totals of this worker's maintenance jobs - admin only"""
+    if maintenance is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'pid': os.getpid(), **maintenance.stats()})
+
+
+@app.route('/admin/jobs/<nombre>/run', methods=['POST'])
+@admin_required
+def admin_maintenance_run(nombre):
+    """Run one maintenance job now - admin only"""
+    if maintenance is None or not maintenance.trigger(nombre):
+        return jsonify({'enabled': maintenance is not None, 'job': nombre}), 404
+    return jsonify({'enabled': True, 'job': nombre, 'triggered': True})
+
+
+# ==================== ADMIN ROUTES - EXPORT ====================
+
+@app.route('/admin/export')
+@admin_required
+def admin_export():
+    """Export form - admin only"""
+    return render_template('reportes/export.html', edificios=db_service.get_edificios(),
+                           datasets=sorted(db_service.report.EXPORT_COLUMNS), formatos=sorted(EXPORT_FORMATS))
+
+
+@app.route('/admin/export/<dataset>')
+@admin_required
+def admin_export_download(dataset):
+    """Stream a dataset as CSV/JSONL (optionally gzip) - admin only"""
+    formato = request.args.get('formato', 'csv')
+    if dataset not in db_service.report.EXPORT_COLUMNS or formato not in EXPORT_FORMATS:
+        flash('Exportación inválida.', 'error')
+        return redirect(url_for('admin_export'))
+    compress = request.args.get('gzip') == '1'
+    filtros = list_request_args('fecha_desde', 'fecha_hasta', 'edificio')['filtros']
+    
+    rows = db_service.export_rows(dataset, filtros)
+    try:
+        # Open the streaming connection now so errors still produce a normal page
+        first = next(rows, None)
+    except DatabaseError as e:
+        flash(f'Error al exportar: {e}', 'error')
+        return redirect(url_for('admin_export'))
+    
+    def all_rows():
+        if first is not None:
+            yield first
+            yield from rows
+    
+    # The rows come from iter_query's own connection; with stream_with_context teardown
+    # only runs after the download, so give the request's pooled connection back now
+    db.release()
+    chunks = stream_export(all_rows(), db_service.report.EXPORT_COLUMNS[dataset], formato, compress)
+    headers = {'Content-Disposition': f'attachment; filename="{export_filename(dataset, formato, compress)}"'}
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[formato]
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
 # ==================== ADMIN ROUTES - REPORTS ====================
 
+def render_report(nombre, template, single_row=False):
+    """Render a report from its stored snapshot (?refresh=1 recomputes it)"""
+    started = perf_counter()
+    force_refresh = request.args.get('refresh') == '1'
+    results, generated_at = db_service.report_snapshots.get(nombre, force_refresh=force_refresh)
+    if single_row:
+        results = results[0] if results else {}
+    html = render_template(template, results=results, generated_at=generated_at)
+    metrics.observe('ucu_report_render_seconds', (nombre,), perf_counter() - started)
+    return html
+
+
 @app.route('/admin/reportes')
 @admin_required
 def admin_reportes():
@@ -1012,269 +1631,114 @@ def admin_reportes():
 @admin_required
 def admin_reporte_salas_mas_reservadas():
     """Most reserved rooms - admin only"""
-    query = """
-        SELECT s.nombre_sala, s.edificio, s.tipo_sala, s.capacidad,
-               COUNT(r.id_reserva) as total_reservas
-        FROM sala s
-        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
-        GROUP BY s.nombre_sala, s.edificio, s.tipo_sala, s.capacidad
-        ORDER BY total_reservas DESC, s.edificio, s.nombre_sala
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/salas_mas_reservadas.html', results=results)
+    return render_report('salas_mas_reservadas', 'reportes/salas_mas_reservadas.html')
 
 
 @app.route('/admin/reportes/turnos-mas-demandados')
 @admin_required
 def admin_reporte_turnos_mas_demandados():
     """Most demanded time slots - admin only"""
-    query = """
-        SELECT t.id_turno, t.hora_inicio, t.hora_fin,
-               COUNT(r.id_reserva) as total_reservas
-        FROM turno t
-        LEFT JOIN reserva r ON t.id_turno = r.id_turno
-        GROUP BY t.id_turno, t.hora_inicio, t.hora_fin
-        ORDER BY total_reservas DESC, t.hora_inicio
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/turnos_mas_demandados.html', results=results)
+    return render_report('turnos_mas_demandados', 'reportes/turnos_mas_demandados.html')
 
 
 @app.route('/admin/reportes/promedio-participantes-sala')
 @admin_required
 def admin_reporte_promedio_participantes_sala():
     """Average participants per room - admin only"""
-    query = """
-        SELECT s.nombre_sala, s.edificio, s.capacidad,
-               COUNT(DISTINCT r.id_reserva) as total_reservas,
-               COUNT(rp.ci_participante) as total_participantes,
-               CASE 
-                   WHEN COUNT(DISTINCT r.id_reserva) > 0 
-                   THEN ROUND(COUNT(rp.ci_participante) / COUNT(DISTINCT r.id_reserva), 2)
-                   ELSE 0 
-               END as promedio_participantes
-        FROM sala s
-        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
-        LEFT JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
-        GROUP BY s.nombre_sala, s.edificio, s.capacidad
-        ORDER BY promedio_participantes DESC, s.edificio, s.nombre_sala
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/promedio_participantes_sala.html', results=results)
+    return render_report('promedio_participantes_sala', 'reportes/promedio_participantes_sala.html')
 
 
 @app.route('/admin/reportes/reservas-por-carrera-facultad')
 @admin_required
 def admin_reporte_reservas_por_carrera_facultad():
     """Reservations per program and faculty - admin only"""
-    query = """
-        SELECT f.nombre as facultad, pa.nombre_programa, pa.tipo,
-               COUNT(DISTINCT r.id_reserva) as total_reservas,
-               COUNT(DISTINCT rp.ci_participante) as total_participantes
-        FROM facultad f
-        JOIN programa_academico pa ON f.id_facultad = pa.id_facultad
-        LEFT JOIN participante_programa_academico ppa ON pa.nombre_programa = ppa.nombre_programa AND pa.id_facultad = ppa.id_facultad
-        LEFT JOIN reserva_participante rp ON ppa.ci_participante = rp.ci_participante
-        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
-        GROUP BY f.nombre, pa.nombre_programa, pa.tipo
-        ORDER BY f.nombre, pa.nombre_programa
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/reservas_por_carrera_facultad.html', results=results)
+    return render_report('reservas_por_carrera_facultad', 'reportes/reservas_por_carrera_facultad.html')
 
 
 @app.route('/admin/reportes/ocupacion-por-edificio')
 @admin_required
 def admin_reporte_ocupacion_por_edificio():
     """Room occupancy percentage per building - admin only"""
-    query = """
-        SELECT e.nombre_edificio, e.direccion,
-               COUNT(DISTINCT s.nombre_sala) as total_salas,
-               COUNT(DISTINCT CASE WHEN r.estado = 'activa' THEN r.id_reserva END) as reservas_activas,
-               COUNT(DISTINCT r.id_reserva) as total_reservas,
-               CASE 
-                   WHEN COUNT(DISTINCT s.nombre_sala) > 0 
-                   THEN ROUND((COUNT(DISTINCT CASE WHEN r.estado = 'activa' THEN r.id_reserva END) * 100.0) / COUNT(DISTINCT s.nombre_sala), 2)
-                   ELSE 0 
-               END as porcentaje_ocupacion
-        FROM edificio e
-        LEFT JOIN sala s ON e.nombre_edificio = s.edificio
-        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
-        GROUP BY e.nombre_edificio, e.direccion
-        ORDER BY porcentaje_ocupacion DESC, e.nombre_edificio
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/ocupacion_por_edificio.html', results=results)
+    return render_report('ocupacion_por_edificio', 'reportes/ocupacion_por_edificio.html')
 
 
 @app.route('/admin/reportes/reservas-asistencias-profesores-alumnos')
 @admin_required
 def admin_reporte_reservas_asistencias_profesores_alumnos():
     """Reservations and attendances for teachers and students - admin only"""
-    query = """
-        SELECT ppa.rol, pa.tipo,
-               COUNT(DISTINCT r.id_reserva) as total_reservas,
-               COUNT(DISTINCT CASE WHEN rp.asistencia = TRUE THEN r.id_reserva END) as reservas_con_asistencia,
-               COUNT(rp.ci_participante) as total_participaciones,
-               SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) as total_asistencias,
-               CASE 
-                   WHEN COUNT(rp.ci_participante) > 0 
-                   THEN ROUND((SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) * 100.0) / COUNT(rp.ci_participante), 2)
-                   ELSE 0 
-               END as porcentaje_asistencia
-        FROM participante_programa_academico ppa
-        JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa AND ppa.id_facultad = pa.id_facultad
-        LEFT JOIN reserva_participante rp ON ppa.ci_participante = rp.ci_participante
-        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
-        GROUP BY ppa.rol, pa.tipo
-        ORDER BY ppa.rol, pa.tipo
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/reservas_asistencias_profesores_alumnos.html', results=results)
+    return render_report('reservas_asistencias_profesores_alumnos', 'reportes/reservas_asistencias_profesores_alumnos.html')
 
 
 @app.route('/admin/reportes/sanciones-profesores-alumnos')
 @admin_required
 def admin_reporte_sanciones_profesores_alumnos():
     """Sanctions for teachers and students - admin only"""
-    query = """
-        SELECT ppa.rol, pa.tipo,
-               COUNT(DISTINCT sp.id_sancion) as total_sanciones,
-               COUNT(DISTINCT sp.ci_participante) as participantes_sancionados
-        FROM participante_programa_academico ppa
-        JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa AND ppa.id_facultad = pa.id_facultad
-        LEFT JOIN sancion_participante sp ON ppa.ci_participante = sp.ci_participante
-        WHERE sp.fecha_fin >= CURDATE() OR sp.id_sancion IS NULL
-        GROUP BY ppa.rol, pa.tipo
-        ORDER BY ppa.rol, pa.tipo
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/sanciones_profesores_alumnos.html', results=results)
+    return render_report('sanciones_profesores_alumnos', 'reportes/sanciones_profesores_alumnos.html')
 
 
 @app.route('/admin/reportes/porcentaje-reservas-utilizadas')
 @admin_required
 def admin_reporte_porcentaje_reservas_utilizadas():
     """Percentage of used vs canceled/no-show reservations - admin only"""
-    query = """
-        SELECT 
-            COUNT(*) as total_reservas,
-            SUM(CASE WHEN estado = 'activa' THEN 1 ELSE 0 END) as reservas_activas,
-            SUM(CASE WHEN estado = 'finalizada' THEN 1 ELSE 0 END) as reservas_finalizadas,
-            SUM(CASE WHEN estado = 'cancelada' THEN 1 ELSE 0 END) as reservas_canceladas,
-            SUM(CASE WHEN estado = 'sin asistencia' THEN 1 ELSE 0 END) as reservas_sin_asistencia,
-            CASE 
-                WHEN COUNT(*) > 0 
-                THEN ROUND((SUM(CASE WHEN estado = 'finalizada' THEN 1 ELSE 0 END) * 100.0) / COUNT(*), 2)
-                ELSE 0 
-            END as porcentaje_utilizadas,
-            CASE 
-                WHEN COUNT(*) > 0 
-                THEN ROUND(((SUM(CASE WHEN estado = 'cancelada' THEN 1 ELSE 0 END) + SUM(CASE WHEN estado = 'sin asistencia' THEN 1 ELSE 0 END)) * 100.0) / COUNT(*), 2)
-                ELSE 0 
-            END as porcentaje_no_utilizadas
-        FROM reserva
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/porcentaje_reservas_utilizadas.html', results=results[0] if results else {})
+    return render_report('porcentaje_reservas_utilizadas', 'reportes/porcentaje_reservas_utilizadas.html', single_row=True)
 
 
 @app.route('/admin/reportes/reservas-por-mes')
 @admin_required
 def admin_reporte_reservas_por_mes():
     """Reservations per month - admin only"""
-    query = """
-        SELECT 
-            DATE_FORMAT(fecha, '%Y-%m') as mes,
-            COUNT(*) as total_reservas,
-            COUNT(DISTINCT nombre_sala, edificio) as salas_utilizadas,
-            COUNT(DISTINCT rp.ci_participante) as participantes_unicos
-        FROM reserva r
-        LEFT JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
-        GROUP BY DATE_FORMAT(fecha, '%Y-%m')
-        ORDER BY mes DESC
-    """
-    results = db_service.db.execute_query(query, fetch=True) or []
-    return render_template('reportes/reservas_por_mes.html', results=results)
+    return render_report('reservas_por_mes', 'reportes/reservas_por_mes.html')
 
 
 @app.route('/admin/reportes/participantes-mas-activos')
 @admin_required
 def admin_reporte_participantes_mas_activos():
     """Most active participants - admin only"""
-    query = """
-        SELECT 
-            p.ci, p.nombre, p.apellido, p.email,
-            COUNT(DISTINCT r.id_reserva) as total_reservas,
-            SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) as total_asistencias,
-            COUNT(DISTINCT sp.id_sancion) as total_sanciones
-        FROM participante p
-        LEFT JOIN reserva_participante rp ON p.ci = rp.ci_participante
-        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
-        LEFT JOIN sancion_participante sp ON p.ci = sp.ci_participante
-        GROUP BY p.ci, p.nombre, p.apellido, p.email
-        HAVING total_reservas > 0
-        ORDER BY total_reservas DESC, total_asistencias DESC
-        LIMIT 20
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/participantes_mas_activos.html', results=results)
+    return render_report('participantes_mas_activos', 'reportes/participantes_mas_activos.html')
 
 
 @app.route('/admin/reportes/eficiencia-uso-salas')
 @admin_required
 def admin_reporte_eficiencia_uso_salas():
     """Room usage efficiency - admin only"""
-    query = """
-        SELECT 
-            s.nombre_sala, s.edificio, s.capacidad, s.tipo_sala,
-            COUNT(DISTINCT r.id_reserva) as total_reservas,
-            AVG((SELECT COUNT(*) FROM reserva_participante rp2 WHERE rp2.id_reserva = r.id_reserva)) as promedio_participantes,
-            SUM(CASE WHEN r.estado = 'finalizada' THEN 1 ELSE 0 END) as reservas_completadas,
-            SUM(CASE WHEN r.estado = 'sin asistencia' THEN 1 ELSE 0 END) as reservas_no_asistidas,
-            CASE 
-                WHEN COUNT(DISTINCT r.id_reserva) > 0 
-                THEN ROUND((SUM(CASE WHEN r.estado = 'finalizada' THEN 1 ELSE 0 END) * 100.0) / COUNT(DISTINCT r.id_reserva), 2)
-                ELSE 0 
-            END as tasa_uso
-        FROM sala s
-        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
-        GROUP BY s.nombre_sala, s.edificio, s.capacidad, s.tipo_sala
-        ORDER BY tasa_uso DESC, total_reservas DESC
-    """
-    results = db.execute_query(query, fetch=True) or []
-    return render_template('reportes/eficiencia_uso_salas.html', results=results)
+    return render_report('eficiencia_uso_salas', 'reportes/eficiencia_uso_salas.html')
+
+
+# ==================== MONITORING ====================
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Application metrics in Prometheus text format"""
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif not metrics_public:
+        return Response('Forbidden: set METRICS_TOKEN\n', status=403, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
-    import os
-    import json
+    import sys
     
-    # Flask's reloader runs the main block twice (parent and child process)
-    # Use environment variable to cache config and avoid double prompts
-    config_env_key = 'FLASK_DB_CONFIG'
+    # Flask's reloader runs this block twice: a watcher parent and the serving
+    # child (WERKZEUG_RUN_MAIN=true). Only the child connects; --configure
+    # prompts once in the parent and the child reads the saved file.
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if '--configure' in sys.argv and not serving:
+        prompt_db_config()
+    DB_CONFIG.update(load_db_config())
     
-    # Check if config is already cached in environment variable
-    if config_env_key in os.environ:
-        # Load config from environment variable
-        DB_CONFIG.update(json.loads(os.environ[config_env_key]))
-    else:
-        # Get database configuration from user
-        DB_CONFIG.update(get_db_config())
-        # Cache it in environment variable for reloader
-        os.environ[config_env_key] = json.dumps(DB_CONFIG)
-    
-    # Initialize database manager with the configuration
-    db = DatabaseManager(**DB_CONFIG)
-    
-    # Initialize database connection and managers
-    if init_db():
-        # Only show success message in the main process (child of reloader)
-        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-            print("\n" + "="*60)
-            print("Database connection established successfully!")
-            print("Starting web server...")
-            print("="*60 + "\n")
-        app.run(debug=True, host='0.0.0.0', port=5000)
-    else:
-        print("\nError: Could not connect to database. Please check your configuration.")
+    if serving:
+        try:
+            ready = init_db()
+        except SchemaOutdated as e:
+            print(f"\nError: {e}")
+            sys.exit(1)
+        if not ready:
+            print("\nError: Could not connect to database. Please check your configuration.")
+            sys.exit(1)
+        print("\n" + "="*60)
+        print("Database connection established successfully!")
+        print("Starting web server...")
+        print("="*60 + "\n")
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
@@ -0,0 +1,307 @@
+"""
+Availability Index
+In-memory room/date/turno occupancy grid used to answer availability
+queries without going to MySQL
+"""
+
+import threading
+import time as clock
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Iterable, Set, Tuple
+from main import DatabaseManager
+
+
+# Cost of each step away from the requested slot when ranking alternatives:
+# another room of the same building at the same time is the closest match,
+# then a neighbouring turno, then another day
+ROOM_CHANGE_COST = 0.5
+TURNO_STEP_COST = 1.0
+DAY_STEP_COST = 4.0
+
+
+def rank_free_slots(salas: List[Dict], turnos: List[Dict], occupied: Dict[Tuple, Set[int]],
+                    nombre_sala: str, fecha: date, id_turno: int, fechas: List[date],
+                    k: int = 5, now: datetime = None) -> List[Dict]:
+    """The `k` free (sala, fecha, turno) slots closest to the requested one
+
+    `salas` are the candidate rooms, `turnos` all turnos ordered by start
+    time, and `occupied` maps (nombre_sala, edificio, fecha) to the set of
+    taken id_turno. Slots that already started are skipped. The requested
+    slot itself is returned (distance 0) if it is free.
+    """
+    now = now or datetime.now()
+    position = {t['id_turno']: i for i, t in enumerate(turnos)}
+    target = position.get(id_turno, 0)
+    candidates = []
+    for dia in fechas:
+        day_cost = abs((dia - fecha).days) * DAY_STEP_COST
+        for turno in turnos:
+            if datetime.combine(dia, datetime.min.time()) + turno['hora_inicio'] <= now:
+                continue
+            turno_cost = abs(position[turno['id_turno']] - target) * TURNO_STEP_COST
+            for sala in salas:
+                if turno['id_turno'] in occupied.get((sala['nombre_sala'], sala['edificio'], dia), ()):
+                    continue
+                room_cost = 0.0 if sala['nombre_sala'] == nombre_sala else ROOM_CHANGE_COST
+                candidates.append((day_cost + turno_cost + room_cost, dia, position[turno['id_turno']],
+                                   sala['nombre_sala'], sala, turno))
+    candidates.sort(key=lambda c: c[:4])
+    return [{
+        'nombre_sala': sala['nombre_sala'],
+        'edificio': sala['edificio'],
+        'capacidad': sala['capacidad'],
+        'tipo_sala': sala['tipo_sala'],
+        'fecha': dia,
+        'id_turno': turno['id_turno'],
+        'hora_inicio': turno['hora_inicio'],
+        'hora_fin': turno['hora_fin'],
+        'distancia': distancia,
+    } for distancia, dia, _, _, sala, turno in candidates[:k]]
+
+
+class AvailabilityIndex:
+    """Occupancy bitmap keyed by (sala, fecha, id_turno) over a rolling window
+
+    Each (nombre_sala, edificio, fecha) maps to an int whose bits are the
+    turnos holding an active reservation. The window starts today and spans
+    `window_days`; it is reloaded when the day changes or after `max_age`
+    seconds. Writes made through DatabaseService in this process update it
+    in place; writes made by other worker processes (bookings, and the
+    reservation finalizer, which runs in whichever worker wins its lock)
+    show up after at most `max_age` seconds.
+
+    A load reads the database without holding the lock, so marks made
+    while it runs are recorded with a generation number and replayed over
+    the loaded grid; an invalidate() during a load leaves the result stale
+    so the next lookup loads again.
+    """
+
+    def __init__(self, db: DatabaseManager, window_days: int = 60, max_age: float = 60.0):
+        self.db = db
+        self.window_days = window_days
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._salas = []
+        self._turnos = []
+        self._bits = {}
+        self._occupied = {}
+        self._window_start = None
+        self._window_end = None
+        self._loaded_at = None
+        self._generation = 0        # bumped by every mark() and invalidate()
+        self._invalidated_at = 0    # generation of the last invalidate()
+        self._loading = 0           # loads in progress
+        self._marks = []            # (generation, slot) marked while a load was in progress
+
+    # ==================== LOADING ====================
+
+    def load(self) -> bool:
+        """(Re)build the index from the database"""
+        with self._lock:
+            self._loading += 1
+            start_generation = self._generation
+        try:
+            return self._load(start_generation)
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._marks = []
+
+    def _load(self, start_generation: int) -> bool:
+        window_start = date.today()
+        window_end = window_start + timedelta(days=self.window_days)
+
+        salas = self.db.execute_query(
+            "SELECT s.*, e.direccion, e.departamento FROM sala s JOIN edificio e ON s.edificio = e.nombre_edificio ORDER BY s.edificio, s.nombre_sala",
+            fetch=True
+        )
+        turnos = self.db.execute_query("SELECT * FROM turno ORDER BY hora_inicio", fetch=True)
+        reservas = self.db.execute_query(
+            """SELECT nombre_sala, edificio, fecha, id_turno
+               FROM reserva
+               WHERE estado = 'activa' AND fecha BETWEEN %s AND %s""",
+            (window_start, window_end),
+            fetch=True
+        )
+        if salas is None or turnos is None or reservas is None:
+            return False
+
+        bits = {t['id_turno']: 1 << i for i, t in enumerate(turnos)}
+        occupied = {}
+        for r in reservas:
+            key = (r['nombre_sala'], r['edificio'], r['fecha'])
+            occupied[key] = occupied.get(key, 0) | bits.get(r['id_turno'], 0)
+
+        with self._lock:
+            # Slots marked since the SELECTs started may be missing from them
+            for generation, slot in self._marks:
+                if generation > start_generation:
+                    self._apply(occupied, bits, *slot)
+            self._salas = salas
+            self._turnos = turnos
+            self._bits = bits
+            self._occupied = occupied
+            self._window_start = window_start
+            self._window_end = window_end
+            stale = self._invalidated_at > start_generation
+            self._loaded_at = None if stale else clock.monotonic()
+        return True
+
+    def invalidate(self):
+        """Force a reload on the next lookup (e.g. after room or turno changes)"""
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at = self._generation
+            self._loaded_at = None
+
+    def _ensure_loaded(self) -> bool:
+        with self._lock:
+            fresh = (self._loaded_at is not None
+                     and clock.monotonic() - self._loaded_at < self.max_age
+                     and self._window_start == date.today())
+        return fresh or self.load()
+
+    def covers(self, fecha: date) -> bool:
+        """Whether `fecha` falls inside the loaded window"""
+        if not self._ensure_loaded():
+            return False
+        with self._lock:
+            return self._window_start <= fecha <= self._window_end
+
+    # ==================== UPDATES ====================
+
+    def mark(self, nombre_sala: str, edificio: str, fecha: date, id_turno: int, occupied: bool):
+        """Record that a slot became occupied or free"""
+        with self._lock:
+            self._generation += 1
+            if self._loading:
+                self._marks.append((self._generation, (nombre_sala, edificio, fecha, id_turno, occupied)))
+            if self._loaded_at is None or not (self._window_start <= fecha <= self._window_end):
+                return
+            if not self._apply(self._occupied, self._bits, nombre_sala, edificio, fecha, id_turno, occupied):
+                # Unknown turno - let the next lookup rebuild everything
+                self._loaded_at = None
+
+    @staticmethod
+    def _apply(grid: Dict, bits: Dict, nombre_sala: str, edificio: str, fecha: date,
+               id_turno: int, occupied: bool) -> bool:
+        bit = bits.get(id_turno)
+        if bit is None:
+            return False
+        key = (nombre_sala, edificio, fecha)
+        mask = grid.get(key, 0)
+        mask = mask | bit if occupied else mask & ~bit
+        if mask:
+            grid[key] = mask
+        else:
+            grid.pop(key, None)
+        return True
+
+    def mark_reserva(self, reserva: Dict):
+        """Sync one reservation row (anything but 'activa' frees the slot)"""
+        if reserva:
+            self.mark(reserva['nombre_sala'], reserva['edificio'], reserva['fecha'],
+                      reserva['id_turno'], reserva['estado'] == 'activa')
+
+    # ==================== LOOKUPS ====================
+
+    def _mask_for_range(self, hora_inicio, hora_fin) -> int:
+        # A turno overlaps if: turno.hora_inicio < hora_fin AND turno.hora_fin > hora_inicio
+        mask = 0
+        for t in self._turnos:
+            if t['hora_inicio'] < hora_fin and t['hora_fin'] > hora_inicio:
+                mask |= self._bits[t['id_turno']]
+        return mask
+
+    def free_salas(self, fecha: date, hora_inicio, hora_fin,
+                   allowed_types: Iterable[str]) -> Optional[List[Dict]]:
+        """Rooms of the allowed types free for every turno in [hora_inicio, hora_fin)
+
+        Returns None when `fecha` is outside the window so the caller can
+        fall back to SQL.
+        """
+        if not self.covers(fecha):
+            return None
+        allowed = set(allowed_types)
+        with self._lock:
+            mask = self._mask_for_range(hora_inicio, hora_fin)
+            return [
+                dict(s) for s in self._salas
+                if s['tipo_sala'] in allowed
+                and not self._occupied.get((s['nombre_sala'], s['edificio'], fecha), 0) & mask
+            ]
+
+    def count_free(self, fecha: date, hora_inicio) -> Optional[int]:
+        """Number of rooms free for the turno starting at `hora_inicio`
+
+        Returns None when `fecha` is outside the window. If no turno starts
+        at that time every room counts as free.
+        """
+        if not self.covers(fecha):
+            return None
+        with self._lock:
+            bit = next((self._bits[t['id_turno']] for t in self._turnos
+                        if t['hora_inicio'] == hora_inicio), 0)
+            return sum(
+                1 for s in self._salas
+                if not self._occupied.get((s['nombre_sala'], s['edificio'], fecha), 0) & bit
+            )
+
+    def occupancy(self, edificio: str, fecha_desde: date,
+                  fecha_hasta: date) -> Optional[Tuple[List[Dict], List[Dict], Dict[Tuple, Set[int]]]]:
+        """(rooms of `edificio`, turnos, taken turno ids per room and day) for a date range
+
+        Returns None when the range is not fully inside the window.
+        """
+        if not (self.covers(fecha_desde) and self.covers(fecha_hasta)):
+            return None
+        with self._lock:
+            by_bit = {bit: id_turno for id_turno, bit in self._bits.items()}
+            salas = [dict(s) for s in self._salas if s['edificio'] == edificio]
+            occupied = {}
+            for (nombre_sala, sala_edificio, fecha), mask in self._occupied.items():
+                if sala_edificio == edificio and fecha_desde <= fecha <= fecha_hasta:
+                    occupied[(nombre_sala, sala_edificio, fecha)] = {
+                        id_turno for bit, id_turno in by_bit.items() if mask & bit
+                    }
+            return salas, [dict(t) for t in self._turnos], occupied
+
+    # ==================== CONSISTENCY ====================
+
+    def verify(self) -> List[Dict]:
+        """Compare the index with the database, returning every mismatched slot"""
+        if not self._ensure_loaded():
+            return [{'error': 'index could not be loaded'}]
+        with self._lock:
+            window_start, window_end = self._window_start, self._window_end
+            by_bit = {bit: id_turno for id_turno, bit in self._bits.items()}
+            indexed = set()
+            for (nombre_sala, edificio, fecha), mask in self._occupied.items():
+                for bit, id_turno in by_bit.items():
+                    if mask & bit:
+                        indexed.add((nombre_sala, edificio, fecha, id_turno))
+
+        rows = self.db.execute_query(
+            """SELECT DISTINCT nombre_sala, edificio, fecha, id_turno
+               FROM reserva
+               WHERE estado = 'activa' AND fecha BETWEEN %s AND %s""",
+            (window_start, window_end),
+            fetch=True
+        )
+        if rows is None:
+            return [{'error': 'database query failed'}]
+        stored = {(r['nombre_sala'], r['edificio'], r['fecha'], r['id_turno']) for r in rows}
+
+        mismatches = []
+        for slot, in_index in [(s, True) for s in indexed - stored] + [(s, False) for s in stored - indexed]:
+            nombre_sala, edificio, fecha, id_turno = slot
+            mismatches.append({
+                'nombre_sala': nombre_sala,
+                'edificio': edificio,
+                'fecha': fecha.isoformat(),
+                'id_turno': id_turno,
+                'index_occupied': in_index,
+                'db_occupied': not in_index
+            })
+        return mismatches
@@ -0,0 +1,61 @@
+"""
+Benchmark: keyset-paginated admin lists
+
+Walks every page of the admin reservation, participant and sanction lists
+and reports per-page latency for the first and the last pages, which should
+stay flat however deep the walk goes. The old full-table queries are timed
+once for comparison.
+
+Usage: python benchmarks/bench_admin_lists.py [--page-size 50] [--max-pages 200]
+"""
+
+import argparse
+
+from common import Timer, connect, print_summary, summarize
+from database_service import DatabaseService
+
+
+def walk(list_page, page_size: int, max_pages: int):
+    """Follow next_cursor from the first page, returning per-page samples"""
+    samples = []
+    cursor = None
+    for _ in range(max_pages):
+        with Timer(samples):
+            page = list_page(cursor=cursor, page_size=page_size)
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--max-pages', type=int, default=200)
+    args = parser.parse_args()
+
+    db = connect()
+    service = DatabaseService(db)
+    try:
+        for label, list_page, get_all in (
+            ('reservas', service.list_reservas, service.get_all_reservas),
+            ('participantes', service.list_participantes, service.get_all_participantes),
+            ('sanciones', service.list_sanciones, service.get_all_sanciones),
+        ):
+            samples = walk(list_page, args.page_size, args.max_pages)
+            head = samples[:5]
+            tail = samples[-5:]
+            print(f"{label}: {len(samples)} page(s)")
+            print_summary('  first pages', summarize(head))
+            print_summary('  last pages', summarize(tail))
+
+            full = []
+            with Timer(full):
+                rows = get_all()
+            print_summary(f'  full table ({len(rows)} rows)', summarize(full))
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
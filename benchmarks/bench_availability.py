@@ -0,0 +1,76 @@
+"""
+Benchmark: SQL vs in-memory availability lookups
+
+Runs the same random (fecha, turno range, room access) queries through
+DatabaseService.get_available_salas_sql and the AvailabilityIndex, checks
+that both return the same rooms, and runs the index consistency check.
+
+Usage: python benchmarks/bench_availability.py [--queries 500] [--seed 7]
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from common import Timer, connect, print_summary, summarize
+from database_service import DatabaseService
+
+ACCESS_PROFILES = [('alumno', 'grado'), ('docente', 'grado'), ('alumno', 'posgrado')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    db = connect()
+    service = DatabaseService(db)
+    turnos = service.get_turnos()
+    if not turnos:
+        raise SystemExit("Error: the turno table is empty")
+
+    rng = random.Random(args.seed)
+    window = service.availability.window_days
+    queries = []
+    for _ in range(args.queries):
+        fecha = date.today() + timedelta(days=rng.randint(0, window))
+        first = rng.randrange(len(turnos))
+        last = rng.randrange(first, min(first + 4, len(turnos)))
+        rol, tipo = rng.choice(ACCESS_PROFILES)
+        queries.append((fecha, turnos[first]['hora_inicio'], turnos[last]['hora_fin'], rol, tipo))
+
+    load_ms = []
+    with Timer(load_ms):
+        service.availability.load()
+    print(f"Index load ({window} day window): {load_ms[0]:.1f}ms\n")
+
+    sql_ms, index_ms = [], []
+    differences = 0
+    for query in queries:
+        with Timer(sql_ms):
+            expected = service.get_available_salas_sql(*query)
+        with Timer(index_ms):
+            actual = service.get_available_salas(*query)
+        key = lambda rows: sorted((s['edificio'], s['nombre_sala']) for s in rows)
+        if key(expected) != key(actual):
+            differences += 1
+
+    sql = summarize(sql_ms)
+    index = summarize(index_ms)
+    print_summary('get_available_salas_sql', sql)
+    print_summary('AvailabilityIndex', index)
+    if index['mean_ms']:
+        print(f"\nSpeed-up (mean): {sql['mean_ms'] / index['mean_ms']:.1f}x")
+    print(f"Result differences: {differences}")
+
+    mismatches = service.availability.verify()
+    print(f"Consistency check: {'OK' if not mismatches else f'{len(mismatches)} mismatched slot(s)'}")
+    for m in mismatches[:10]:
+        print(f"  {m}")
+
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
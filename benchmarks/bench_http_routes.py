@@ -0,0 +1,278 @@
+"""
+Benchmark: end-to-end latency of the hot request paths
+
+Drives the Flask app in-process (test client, real MySQL) through login,
+both dashboards, /rooms with and without filters, make_appointment,
+cancel_my_reserva, attendance updates and every /admin/reportes/* route.
+Reports p50/p95/p99 latency and statements per request for each scenario.
+Results can be written as JSON and compared with an earlier run to catch
+regressions (exit status 1 when a scenario got slower than the threshold or
+issues more statements per request).
+
+Benchmark users and a teacher-only room are created and removed at the end.
+With --generate the database is first filled with the seeded bulk dataset
+of generate_sample_data.py (skipped if it is already there).
+
+Usage: python benchmarks/bench_http_routes.py [--iterations 50] [--warmup 3] [--output run.json]
+       [--compare baseline.json] [--threshold 0.2]
+       [--generate --participantes 100000 --reservas 1000000 --sanciones 20000 --seed 42]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import bcrypt
+
+# Background jobs would add their statements to the counts; set before the app is imported
+os.environ.setdefault('FINALIZER_INTERVAL', '0')
+os.environ.setdefault('TOKEN_CLEANUP_INTERVAL', '0')
+os.environ.setdefault('REPORT_SNAPSHOT_MAX_AGE', '0')
+os.environ.setdefault('TOKEN_TOUCH_FLUSH_INTERVAL', '3600')
+
+from common import DB_CONFIG, ROOT_DIR, Timer, connect, summarize
+
+import app as webapp
+
+SALA = 'Sala Benchmark HTTP'
+PASSWORD = 'bench-password'
+USERS = {
+    'admin': ('9200001-0', 'bench.http.admin@ucu.edu.uy', True),
+    'user': ('9200002-0', 'bench.http.user@ucu.edu.uy', False),
+}
+DATASET_TABLES = ('participante', 'sala', 'reserva', 'reserva_participante', 'sancion_participante')
+
+
+def setup_fixture(db):
+    """Create the benchmark users (docente, so booking limits never interfere) and room; return edificio"""
+    edificio = db.execute_fetchone("SELECT nombre_edificio FROM edificio ORDER BY nombre_edificio LIMIT 1")
+    programa = db.execute_fetchone("SELECT nombre_programa, id_facultad FROM programa_academico LIMIT 1")
+    if not edificio or not programa:
+        raise SystemExit("Error: the database needs at least one edificio and one programa_academico")
+
+    edificio = edificio['nombre_edificio']
+    db.execute_query(
+        "INSERT IGNORE INTO sala (nombre_sala, edificio, capacidad, tipo_sala) VALUES (%s, %s, 4, 'docente')",
+        (SALA, edificio)
+    )
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    for name, (ci, email, is_admin) in USERS.items():
+        db.execute_query(
+            "INSERT IGNORE INTO participante (ci, nombre, apellido, email, is_admin) VALUES (%s, 'Bench', %s, %s, %s)",
+            (ci, name.capitalize(), email, is_admin)
+        )
+        db.execute_query("REPLACE INTO login (correo, password) VALUES (%s, %s)", (email, hashed))
+        db.execute_query(
+            "INSERT IGNORE INTO participante_programa_academico (ci_participante, nombre_programa, id_facultad, rol) VALUES (%s, %s, %s, 'docente')",
+            (ci, programa['nombre_programa'], programa['id_facultad'])
+        )
+    return edificio
+
+
+def teardown_fixture(db, edificio: str):
+    """Remove every row created by the benchmark (tokens and ledger rows cascade)"""
+    db.execute_query("DELETE FROM reserva WHERE nombre_sala = %s AND edificio = %s", (SALA, edificio))
+    db.execute_query("DELETE FROM sala WHERE nombre_sala = %s AND edificio = %s", (SALA, edificio))
+    for ci, _, _ in USERS.values():
+        db.execute_query("DELETE FROM participante WHERE ci = %s", (ci,))
+
+
+class StatementCounter:
+    """DatabaseManager listener counting the statements of the benchmark thread"""
+
+    def __init__(self):
+        self.thread = threading.get_ident()
+        self.count = 0
+
+    def __call__(self, event):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def logged_in_client(role: str):
+    """Test client with a session for one of the benchmark users"""
+    client = webapp.app.test_client()
+    response = client.post('/login', data={'email': USERS[role][1], 'password': PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f"Error: could not log in as the benchmark {role}")
+    return client
+
+
+def run_scenario(counter: StatementCounter, request, iterations: int, warmup: int):
+    """Call `request(i)` warmup + iterations times; it returns the response"""
+    samples, statements, errors = [], [], 0
+    for i in range(warmup + iterations):
+        before = counter.count
+        timing = []
+        with Timer(timing):
+            response = request(i)
+        if i < warmup:
+            continue
+        samples.extend(timing)
+        statements.append(counter.count - before)
+        if response.status_code >= 400:
+            errors += 1
+    result = summarize(samples)
+    result['queries_per_request'] = round(sum(statements) / len(statements), 2) if statements else 0.0
+    result['errors'] = errors
+    return result
+
+
+def build_scenarios(db, edificio: str, iterations: int, warmup: int):
+    """(name, request) pairs in run order; later ones use the reservations booked earlier"""
+    admin = logged_in_client('admin')
+    user = logged_in_client('user')
+    turnos = [t['id_turno'] for t in db.execute_query("SELECT id_turno FROM turno ORDER BY hora_inicio", fetch=True) or []]
+    if not turnos:
+        raise SystemExit("Error: the turno table is empty")
+    start = date.today() + timedelta(days=600)
+    user_ci = USERS['user'][0]
+    booked = []
+
+    def booked_ids(i):
+        if not booked:
+            booked.extend(row['id_reserva'] for row in db.execute_query(
+                "SELECT id_reserva FROM reserva WHERE nombre_sala = %s AND edificio = %s ORDER BY id_reserva",
+                (SALA, edificio), fetch=True) or [])
+        if not booked:
+            raise SystemExit("Error: make_appointment booked nothing, check its errors")
+        return booked[i % len(booked)]
+
+    def book(i):
+        fecha = start + timedelta(days=i // len(turnos))
+        return user.post('/make-appointment', data={
+            'nombre_sala': SALA, 'edificio': edificio, 'fecha': fecha.isoformat(),
+            'id_turno': turnos[i % len(turnos)], 'participantes': user_ci,
+            'idempotency_key': f"bench-http-{start.isoformat()}-{i}",
+        })
+
+    scenarios = [
+        ('login', lambda i: webapp.app.test_client().post(
+            '/login', data={'email': USERS['user'][1], 'password': PASSWORD})),
+        ('dashboard (admin)', lambda i: admin.get('/dashboard')),
+        ('dashboard (user)', lambda i: user.get('/dashboard')),
+        ('rooms', lambda i: user.get('/rooms')),
+        ('rooms (fecha + turnos)', lambda i: user.get('/rooms', query_string={
+            'fecha': (date.today() + timedelta(days=1 + i % 7)).isoformat(),
+            'id_turno_inicio': turnos[0], 'id_turno_fin': turnos[min(3, len(turnos) - 1)]})),
+        ('make_appointment POST', book),
+        ('attendance POST', lambda i: admin.post(
+            f'/admin/reservas/{booked_ids(i)}/attendance', data={f'asistencia_{user_ci}': 'true'})),
+        ('cancel_my_reserva', lambda i: user.post(f'/my-reservations/{booked_ids(i)}/cancel')),
+    ]
+    reportes = sorted(rule.rule for rule in webapp.app.url_map.iter_rules()
+                      if rule.rule.startswith('/admin/reportes/'))
+    scenarios += [(path, lambda i, path=path: admin.get(path)) for path in reportes]
+    return scenarios
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print the change against a previous run and return the regressions"""
+    regressions = []
+    print(f"\nAgainst {baseline['meta'].get('commit') or 'baseline'} "
+          f"({baseline['meta'].get('timestamp', '?')}):")
+    for name, new in results.items():
+        old = baseline['results'].get(name)
+        if not old:
+            print(f"  {name:45} new")
+            continue
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+        queries = new['queries_per_request'] - old['queries_per_request']
+        flags = []
+        # Sub-millisecond differences are noise whatever the ratio
+        if change > threshold and new['p95_ms'] - old['p95_ms'] > 1.0:
+            flags.append('SLOWER')
+        if queries > 0.5:
+            flags.append('MORE QUERIES')
+        print(f"  {name:45} p95 {old['p95_ms']:>9.3f} -> {new['p95_ms']:>9.3f} ms ({change:+.0%}) "
+              f"queries {old['queries_per_request']:>6} -> {new['queries_per_request']:<6} {' '.join(flags)}")
+        if flags:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p95 increase (0.2 = 20%%)")
+    parser.add_argument('--generate', action='store_true', help="Fill the database with the bulk dataset first")
+    parser.add_argument('--participantes', type=int, default=100000)
+    parser.add_argument('--reservas', type=int, default=1000000)
+    parser.add_argument('--sanciones', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.generate:
+        from generate_sample_data import BulkDataGenerator
+        seed_db = connect()
+        try:
+            BulkDataGenerator(seed_db, args.participantes, args.reservas, args.sanciones, seed=args.seed).generate_all()
+        finally:
+            seed_db.disconnect()
+
+    webapp.DB_CONFIG.update(DB_CONFIG)
+    if not webapp.init_db():
+        raise SystemExit(f"Error: Could not connect to {DB_CONFIG['host']} as {DB_CONFIG['user']}")
+    db = webapp.db
+    counter = StatementCounter()
+    db.add_listener(counter)
+
+    dataset = {table: db.execute_fetchone(f"SELECT COUNT(*) AS n FROM {table}")['n'] for table in DATASET_TABLES}
+    print("Dataset: " + ", ".join(f"{table}={count}" for table, count in dataset.items()))
+    print(f"{args.iterations} iterations per scenario after {args.warmup} warm-up call(s)\n")
+
+    edificio = setup_fixture(db)
+    results = {}
+    try:
+        for name, request in build_scenarios(db, edificio, args.iterations, args.warmup):
+            results[name] = run_scenario(counter, request, args.iterations, args.warmup)
+            r = results[name]
+            print(f"{name:45} p50={r['p50_ms']:>9.3f}ms p95={r['p95_ms']:>9.3f}ms p99={r['p99_ms']:>9.3f}ms "
+                  f"queries/req={r['queries_per_request']:<6} errors={r['errors']}")
+    finally:
+        teardown_fixture(db, edificio)
+        db.remove_listener(counter)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'pool_size': webapp.POOL_CONFIG['pool_size'],
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
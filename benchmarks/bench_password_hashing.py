@@ -0,0 +1,84 @@
+"""
+Benchmark: password verification under a login burst
+
+Fires --logins bcrypt verifications from --threads request threads, first
+inline on the threads and then through the process pool, while a probe
+thread measures how long a trivial piece of request work takes meanwhile
+(how much the hashing starves everything else in the process). Reports
+verifications per second, verify latency, probe latency and calls turned
+away as busy. No database is needed.
+
+Usage: python benchmarks/bench_password_hashing.py [--logins 200] [--threads 16] [--workers 4] [--rounds 12] [--max-pending 32]
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import Timer, print_summary, summarize
+from password_hasher import PasswordHasher, HasherBusy
+
+
+def probe(stop: threading.Event, samples):
+    """Time a small CPU-bound job every 10 ms"""
+    while not stop.is_set():
+        with Timer(samples):
+            sum(i * i for i in range(2000))
+        time.sleep(0.01)
+
+
+def run(hasher: PasswordHasher, stored: str, logins: int, threads: int):
+    samples, probe_samples, busy = [], [], [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def login(_):
+        timing = []
+        try:
+            with Timer(timing):
+                hasher.verify('bench-password', stored)
+        except HasherBusy:
+            with lock:
+                busy[0] += 1
+            return
+        with lock:
+            samples.extend(timing)
+
+    prober = threading.Thread(target=probe, args=(stop, probe_samples))
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return samples, probe_samples, busy[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--max-pending', type=int, default=32)
+    args = parser.parse_args()
+
+    stored = PasswordHasher(rounds=args.rounds).hash('bench-password')
+    print(f"{args.logins} verifications (cost {args.rounds}) from {args.threads} threads\n")
+    for label, workers in (('inline', 0), (f'pool ({args.workers} processes)', args.workers)):
+        hasher = PasswordHasher(rounds=args.rounds, workers=workers, max_pending=args.max_pending, timeout=60)
+        if workers:
+            hasher.verify('warm-up', stored)
+        try:
+            samples, probe_samples, busy, elapsed = run(hasher, stored, args.logins, args.threads)
+        finally:
+            hasher.close()
+        print(f"{label}: {len(samples) / elapsed:.1f} verifications/s, {busy} turned away as busy")
+        print_summary('  verify', summarize(samples))
+        print_summary('  probe (other request work)', summarize(probe_samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: recurring series vs single bookings
+
+Books a weekly series (default 15 weeks x 2 consecutive turnos) with
+create_reservation_series and compares its latency with one
+create_reservation_atomic call and with booking the same slots one by one.
+Uses the fixture of bench_reservation_create.py (teacher-only room, docente
+participants), which is removed at the end.
+
+Usage: python benchmarks/bench_recurring_booking.py [--weeks 15] [--turnos 2] [--series 5] [--participants 4]
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from bench_reservation_create import SALA, setup_fixture, teardown_fixture
+from common import Timer, connect, print_summary, session_questions, summarize
+from main import ReservationManager, recurrence_slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--weeks', type=int, default=15)
+    parser.add_argument('--turnos', type=int, default=2)
+    parser.add_argument('--series', type=int, default=5, help="Series booked per path")
+    parser.add_argument('--participants', type=int, default=4)
+    args = parser.parse_args()
+
+    db = connect()
+    reservations = ReservationManager(db)
+    turnos = [t['id_turno'] for t in db.execute_query("SELECT id_turno FROM turno ORDER BY hora_inicio", fetch=True) or []]
+    if len(turnos) < args.turnos:
+        raise SystemExit(f"Error: need at least {args.turnos} turnos")
+
+    edificio, cis = setup_fixture(db, args.participants)
+    # Each series uses its own weekday block, far in the future
+    start = date.today() + timedelta(days=400)
+    start -= timedelta(days=start.weekday())
+
+    def series_slots(i: int):
+        first = start + timedelta(weeks=(args.weeks + 1) * (i // 7), days=i % 7)
+        return recurrence_slots(first, first + timedelta(weeks=args.weeks - 1), [first.weekday()],
+                                turnos[:args.turnos])
+
+    try:
+        n_slots = args.weeks * args.turnos
+        print(f"Series of {n_slots} slots ({args.weeks} weeks x {args.turnos} turnos), "
+              f"{args.participants} participant(s)\n")
+
+        single, series, one_by_one = [], [], []
+        before = session_questions(db)
+        for i in range(args.series):
+            with Timer(series):
+                ids, conflicts = reservations.create_reservation_series(cis[0], SALA, edificio, series_slots(i), cis)
+            if ids is None:
+                raise SystemExit(f"Error: series rejected: {conflicts[:3]}")
+        series_statements = (session_questions(db) - before - 1) / args.series
+
+        for i in range(args.series, 2 * args.series):
+            for j, (fecha, id_turno) in enumerate(series_slots(i)):
+                samples = single if j == 0 else []
+                with Timer(one_by_one):
+                    with Timer(samples):
+                        reservations.create_reservation_atomic(cis[0], SALA, edificio, fecha, id_turno, cis)
+
+        print_summary('single booking', summarize(single))
+        print_summary('series', summarize(series))
+        print(f"{'':32} statements/series={series_statements:.1f}")
+        total_one_by_one = sum(one_by_one) / args.series
+        print(f"{'one by one (per series)':32} mean={total_one_by_one:.3f} ms")
+        series_ms = summarize(series)['mean_ms']
+        if series_ms and single:
+            print(f"\nSeries / single booking: {series_ms / summarize(single)['mean_ms']:.1f}x the time")
+            print(f"Series vs one by one: {total_one_by_one / series_ms:.1f}x faster")
+    finally:
+        teardown_fixture(db, edificio, cis)
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: sequential vs transactional reservation creation
+
+Creates a throw-away teacher-only room and docente participants (exempt from
+the daily/weekly limits so every booking succeeds), books N slots through each
+path and reports latency and statements per booking. Fixture rows are removed
+at the end.
+
+Usage: python benchmarks/bench_reservation_create.py [--bookings 200] [--participants 4]
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from common import Timer, connect, print_summary, session_questions, summarize
+from main import ReservationManager
+
+SALA = 'Sala Benchmark'
+CI_BASE = 9000001
+
+
+def setup_fixture(db, num_participantes: int):
+    """Create the benchmark room and participants, return (edificio, cis)"""
+    edificio = db.execute_fetchone("SELECT nombre_edificio FROM edificio ORDER BY nombre_edificio LIMIT 1")
+    programa = db.execute_fetchone("SELECT nombre_programa, id_facultad FROM programa_academico LIMIT 1")
+    if not edificio or not programa:
+        raise SystemExit("Error: the database needs at least one edificio and one programa_academico")
+
+    edificio = edificio['nombre_edificio']
+    db.execute_query(
+        "INSERT IGNORE INTO sala (nombre_sala, edificio, capacidad, tipo_sala) VALUES (%s, %s, %s, 'docente')",
+        (SALA, edificio, max(num_participantes, 1))
+    )
+
+    cis = []
+    for i in range(num_participantes):
+        ci = f"{CI_BASE + i}-0"
+        db.execute_query(
+            "INSERT IGNORE INTO participante (ci, nombre, apellido, email) VALUES (%s, 'Bench', %s, %s)",
+            (ci, f"Runner{i}", f"bench.runner{i}@ucu.edu.uy")
+        )
+        db.execute_query(
+            "INSERT IGNORE INTO participante_programa_academico (ci_participante, nombre_programa, id_facultad, rol) VALUES (%s, %s, %s, 'docente')",
+            (ci, programa['nombre_programa'], programa['id_facultad'])
+        )
+        cis.append(ci)
+    return edificio, cis
+
+
+def teardown_fixture(db, edificio: str, cis):
+    """Remove every row created by the benchmark"""
+    db.execute_query("DELETE FROM reserva WHERE nombre_sala = %s AND edificio = %s", (SALA, edificio))
+    db.execute_query("DELETE FROM sala WHERE nombre_sala = %s AND edificio = %s", (SALA, edificio))
+    for ci in cis:
+        db.execute_query("DELETE FROM participante WHERE ci = %s", (ci,))
+
+
+def slots(turnos, start: date, count: int):
+    """Yield `count` distinct (fecha, id_turno) pairs starting at `start`"""
+    for i in range(count):
+        yield start + timedelta(days=i // len(turnos)), turnos[i % len(turnos)]
+
+
+def run_path(db, create, edificio, cis, turnos, start: date, bookings: int):
+    """Book `bookings` slots with `create`, return (summary, statements per booking)"""
+    samples = []
+    failures = 0
+    before = session_questions(db)
+    for fecha, id_turno in slots(turnos, start, bookings):
+        with Timer(samples):
+            id_reserva = create(cis[0], SALA, edificio, fecha, id_turno, cis)
+        if not id_reserva:
+            failures += 1
+    # Each session_questions() call itself counts as one statement
+    statements = (session_questions(db) - before - 1) / bookings
+    return summarize(samples), statements, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=200)
+    parser.add_argument('--participants', type=int, default=4)
+    args = parser.parse_args()
+
+    db = connect()
+    reservations = ReservationManager(db)
+    turnos = [t['id_turno'] for t in db.execute_query("SELECT id_turno FROM turno ORDER BY hora_inicio", fetch=True) or []]
+    if not turnos:
+        raise SystemExit("Error: the turno table is empty")
+
+    edificio, cis = setup_fixture(db, args.participants)
+    days_needed = args.bookings // len(turnos) + 1
+    start = date.today() + timedelta(days=365)
+
+    def atomic(*booking):
+        id_reserva, _ = reservations.create_reservation_atomic(*booking)
+        return id_reserva
+
+    try:
+        print(f"Booking {args.bookings} slots with {args.participants} participant(s) each\n")
+        results = {}
+        for label, create, offset in (
+            ('sequential (create_reservation_sequential)', reservations.create_reservation_sequential, 0),
+            ('transactional (create_reservation_atomic)', atomic, days_needed),
+        ):
+            summary, statements, failures = run_path(
+                db, create, edificio, cis, turnos, start + timedelta(days=offset), args.bookings
+            )
+            results[label] = summary
+            print_summary(label.split(' ')[0], summary)
+            print(f"{'':32} statements/booking={statements:.1f} failures={failures}")
+
+        base, new = (r['mean_ms'] for r in results.values())
+        if new:
+            print(f"\nSpeed-up (mean): {base / new:.2f}x")
+    finally:
+        teardown_fixture(db, edificio, cis)
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: access token validation per request
+
+Validates the token of one participant --requests times in each mode:
+the access_token lookup with the token cache disabled (every request a
+query), with the cache on (the default) and signed tokens checked in
+memory. Reports latency and statements per validation.
+
+Usage: python benchmarks/bench_token_validation.py [--requests 2000]
+"""
+
+import argparse
+from datetime import timedelta
+
+from common import Timer, connect, print_summary, session_questions, summarize
+from database_service import DatabaseService
+from signed_tokens import TokenSigner
+from token_cache import TokenCache
+
+
+def run(service: DatabaseService, ci: str, requests: int):
+    token = service.generate_access_token(ci, False)
+    if not token:
+        raise SystemExit("Error: could not issue a token")
+    samples = []
+    before = session_questions(service.db)
+    for _ in range(requests):
+        with Timer(samples):
+            if service.validate_access_token(token) is None:
+                raise SystemExit("Error: token rejected")
+    statements = session_questions(service.db) - before - 1
+    service.revoke_access_token(token)
+    return samples, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    db = connect()
+    participant = db.execute_fetchone("SELECT ci FROM participante LIMIT 1")
+    if not participant:
+        raise SystemExit("Error: no participants, run generate_sample_data.py first")
+
+    modes = (
+        ('db, no cache', DatabaseService(db, token_cache=TokenCache(ttl=0))),
+        ('db, token cache', DatabaseService(db)),
+        ('signed', DatabaseService(db, token_signer=TokenSigner(b'bench-secret', timedelta(days=7)))),
+    )
+    print(f"{args.requests} validations per mode\n")
+    try:
+        for label, service in modes:
+            samples, statements = run(service, participant['ci'], args.requests)
+            print_summary(label, summarize(samples))
+            print(f"{'':32} {statements / args.requests:.3f} statements/validation")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark: request throughput of the dev server vs the gunicorn entry point
+
+Starts each server as a subprocess on the same port, logs in from
+--clients concurrent keep-alive HTTP clients and has them cycle through
+/dashboard, /rooms and /my-reservations for --duration seconds. Reports
+requests per second and the latency distribution of each mode:
+
+- dev:      python app.py (Werkzeug server, reloader and debugger on)
+- gunicorn: gunicorn -c gunicorn.conf.py wsgi:app (--workers x --threads)
+
+A benchmark user is created and removed at the end.
+
+Usage: python benchmarks/bench_wsgi_throughput.py [--clients 32] [--duration 20] [--workers 4] [--threads 4]
+       [--modes dev,gunicorn] [--port 5055] [--output throughput.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+import bcrypt
+
+from common import DB_CONFIG, ROOT_DIR, Timer, connect, summarize
+
+CI = '9200101-0'
+EMAIL = 'bench.wsgi@ucu.edu.uy'
+PASSWORD = 'bench-password'
+PATHS = ('/dashboard', '/rooms', '/my-reservations')
+
+
+def setup_fixture(db):
+    """Create the benchmark user"""
+    programa = db.execute_fetchone("SELECT nombre_programa, id_facultad FROM programa_academico LIMIT 1")
+    if not programa:
+        raise SystemExit("Error: the database needs at least one programa_academico")
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    db.execute_query(
+        "INSERT IGNORE INTO participante (ci, nombre, apellido, email) VALUES (%s, 'Bench', 'Wsgi', %s)",
+        (CI, EMAIL)
+    )
+    db.execute_query("REPLACE INTO login (correo, password) VALUES (%s, %s)", (EMAIL, hashed))
+    db.execute_query(
+        "INSERT IGNORE INTO participante_programa_academico (ci_participante, nombre_programa, id_facultad, rol) VALUES (%s, %s, %s, 'alumno')",
+        (CI, programa['nombre_programa'], programa['id_facultad'])
+    )
+
+
+def teardown_fixture(db):
+    """Remove the benchmark user (tokens cascade)"""
+    db.execute_query("DELETE FROM participante WHERE ci = %s", (CI,))
+
+
+def server_command(mode: str, port: int, workers: int, threads: int):
+    """(argv, environment) to start one server mode"""
+    env = dict(os.environ, DB_HOST=DB_CONFIG['host'], DB_USER=DB_CONFIG['user'],
+               DB_PASSWORD=DB_CONFIG['password'], DB_NAME=DB_CONFIG['database'],
+               FINALIZER_INTERVAL='0', TOKEN_CLEANUP_INTERVAL='0', REPORT_SNAPSHOT_MAX_AGE='0', PYTHONUNBUFFERED='1')
+    if mode == 'dev':
+        env.update(PORT=str(port))
+        return [sys.executable, 'app.py'], env
+    env.update(WEB_BIND=f'127.0.0.1:{port}', WEB_WORKERS=str(workers), WEB_THREADS=str(threads),
+               WEB_ACCESS_LOG='/dev/null')
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env
+
+
+def wait_ready(port: int, process, timeout: float = 60.0) -> bool:
+    """Poll /login until the server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/login')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def stop_server(process):
+    """SIGTERM the whole process group (the reloader and gunicorn both have children)"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+class Client:
+    """One logged-in keep-alive HTTP connection"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn = None
+        self.cookies = {}
+
+    def request(self, method: str, path: str, body: str = None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = {'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items())}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        for cookie in response.msg.get_all('Set-Cookie') or []:
+            name, _, value = cookie.split(';', 1)[0].partition('=')
+            self.cookies[name] = value
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        return response.status
+
+    def login(self) -> bool:
+        return self.request('POST', '/login', urlencode({'email': EMAIL, 'password': PASSWORD})) == 302
+
+
+def run_load(port: int, clients: int, duration: float):
+    """Latency samples and error count of `clients` threads hammering PATHS"""
+    samples, errors, lock = [], [0], threading.Lock()
+    logged_in = threading.Barrier(clients + 1)
+    stop = threading.Event()
+
+    def worker(offset):
+        client = Client(port)
+        try:
+            ok = client.login()
+        except (OSError, http.client.HTTPException):
+            ok = False
+        logged_in.wait()
+        local, failed, i = [], 0, offset
+        while ok and not stop.is_set():
+            try:
+                with Timer(local):
+                    status = client.request('GET', PATHS[i % len(PATHS)])
+                failed += status >= 400
+            except (OSError, http.client.HTTPException):
+                failed += 1
+            i += 1
+        with lock:
+            samples.extend(local)
+            errors[0] += failed + (not ok)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    logged_in.wait()
+    started = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples, errors[0], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds of load per mode")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--modes', default='dev,gunicorn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    db = connect()
+    setup_fixture(db)
+    results = {}
+    try:
+        for mode in args.modes.split(','):
+            argv, env = server_command(mode, args.port, args.workers, args.threads)
+            process = subprocess.Popen(argv, cwd=ROOT_DIR, env=env, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                       start_new_session=True)
+            try:
+                if not wait_ready(args.port, process):
+                    print(f"✗ {mode}: server did not start (run `{' '.join(argv)}` to see why)")
+                    continue
+                samples, errors, elapsed = run_load(args.port, args.clients, args.duration)
+            finally:
+                stop_server(process)
+            result = summarize(samples)
+            result.update(requests_per_second=round(len(samples) / elapsed, 1), errors=errors)
+            results[mode] = result
+            print(f"{mode:10} {result['requests_per_second']:>8.1f} req/s  p50={result['p50_ms']:>8.3f}ms "
+                  f"p95={result['p95_ms']:>8.3f}ms p99={result['p99_ms']:>8.3f}ms errors={errors}")
+    finally:
+        teardown_fixture(db)
+        db.disconnect()
+
+    if 'dev' in results and 'gunicorn' in results and results['dev']['requests_per_second']:
+        speedup = results['gunicorn']['requests_per_second'] / results['dev']['requests_per_second']
+        print(f"\ngunicorn ({args.workers} workers x {args.threads} threads) vs dev server: {speedup:.2f}x throughput")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clients': args.clients, 'duration': args.duration, 'workers': args.workers,
+                       'threads': args.threads, 'results': results}, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Shared helpers for the benchmark scripts
+Connection settings come from the same environment variables as the app
+"""
+
+import os
+import sys
+import time
+from typing import Dict, List
+
+# Make the application modules importable when running `python benchmarks/<script>.py`
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from main import DatabaseManager
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', '127.0.0.1'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', 'rootpassword'),
+    'database': os.environ.get('DB_NAME', 'UCU_SalasDeEstudio')
+}
+
+
+def connect(pool_size: int = 0) -> DatabaseManager:
+    """Open a DatabaseManager against the benchmark database or exit"""
+    db = DatabaseManager(**DB_CONFIG, pool_size=pool_size)
+    if not db.connect():
+        print(f"Error: Could not connect to {DB_CONFIG['host']} as {DB_CONFIG['user']}")
+        sys.exit(1)
+    return db
+
+
+def session_questions(db: DatabaseManager) -> int:
+    """Statements sent by this session so far (single-connection mode only)"""
+    row = db.execute_fetchone("SHOW SESSION STATUS LIKE 'Questions'")
+    return int(row['Value']) if row else 0
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples_ms: List[float]) -> Dict:
+    """Latency summary in milliseconds"""
+    total = sum(samples_ms)
+    return {
+        'n': len(samples_ms),
+        'mean_ms': round(total / len(samples_ms), 3) if samples_ms else 0.0,
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+class Timer:
+    """Context manager collecting elapsed milliseconds into a list"""
+
+    def __init__(self, samples: List[float]):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+def print_summary(label: str, summary: Dict):
+    """Print one line of a latency summary"""
+    print(f"{label:32} n={summary['n']:<6} mean={summary['mean_ms']:>9.3f}ms "
+          f"p50={summary['p50_ms']:>9.3f}ms p95={summary['p95_ms']:>9.3f}ms "
+          f"p99={summary['p99_ms']:>9.3f}ms")
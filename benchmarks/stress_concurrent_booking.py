@@ -0,0 +1,214 @@
+"""
+Stress test: concurrent bookings of the same slots
+
+Fires hundreds of create_reservation_atomic calls at once from a thread pool
+(pooled DatabaseManager) against a handful of slots in a few throw-away
+teacher-only rooms, with participants shared between requests, and checks
+the outcome in the database:
+
+- no slot of a room has more than one active reservation
+- no participant has two active reservations in the same turno
+- every successful call maps to exactly one active reservation
+- requests sent twice with the same idempotency key get the same reservation
+- a cancelled slot can be booked again
+
+Fixture rows are removed at the end. Exits with status 1 on any violation.
+
+Usage: python benchmarks/stress_concurrent_booking.py [--requests 400] [--threads 32] [--rooms 3] [--slots 4] [--people 12]
+"""
+
+import argparse
+import random
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from common import Timer, connect, print_summary, summarize
+from main import ReservationManager
+
+SALA_PREFIX = 'Sala Stress'
+CI_BASE = 9100001
+
+
+def setup_fixture(db, num_rooms: int, num_people: int):
+    """Create the stress rooms and docente participants, return (edificio, salas, cis)"""
+    edificio = db.execute_fetchone("SELECT nombre_edificio FROM edificio ORDER BY nombre_edificio LIMIT 1")
+    programa = db.execute_fetchone("SELECT nombre_programa, id_facultad FROM programa_academico LIMIT 1")
+    if not edificio or not programa:
+        raise SystemExit("Error: the database needs at least one edificio and one programa_academico")
+
+    edificio = edificio['nombre_edificio']
+    salas = [f"{SALA_PREFIX} {i + 1}" for i in range(num_rooms)]
+    for sala in salas:
+        db.execute_query(
+            "INSERT IGNORE INTO sala (nombre_sala, edificio, capacidad, tipo_sala) VALUES (%s, %s, %s, 'docente')",
+            (sala, edificio, 4)
+        )
+
+    cis = []
+    for i in range(num_people):
+        ci = f"{CI_BASE + i}-0"
+        db.execute_query(
+            "INSERT IGNORE INTO participante (ci, nombre, apellido, email) VALUES (%s, 'Stress', %s, %s)",
+            (ci, f"User{i}", f"stress.user{i}@ucu.edu.uy")
+        )
+        db.execute_query(
+            "INSERT IGNORE INTO participante_programa_academico (ci_participante, nombre_programa, id_facultad, rol) VALUES (%s, %s, %s, 'docente')",
+            (ci, programa['nombre_programa'], programa['id_facultad'])
+        )
+        cis.append(ci)
+    return edificio, salas, cis
+
+
+def teardown_fixture(db, edificio: str, salas, cis):
+    """Remove every row created by the stress test"""
+    for sala in salas:
+        db.execute_query("DELETE FROM reserva WHERE nombre_sala = %s AND edificio = %s", (sala, edificio))
+        db.execute_query("DELETE FROM sala WHERE nombre_sala = %s AND edificio = %s", (sala, edificio))
+    for ci in cis:
+        db.execute_query("DELETE FROM participante WHERE ci = %s", (ci,))
+
+
+def build_requests(count: int, salas, cis, slots, seed: int):
+    """Random booking requests; every tenth one is sent twice with the same idempotency key"""
+    rng = random.Random(seed)
+    requests = []
+    for i in range(count):
+        requester, companion = rng.sample(cis, 2)
+        fecha, id_turno = rng.choice(slots)
+        request = {'ci': requester, 'sala': rng.choice(salas), 'fecha': fecha, 'id_turno': id_turno,
+                   'participantes': [requester, companion], 'key': f"stress-{seed}-{i}"}
+        requests.append(request)
+        if i % 10 == 0:
+            requests.append(dict(request))
+    rng.shuffle(requests)
+    return requests
+
+
+def check_invariants(db, edificio: str, salas, results) -> list:
+    """Violations found in the database after the run"""
+    placeholders = ", ".join(["%s"] * len(salas))
+    violations = []
+
+    rows = db.execute_query(f"""
+        SELECT nombre_sala, fecha, id_turno, COUNT(*) AS reservas
+        FROM reserva
+        WHERE edificio = %s AND nombre_sala IN ({placeholders}) AND estado = 'activa'
+        GROUP BY nombre_sala, fecha, id_turno
+        HAVING COUNT(*) > 1
+    """, (edificio, *salas), fetch=True) or []
+    violations += [f"room double-booked: {r['nombre_sala']} {r['fecha']} turno {r['id_turno']} "
+                   f"({r['reservas']} active)" for r in rows]
+
+    rows = db.execute_query(f"""
+        SELECT rp.ci_participante, r.fecha, r.id_turno, COUNT(*) AS reservas
+        FROM reserva r
+        JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+        WHERE r.edificio = %s AND r.nombre_sala IN ({placeholders}) AND r.estado = 'activa'
+        GROUP BY rp.ci_participante, r.fecha, r.id_turno
+        HAVING COUNT(*) > 1
+    """, (edificio, *salas), fetch=True) or []
+    violations += [f"participant double-booked: {r['ci_participante']} {r['fecha']} turno {r['id_turno']} "
+                   f"({r['reservas']} active)" for r in rows]
+
+    active = db.execute_fetchone(f"""
+        SELECT COUNT(*) AS n FROM reserva
+        WHERE edificio = %s AND nombre_sala IN ({placeholders}) AND estado = 'activa'
+    """, (edificio, *salas))['n']
+    created = {id_reserva for _, id_reserva, _ in results if id_reserva}
+    if len(created) != active:
+        violations.append(f"{len(created)} distinct reservations returned but {active} active in the database")
+
+    by_key = {}
+    for request, id_reserva, _ in results:
+        if id_reserva:
+            by_key.setdefault(request['key'], set()).add(id_reserva)
+    violations += [f"idempotency key {key} created {len(ids)} reservations"
+                   for key, ids in by_key.items() if len(ids) > 1]
+    return violations
+
+
+def check_rebooking(reservations, db, edificio: str, sala: str, fecha: date, id_turno: int, cis) -> list:
+    """Cancel and book the same slot again"""
+    first, rejections = reservations.create_reservation_atomic(cis[0], sala, edificio, fecha, id_turno, cis[:1])
+    if first is None:
+        return [f"could not book the re-booking slot: {rejections}"]
+    db.execute_query("UPDATE reserva SET estado = 'cancelada' WHERE id_reserva = %s", (first,))
+    second, rejections = reservations.create_reservation_atomic(cis[1], sala, edificio, fecha, id_turno, cis[1:2])
+    if second is None:
+        return [f"cancelled slot could not be booked again: {rejections}"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rooms', type=int, default=3)
+    parser.add_argument('--slots', type=int, default=4, help="(fecha, turno) pairs the requests compete for")
+    parser.add_argument('--people', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    db = connect(pool_size=args.threads)
+    reservations = ReservationManager(db)
+    if not reservations.ensure_schema():
+        raise SystemExit("Error: could not prepare the reservation schema")
+    turnos = [t['id_turno'] for t in db.execute_query("SELECT id_turno FROM turno ORDER BY hora_inicio", fetch=True) or []]
+    if not turnos:
+        raise SystemExit("Error: the turno table is empty")
+
+    edificio, salas, cis = setup_fixture(db, args.rooms, max(args.people, 2))
+    start = date.today() + timedelta(days=500)
+    slots = [(start + timedelta(days=i // len(turnos)), turnos[i % len(turnos)]) for i in range(args.slots)]
+    requests = build_requests(args.requests, salas, cis, slots, args.seed)
+    # Workers hold until every request is queued, then all start at once
+    go = threading.Event()
+    samples, samples_lock = [], threading.Lock()
+
+    def book(request):
+        go.wait()
+        timing = []
+        with Timer(timing):
+            id_reserva, rejections = reservations.create_reservation_atomic(
+                request['ci'], request['sala'], edificio, request['fecha'], request['id_turno'],
+                request['participantes'], idempotency_key=request['key']
+            )
+        with samples_lock:
+            samples.extend(timing)
+        return request, id_reserva, rejections
+
+    try:
+        print(f"{len(requests)} booking requests from {args.threads} threads on {args.rooms} room(s) x "
+              f"{args.slots} slot(s), {len(cis)} participants\n")
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            futures = [pool.submit(book, request) for request in requests]
+            go.set()
+            results = [future.result() for future in futures]
+
+        outcomes = Counter(rejections[0]['code'] if rejections else 'created' for _, _, rejections in results)
+        print_summary('create_reservation_atomic', summarize(samples))
+        for outcome, count in outcomes.most_common():
+            print(f"  {outcome:30} {count}")
+
+        violations = check_invariants(db, edificio, salas, results)
+        rebook_fecha = start + timedelta(days=args.slots // len(turnos) + 1)
+        violations += check_rebooking(reservations, db, edificio, salas[0], rebook_fecha, turnos[0], cis)
+        if outcomes.get('database_error'):
+            violations.append(f"{outcomes['database_error']} request(s) failed with a database error")
+    finally:
+        teardown_fixture(db, edificio, salas, cis)
+        db.disconnect()
+
+    if violations:
+        print("\n✗ Violations:")
+        for violation in violations:
+            print(f"  - {violation}")
+        sys.exit(1)
+    print("\n✓ No double bookings, idempotent replays and re-bookable cancelled slots")
+
+
+if __name__ == "__main__":
+    main()
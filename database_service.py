@@ -5,17 +5,38 @@ Handles all database interactions and business logic
 
 from datetime import datetime, date, time, timedelta
 from typing import Optional, List, Dict, Tuple
-from main import DatabaseManager, AuthManager, ReservationManager, ReportManager, DataInitializer
+from mysql.connector import Error, errorcode
+from main import DatabaseManager, AuthManager, ReservationManager, ReportManager, DataInitializer, REJECTION_MESSAGES
+from availability_index import AvailabilityIndex, rank_free_slots
+from token_cache import TokenCache
+from password_hasher import PasswordHasher, HasherBusy
+from signed_tokens import TokenSigner, RevocationList
+from report_snapshots import ReportSnapshotEngine
+from reference_cache import ReferenceDataCache
+from role_cache import RoleCache
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, keyset_condition, keyset_params, build_page
+from metrics import registry as metrics
 
 
 class DatabaseService:
     """Service layer for database operations"""
     
-    def __init__(self, db: DatabaseManager):
+    def __init__(self, db: DatabaseManager, token_cache: TokenCache = None,
+                 hasher: PasswordHasher = None,
+                 token_signer: TokenSigner = None, revocation_refresh: float = 30.0):
         self.db = db
-        self.auth = AuthManager(db)
+        self.token_cache = token_cache or TokenCache()
+        # With a signer, access tokens are signed and checked in memory instead of stored in access_token
+        self.token_signer = token_signer
+        self.revocations = RevocationList(db, token_signer.ttl, revocation_refresh) if token_signer else None
+        self.auth = AuthManager(db, hasher)
+        self.roles = RoleCache(self.auth)
         self.reservation = ReservationManager(db)
+        self.quota = self.reservation.quota
         self.report = ReportManager(db)
+        self.availability = AvailabilityIndex(db)
+        self.report_snapshots = ReportSnapshotEngine(db)
+        self.reference = ReferenceDataCache(db)
     
     # ==================== AUTHENTICATION ====================
     
@@ -33,8 +54,12 @@ class DatabaseService:
         return self.auth.register(ci, nombre, apellido, email, password)
     
     def get_user_role(self, ci: str) -> Optional[Dict]:
-        """Get user's role and program info"""
-        return self.auth.get_user_role(ci)
+        """Get user's primary role and program info (cached per ci)"""
+        return self.roles.primary(ci)
+    
+    def get_user_roles(self, ci: str) -> List[Dict]:
+        """Get every role/program affiliation of a user (cached per ci)"""
+        return self.roles.roles(ci)
     
     def is_admin(self, ci: str) -> bool:
         """Check if user is an admin"""
@@ -52,12 +77,20 @@ class DatabaseService:
             # If column doesn't exist yet, return False
             return False
     
-    def generate_access_token(self, ci: str, is_admin: bool) -> str:
-        """Generate a new access token for a user (valid for 1 week)"""
+    def generate_access_token(self, ci: str, is_admin: bool, user: Dict = None) -> str:
+        """Generate a new access token for a user (valid for 1 week)
+        
+        In signed mode the token embeds `user` (nombre, apellido, email),
+        read from participante when not given.
+        """
         import secrets
         import hashlib
         from datetime import datetime, timedelta
         
+        if self.token_signer is not None:
+            user = user or self.get_participante(ci)
+            return self.token_signer.issue({**user, 'ci': ci, 'is_admin': is_admin}) if user else None
+        
         # Generate a secure random token
         raw_token = secrets.token_urlsafe(32)
         token_hash = hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
@@ -77,50 +110,94 @@ class DatabaseService:
             # If token generation fails, return None
             return None
     
+    def _hash_token(self, token: str) -> str:
+        """SHA-256 hash under which a token is stored"""
+        import hashlib
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
     def validate_access_token(self, token: str) -> Optional[Dict]:
         """Validate an access token and return user info if valid"""
-        import hashlib
-        
         if not token:
             return None
+        if self.token_signer is not None:
+            return self._validate_signed_token(token)
         
         # Hash the token to compare with stored hash
-        token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
-        
-        # Check if token exists and is not expired
-        result = self.db.execute_fetchone(
-            """SELECT at.ci_participante, at.is_admin, p.nombre, p.apellido, p.email
-               FROM access_token at
-               JOIN participante p ON at.ci_participante = p.ci
-               WHERE at.token = %s 
-               AND at.fecha_expiracion > NOW()""",
-            (token_hash,)
-        )
+        token_hash = self._hash_token(token)
         
-        if result:
-            # Update last access time
-            self.db.execute_query(
-                "UPDATE access_token SET ultimo_acceso = NOW() WHERE token = %s",
+        user = self.token_cache.get(token_hash)
+        if user is not None:
+            metrics.inc('ucu_token_validations_total', ('hit',))
+        else:
+            # Check if token exists and is not expired
+            result = self.db.execute_fetchone(
+                """SELECT at.ci_participante, at.is_admin, at.fecha_expiracion,
+                          p.nombre, p.apellido, p.email
+                   FROM access_token at
+                   JOIN participante p ON at.ci_participante = p.ci
+                   WHERE at.token = %s 
+                   AND at.fecha_expiracion > NOW()""",
                 (token_hash,)
             )
-            return {
+            if not result:
+                metrics.inc('ucu_token_validations_total', ('invalid',))
+                return None
+            metrics.inc('ucu_token_validations_total', ('miss',))
+            
+            user = {
                 'ci': result['ci_participante'],
                 'nombre': result['nombre'],
                 'apellido': result['apellido'],
                 'email': result['email'],
                 'is_admin': bool(result['is_admin'])
             }
+            self.token_cache.put(token_hash, user, result['fecha_expiracion'])
+        
+        # Last access time is written in batches by the maintenance thread, not by requests
+        self.token_cache.touch(token_hash)
+        return user
+    
+    def _validate_signed_token(self, token: str) -> Optional[Dict]:
+        """Signature, expiry and revocation check, all in memory"""
+        claims = self.token_signer.decode(token)
+        if claims is None:
+            metrics.inc('ucu_token_validations_total', ('invalid',))
+            return None
+        if self.revocations.is_revoked(claims):
+            metrics.inc('ucu_token_validations_total', ('revoked',))
+            return None
+        metrics.inc('ucu_token_validations_total', ('signed',))
+        return self.token_signer.user(claims)
+    
+    def flush_token_access(self, force: bool = False, db: DatabaseManager = None) -> int:
+        """Write pending `ultimo_acceso` updates in one statement per 500 tokens
         
-        return None
+        Pass `db` to write on another connection (the maintenance job's).
+        """
+        db = db or self.db
+        token_hashes = self.token_cache.drain_touched(force)
+        updated = 0
+        for i in range(0, len(token_hashes), 500):
+            chunk = token_hashes[i:i + 500]
+            placeholders = ','.join(['%s'] * len(chunk))
+            result = db.execute_query(
+                f"UPDATE access_token SET ultimo_acceso = NOW() WHERE token IN ({placeholders})",
+                tuple(chunk)
+            )
+            updated += result or 0
+        return updated
     
     def revoke_access_token(self, token: str) -> bool:
         """Revoke (delete) an access token"""
-        import hashlib
-        
         if not token:
             return False
+        if self.token_signer is not None:
+            # Expired tokens need no revocation, but a late logout should still work
+            claims = self.token_signer.decode(token, verify_expiry=False)
+            return claims is not None and self.revocations.revoke_token(claims)
         
-        token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        token_hash = self._hash_token(token)
+        self.token_cache.evict(token_hash)
         
         try:
             self.db.execute_query(
@@ -131,15 +208,6 @@ class DatabaseService:
         except Exception:
             return False
     
-    def cleanup_expired_tokens(self):
-        """Remove expired tokens from database"""
-        try:
-            self.db.execute_query(
-                "DELETE FROM access_token WHERE fecha_expiracion < NOW()"
-            )
-        except Exception:
-            pass
-    
     # ==================== PARTICIPANTS ====================
     
     def get_all_participantes(self):
@@ -149,6 +217,35 @@ class DatabaseService:
             fetch=True
         ) or []
     
+    def list_participantes(self, filtros: Dict = None, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """One page of participants ordered by (apellido, nombre, ci)
+        
+        `filtros` may hold 'ci' (prefix match). Programs are aggregated only
+        for the participants on the page.
+        """
+        filtros = filtros or {}
+        where, params = ["TRUE"], []
+        if filtros.get('ci'):
+            where.append("p.ci LIKE %s")
+            params.append(filtros['ci'] + '%')
+        key = decode_cursor(cursor, 3)
+        if key:
+            where.append(keyset_condition(['p.apellido', 'p.nombre', 'p.ci'], descending=False))
+            params += keyset_params(key)
+        
+        query = f"""
+            SELECT p.*,
+                   (SELECT GROUP_CONCAT(CONCAT(ppa.rol, ' - ', ppa.nombre_programa) SEPARATOR ', ')
+                    FROM participante_programa_academico ppa
+                    WHERE ppa.ci_participante = p.ci) as programas
+            FROM participante p
+            WHERE {' AND '.join(where)}
+            ORDER BY p.apellido, p.nombre, p.ci
+            LIMIT %s
+        """
+        rows = self.db.execute_query(query, tuple(params + [page_size + 1]), fetch=True) or []
+        return build_page(rows, page_size, ['apellido', 'nombre', 'ci'])
+    
     def get_participante(self, ci: str):
         """Get a single participant"""
         return self.db.execute_fetchone("SELECT * FROM participante WHERE ci = %s", (ci,))
@@ -160,6 +257,12 @@ class DatabaseService:
         if existing:
             return False, "Participant with this CI or email already exists"
         
+        try:
+            # Hash first: if the hasher is busy nothing has been written yet
+            hashed = self.auth.hasher.hash(password) if password else None
+        except HasherBusy:
+            return False, "Server busy, please try again in a few seconds"
+        
         try:
             # Insert participant
             self.db.execute_query(
@@ -169,11 +272,9 @@ class DatabaseService:
             
             # Create login if password provided
             if password:
-                import bcrypt
-                hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
                 self.db.execute_query(
                     "INSERT INTO login (correo, password) VALUES (%s, %s)",
-                    (email, hashed.decode('utf-8'))
+                    (email, hashed)
                 )
             
             # Associate with program if provided
@@ -183,6 +284,7 @@ class DatabaseService:
                     (ci, nombre_programa, int(id_facultad), rol)
                 )
             
+            self.roles.invalidate(ci)
             return True, "Participant created successfully"
         except Exception as e:
             return False, str(e)
@@ -194,6 +296,7 @@ class DatabaseService:
                 "UPDATE participante SET nombre = %s, apellido = %s, email = %s WHERE ci = %s",
                 (nombre, apellido, email, ci)
             )
+            self.roles.invalidate(ci)
             return True, "Participant updated successfully"
         except Exception as e:
             return False, str(e)
@@ -202,6 +305,11 @@ class DatabaseService:
         """Delete a participant"""
         try:
             self.db.execute_query("DELETE FROM participante WHERE ci = %s", (ci,))
+            # Their tokens are gone via ON DELETE CASCADE; signed ones must be revoked
+            self.token_cache.evict_ci(ci)
+            if self.revocations is not None:
+                self.revocations.revoke_ci(ci)
+            self.roles.invalidate(ci)
             return True, "Participant deleted successfully"
         except Exception as e:
             return False, str(e)
@@ -229,6 +337,7 @@ class DatabaseService:
                 "INSERT INTO participante_programa_academico (ci_participante, nombre_programa, id_facultad, rol) VALUES (%s, %s, %s, %s)",
                 (ci, nombre_programa, int(id_facultad), rol)
             )
+            self.roles.invalidate(ci)
             return True, "Program added successfully"
         except Exception as e:
             return False, str(e)
@@ -251,6 +360,7 @@ class DatabaseService:
             )
             
             if result is not None and result > 0:
+                self.roles.invalidate(ci)
                 return True, "Program removed successfully"
             else:
                 return False, "Program not found"
@@ -265,10 +375,7 @@ class DatabaseService:
     
     def get_all_programas(self):
         """Get all academic programs"""
-        return self.db.execute_query(
-            "SELECT pa.*, f.nombre as nombre_facultad FROM programa_academico pa JOIN facultad f ON pa.id_facultad = f.id_facultad ORDER BY f.nombre, pa.nombre_programa",
-            fetch=True
-        ) or []
+        return self.reference.programas()
     
     def get_programa(self, nombre_programa: str, id_facultad: int):
         """Get a single program"""
@@ -292,6 +399,7 @@ class DatabaseService:
                 "INSERT INTO programa_academico (nombre_programa, id_facultad, tipo) VALUES (%s, %s, %s)",
                 (nombre_programa, int(id_facultad), tipo)
             )
+            self.reference.invalidate('programa')
             return True, "Program created successfully"
         except Exception as e:
             return False, str(e)
@@ -312,6 +420,9 @@ class DatabaseService:
                 "UPDATE programa_academico SET nombre_programa = %s, id_facultad = %s, tipo = %s WHERE nombre_programa = %s AND id_facultad = %s",
                 (nuevo_nombre, nuevo_id_facultad, tipo, nombre_programa, id_facultad)
             )
+            self.reference.invalidate('programa')
+            # A renamed program or changed tipo affects everyone enrolled in it
+            self.roles.invalidate()
             return True, "Program updated successfully"
         except Exception as e:
             return False, str(e)
@@ -332,16 +443,14 @@ class DatabaseService:
                 "DELETE FROM programa_academico WHERE nombre_programa = %s AND id_facultad = %s",
                 (nombre_programa, id_facultad)
             )
+            self.reference.invalidate('programa')
             return True, "Program deleted successfully"
         except Exception as e:
             return False, str(e)
     
     def get_programas(self):
         """Get all academic programs for dropdown"""
-        return self.db.execute_query(
-            "SELECT pa.nombre_programa, pa.id_facultad, pa.tipo, f.nombre as nombre_facultad FROM programa_academico pa JOIN facultad f ON pa.id_facultad = f.id_facultad ORDER BY f.nombre, pa.nombre_programa",
-            fetch=True
-        ) or []
+        return self.reference.programas()
     
     # ==================== ROOMS (SALAS) ====================
     
@@ -352,6 +461,37 @@ class DatabaseService:
             fetch=True
         ) or []
     
+    def list_salas(self, filtros: Dict = None, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """One page of rooms ordered by (edificio, nombre_sala), optionally for one 'edificio'"""
+        filtros = filtros or {}
+        where, params = ["TRUE"], []
+        if filtros.get('edificio'):
+            where.append("s.edificio = %s")
+            params.append(filtros['edificio'])
+        key = decode_cursor(cursor, 2)
+        if key:
+            where.append(keyset_condition(['s.edificio', 's.nombre_sala'], descending=False))
+            params += keyset_params(key)
+        
+        query = f"""
+            SELECT s.*, e.direccion, e.departamento
+            FROM sala s JOIN edificio e ON s.edificio = e.nombre_edificio
+            WHERE {' AND '.join(where)}
+            ORDER BY s.edificio, s.nombre_sala
+            LIMIT %s
+        """
+        rows = self.db.execute_query(query, tuple(params + [page_size + 1]), fetch=True) or []
+        return build_page(rows, page_size, ['edificio', 'nombre_sala'])
+    
+    def _allowed_room_types(self, rol: str = None, tipo_programa: str = None) -> List[str]:
+        """Room types a user may book based on role and program type"""
+        allowed_types = ['libre']  # Everyone can access 'libre' rooms
+        if rol == 'docente':
+            allowed_types.append('docente')
+        elif tipo_programa == 'posgrado':
+            allowed_types.append('posgrado')
+        return allowed_types
+    
     def get_salas_for_user(self, rol: str = None, tipo_programa: str = None):
         """Get rooms filtered by user role and program type
         
@@ -374,15 +514,7 @@ class DatabaseService:
         params = []
         
         # Determine allowed room types based on user role and program type
-        allowed_types = ['libre']  # Everyone can access 'libre' rooms
-        
-        if rol == 'docente':
-            # Teachers can access 'libre' and 'docente' rooms
-            allowed_types.append('docente')
-        elif tipo_programa == 'posgrado':
-            # Postgraduate students can access 'libre' and 'posgrado' rooms
-            allowed_types.append('posgrado')
-        # Students (alumno) with grado programs only get 'libre' rooms (already in allowed_types)
+        allowed_types = self._allowed_room_types(rol, tipo_programa)
         
         # Build WHERE clause for room types
         placeholders = ','.join(['%s'] * len(allowed_types))
@@ -407,6 +539,54 @@ class DatabaseService:
             List of rooms that are available for ALL turnos in the specified time range
             and accessible to the user based on their role and program type
         """
+        if fecha and hora_inicio and hora_fin:
+            # Served from memory when the date is inside the index window
+            salas = self.availability.free_salas(fecha, hora_inicio, hora_fin,
+                                                 self._allowed_room_types(rol, tipo_programa))
+            if salas is not None:
+                return salas
+        return self.get_available_salas_sql(fecha, hora_inicio, hora_fin, rol, tipo_programa)
+    
+    def find_free_alternatives(self, nombre_sala: str, edificio: str, fecha: date, id_turno: int,
+                               rol: str = None, tipo_programa: str = None, k: int = 5,
+                               day_radius: int = 3, capacidad_min: int = 1) -> List[Dict]:
+        """Nearest free slots to a requested one: other turnos, rooms of the same building, nearby days
+        
+        Occupancy for the whole window (edificio x fecha ± day_radius) comes
+        from the availability index, or from one bulk query when the window
+        falls outside it; candidates are then ranked in memory.
+        """
+        fecha_desde = max(date.today(), fecha - timedelta(days=day_radius))
+        fecha_hasta = fecha + timedelta(days=day_radius)
+        if fecha_hasta < fecha_desde:
+            return []
+        fechas = [fecha_desde + timedelta(days=i) for i in range((fecha_hasta - fecha_desde).days + 1)]
+        
+        snapshot = self.availability.occupancy(edificio, fecha_desde, fecha_hasta)
+        if snapshot is not None:
+            salas, turnos, occupied = snapshot
+        else:
+            salas = self.db.execute_query(
+                "SELECT * FROM sala WHERE edificio = %s ORDER BY nombre_sala", (edificio,), fetch=True
+            ) or []
+            turnos = self.get_turnos()
+            occupied = {}
+            for r in self.db.execute_query(
+                """SELECT nombre_sala, edificio, fecha, id_turno
+                   FROM reserva
+                   WHERE edificio = %s AND estado = 'activa' AND fecha BETWEEN %s AND %s""",
+                (edificio, fecha_desde, fecha_hasta),
+                fetch=True
+            ) or []:
+                occupied.setdefault((r['nombre_sala'], r['edificio'], r['fecha']), set()).add(r['id_turno'])
+        
+        allowed = set(self._allowed_room_types(rol, tipo_programa))
+        salas = [s for s in salas if s['tipo_sala'] in allowed and s['capacidad'] >= capacidad_min]
+        return rank_free_slots(salas, turnos, occupied, nombre_sala, fecha, id_turno, fechas, k)
+    
+    def get_available_salas_sql(self, fecha: date = None, hora_inicio: time = None, hora_fin: time = None,
+                                rol: str = None, tipo_programa: str = None):
+        """Same as get_available_salas, always computed by MySQL"""
         query = """
             SELECT s.*, e.direccion, e.departamento
             FROM sala s
@@ -416,12 +596,7 @@ class DatabaseService:
         params = []
         
         # Filter by user access (room type)
-        allowed_types = ['libre']  # Everyone can access 'libre' rooms
-        if rol == 'docente':
-            allowed_types.append('docente')
-        elif tipo_programa == 'posgrado':
-            allowed_types.append('posgrado')
-        
+        allowed_types = self._allowed_room_types(rol, tipo_programa)
         placeholders = ','.join(['%s'] * len(allowed_types))
         query += f" AND s.tipo_sala IN ({placeholders})"
         params.extend(allowed_types)
@@ -448,18 +623,17 @@ class DatabaseService:
     
     def count_available_salas_now(self):
         """Count available rooms at the current time"""
-        from datetime import datetime, time
-        
         now = datetime.now()
         current_date = now.date()
         current_hour = now.hour
-        current_time = time(current_hour, 0, 0)
+        
+        # TIME columns come back as timedelta, which is what the index stores
+        count = self.availability.count_free(current_date, timedelta(hours=current_hour))
+        if count is not None:
+            return count
         
         # Find the turno that matches the current hour
-        turno = self.db.execute_fetchone(
-            "SELECT id_turno FROM turno WHERE hora_inicio = %s",
-            (current_time,)
-        )
+        turno = self.reference.turno_starting_at(timedelta(hours=current_hour))
         
         if not turno:
             # If no turno matches current hour, return total number of rooms
@@ -495,6 +669,7 @@ class DatabaseService:
                 "INSERT INTO sala (nombre_sala, edificio, capacidad, tipo_sala) VALUES (%s, %s, %s, %s)",
                 (nombre_sala, edificio, capacidad, tipo_sala)
             )
+            self.availability.invalidate()
             return True, "Room created successfully"
         except Exception as e:
             return False, str(e)
@@ -506,6 +681,7 @@ class DatabaseService:
                 "UPDATE sala SET capacidad = %s, tipo_sala = %s WHERE nombre_sala = %s AND edificio = %s",
                 (capacidad, tipo_sala, nombre_sala, edificio)
             )
+            self.availability.invalidate()
             return True, "Room updated successfully"
         except Exception as e:
             return False, str(e)
@@ -514,13 +690,14 @@ class DatabaseService:
         """Delete a room"""
         try:
             self.db.execute_query("DELETE FROM sala WHERE nombre_sala = %s AND edificio = %s", (nombre_sala, edificio))
+            self.availability.invalidate()
             return True, "Room deleted successfully"
         except Exception as e:
             return False, str(e)
     
     def get_edificios(self):
         """Get all buildings"""
-        return self.db.execute_query("SELECT * FROM edificio ORDER BY nombre_edificio", fetch=True) or []
+        return self.reference.edificios()
     
     # ==================== RESERVATIONS ====================
     
@@ -538,6 +715,71 @@ class DatabaseService:
             fetch=True
         ) or []
     
+    @staticmethod
+    def _reserva_filters(filtros: Dict) -> Tuple[List[str], List]:
+        """WHERE clauses for the admin reservation list (alias r)"""
+        where, params = ["TRUE"], []
+        if filtros.get('fecha_desde'):
+            where.append("r.fecha >= %s")
+            params.append(filtros['fecha_desde'])
+        if filtros.get('fecha_hasta'):
+            where.append("r.fecha <= %s")
+            params.append(filtros['fecha_hasta'])
+        if filtros.get('edificio'):
+            where.append("r.edificio = %s")
+            params.append(filtros['edificio'])
+        if filtros.get('estado'):
+            where.append("r.estado = %s")
+            params.append(filtros['estado'])
+        if filtros.get('ci'):
+            where.append("EXISTS (SELECT 1 FROM reserva_participante rpf WHERE rpf.id_reserva = r.id_reserva AND rpf.ci_participante = %s)")
+            params.append(filtros['ci'])
+        return where, params
+    
+    def list_reservas(self, filtros: Dict = None, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """One page of reservations ordered by (fecha, hora_inicio, id_reserva), newest first
+        
+        `filtros` may hold 'fecha_desde', 'fecha_hasta', 'edificio', 'estado'
+        and 'ci'. hora_inicio lives in turno, so the sort can't come straight
+        from an index; instead a first index-only query finds the fecha of the
+        (page_size + 1)-th candidate row, and the page query only looks at
+        rows between that fecha and the cursor.
+        """
+        filtros = filtros or {}
+        where, params = self._reserva_filters(filtros)
+        key = decode_cursor(cursor, 3)
+        
+        floor_where, floor_params = list(where), list(params)
+        if key:
+            floor_where.append("r.fecha < %s")
+            floor_params.append(key[0])
+        floor = self.db.execute_fetchone(
+            f"""SELECT r.fecha FROM reserva r
+                WHERE {' AND '.join(floor_where)}
+                ORDER BY r.fecha DESC
+                LIMIT 1 OFFSET %s""",
+            tuple(floor_params + [page_size])
+        )
+        if floor:
+            where.append("r.fecha >= %s")
+            params.append(floor['fecha'])
+        if key:
+            where.append(keyset_condition(['r.fecha', 't.hora_inicio', 'r.id_reserva'], descending=True))
+            params += keyset_params(key)
+        
+        query = f"""
+            SELECT r.*, s.capacidad, s.tipo_sala, t.hora_inicio, t.hora_fin,
+                   (SELECT COUNT(*) FROM reserva_participante rp WHERE rp.id_reserva = r.id_reserva) as num_participantes
+            FROM reserva r
+            JOIN sala s ON r.nombre_sala = s.nombre_sala AND r.edificio = s.edificio
+            JOIN turno t ON r.id_turno = t.id_turno
+            WHERE {' AND '.join(where)}
+            ORDER BY r.fecha DESC, t.hora_inicio DESC, r.id_reserva DESC
+            LIMIT %s
+        """
+        rows = self.db.execute_query(query, tuple(params + [page_size + 1]), fetch=True) or []
+        return build_page(rows, page_size, ['fecha', 'hora_inicio', 'id_reserva'])
+    
     def get_user_reservas(self, ci: str):
         """Get reservations for a specific user, ordered by date (newest first)"""
         return self.db.execute_query(
@@ -558,22 +800,59 @@ class DatabaseService:
         """Get a single reservation"""
         return self.db.execute_fetchone("SELECT * FROM reserva WHERE id_reserva = %s", (id_reserva,))
     
-    def create_reserva(self, ci: str, nombre_sala: str, edificio: str, fecha: date, id_turno: int, participantes: List[str]):
-        """Create a new reservation"""
-        id_reserva = self.reservation.create_reservation(ci, nombre_sala, edificio, fecha, id_turno, participantes)
+    def create_reserva(self, ci: str, nombre_sala: str, edificio: str, fecha: date, id_turno: int,
+                       participantes: List[str], idempotency_key: str = None):
+        """Create a new reservation (a repeated idempotency_key returns the first one)
+        
+        Returns (success, message, id_reserva, rejection codes); callers branch
+        on the codes, the message is for display only.
+        """
+        id_reserva, rejections = self.reservation.create_reservation_atomic(
+            ci, nombre_sala, edificio, fecha, id_turno, participantes, idempotency_key
+        )
         if id_reserva:
-            return True, "Reservation created successfully", id_reserva
+            metrics.inc('ucu_reservations_total', ('created', ''))
+            self.availability.mark(nombre_sala, edificio, fecha, id_turno, True)
+            return True, "Reservation created successfully", id_reserva, []
         else:
-            return False, "Error creating reservation. Check restrictions.", None
+            for r in rejections:
+                metrics.inc('ucu_reservations_total', ('rejected', r['code']))
+            return False, "; ".join(r['message'] for r in rejections), None, [r['code'] for r in rejections]
+    
+    def create_reserva_series(self, ci: str, nombre_sala: str, edificio: str,
+                              slots: List[Tuple[date, int]], participantes: List[str],
+                              idempotency_key: str = None):
+        """Book a recurring series atomically; returns (success, ids, conflicts)"""
+        ids, conflicts = self.reservation.create_reservation_series(
+            ci, nombre_sala, edificio, slots, participantes, idempotency_key
+        )
+        if ids is None:
+            for r in conflicts:
+                metrics.inc('ucu_reservations_total', ('rejected', r['code']))
+            return False, None, conflicts
+        metrics.inc('ucu_reservations_total', ('created', ''), len(ids))
+        for fecha, id_turno in set(slots):
+            self.availability.mark(nombre_sala, edificio, fecha, id_turno, True)
+        return True, ids, []
     
     def update_reserva_estado(self, id_reserva: int, estado: str):
         """Update reservation status"""
         try:
-            self.db.execute_query(
-                "UPDATE reserva SET estado = %s WHERE id_reserva = %s",
-                (estado, id_reserva)
-            )
+            with self.db.transaction() as cursor:
+                cursor.execute("SELECT id_reserva FROM reserva WHERE id_reserva = %s FOR UPDATE", (id_reserva,))
+                self.quota.adjust(cursor, [id_reserva], -1)
+                cursor.execute(
+                    "UPDATE reserva SET estado = %s WHERE id_reserva = %s",
+                    (estado, id_reserva)
+                )
+                self.quota.adjust(cursor, [id_reserva], 1)
+            self.availability.mark_reserva(self.get_reserva(id_reserva))
             return True, "Reservation updated successfully"
+        except Error as e:
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                # Re-activating a reservation whose slot was booked again after it was cancelled
+                return False, REJECTION_MESSAGES['room_taken']
+            return False, str(e)
         except Exception as e:
             return False, str(e)
     
@@ -598,10 +877,15 @@ class DatabaseService:
                 return False, f"No se puede cancelar una reserva en estado '{reserva['estado']}'. Solo se pueden cancelar reservas activas."
             
             # Update reservation state to 'cancelada'
-            self.db.execute_query(
-                "UPDATE reserva SET estado = 'cancelada' WHERE id_reserva = %s",
-                (id_reserva,)
-            )
+            with self.db.transaction() as cursor:
+                cursor.execute("SELECT id_reserva FROM reserva WHERE id_reserva = %s FOR UPDATE", (id_reserva,))
+                self.quota.adjust(cursor, [id_reserva], -1)
+                cursor.execute(
+                    "UPDATE reserva SET estado = 'cancelada' WHERE id_reserva = %s",
+                    (id_reserva,)
+                )
+            self.availability.mark(reserva['nombre_sala'], reserva['edificio'],
+                                   reserva['fecha'], reserva['id_turno'], False)
             return True, "Reserva cancelada exitosamente"
         except Exception as e:
             return False, str(e)
@@ -609,7 +893,14 @@ class DatabaseService:
     def delete_reserva(self, id_reserva: int):
         """Delete a reservation"""
         try:
-            self.db.execute_query("DELETE FROM reserva WHERE id_reserva = %s", (id_reserva,))
+            reserva = self.get_reserva(id_reserva)
+            with self.db.transaction() as cursor:
+                cursor.execute("SELECT id_reserva FROM reserva WHERE id_reserva = %s FOR UPDATE", (id_reserva,))
+                self.quota.adjust(cursor, [id_reserva], -1)
+                cursor.execute("DELETE FROM reserva WHERE id_reserva = %s", (id_reserva,))
+            if reserva:
+                self.availability.mark(reserva['nombre_sala'], reserva['edificio'],
+                                       reserva['fecha'], reserva['id_turno'], False)
             return True, "Reservation deleted successfully"
         except Exception as e:
             return False, str(e)
@@ -624,11 +915,70 @@ class DatabaseService:
     
     def update_attendance(self, id_reserva: int, participantes_ci: List[str], asistencias: List[bool]):
         """Update attendance for a reservation"""
-        return self.reservation.update_attendance(id_reserva, participantes_ci, asistencias)
+        updated = self.reservation.update_attendance(id_reserva, participantes_ci, asistencias)
+        if updated:
+            # A no-show moves the reservation to 'sin asistencia', freeing the slot
+            self.availability.mark_reserva(self.get_reserva(id_reserva))
+        return updated
+    
+    def get_attendance_sheet(self, fecha: date, id_turno: int = None):
+        """Active reservations of a day (optionally one turno) with their participants
+        
+        Only turnos that have already ended are listed: unchecked participants
+        are saved as absent, which would sanction reservations still to come.
+        """
+        query = """
+            SELECT r.id_reserva, r.nombre_sala, r.edificio, r.fecha, r.id_turno,
+                   t.hora_inicio, t.hora_fin,
+                   rp.ci_participante, rp.asistencia, p.nombre, p.apellido
+            FROM reserva r
+            JOIN turno t ON r.id_turno = t.id_turno
+            JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
+            JOIN participante p ON rp.ci_participante = p.ci
+            WHERE r.fecha = %s AND r.estado = 'activa'
+              AND TIMESTAMP(r.fecha, t.hora_fin) <= NOW()
+        """
+        params = [fecha]
+        if id_turno:
+            query += " AND r.id_turno = %s"
+            params.append(id_turno)
+        query += " ORDER BY t.hora_inicio, r.edificio, r.nombre_sala, p.apellido, p.nombre"
+        
+        reservas = {}
+        for row in self.db.execute_query(query, tuple(params), fetch=True) or []:
+            reserva = reservas.get(row['id_reserva'])
+            if reserva is None:
+                reserva = {k: row[k] for k in ('id_reserva', 'nombre_sala', 'edificio', 'fecha',
+                                               'id_turno', 'hora_inicio', 'hora_fin')}
+                reserva['participantes'] = []
+                reservas[row['id_reserva']] = reserva
+            reserva['participantes'].append({k: row[k] for k in ('ci_participante', 'asistencia', 'nombre', 'apellido')})
+        return list(reservas.values())
+    
+    def close_attendance(self, marks: List[Tuple[int, str, bool]]):
+        """Record attendance for many reservations at once, returns (success, message)"""
+        sin_asistencia = self.reservation.update_attendance_bulk(marks)
+        if sin_asistencia is None:
+            return False, "Error al registrar la asistencia"
+        reservas = {id_reserva for id_reserva, _, _ in marks}
+        if sin_asistencia:
+            # No-shows free their slot
+            rows = self.db.execute_query(
+                f"SELECT * FROM reserva WHERE id_reserva IN ({', '.join(['%s'] * len(sin_asistencia))})",
+                tuple(sin_asistencia),
+                fetch=True
+            ) or []
+            for row in rows:
+                self.availability.mark_reserva(row)
+        return True, f"Asistencia registrada para {len(reservas)} reserva(s); {len(sin_asistencia)} sin asistencia sancionada(s)"
     
     def get_turnos(self):
         """Get all time slots"""
-        return self.db.execute_query("SELECT * FROM turno ORDER BY hora_inicio", fetch=True) or []
+        return self.reference.turnos()
+    
+    def get_turno(self, id_turno: int):
+        """Get a single time slot"""
+        return self.reference.turno(id_turno)
     
     # ==================== SANCTIONS ====================
     
@@ -642,6 +992,38 @@ class DatabaseService:
             fetch=True
         ) or []
     
+    def list_sanciones(self, filtros: Dict = None, cursor: str = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """One page of sanctions ordered by (fecha_inicio, id_sancion), newest first
+        
+        `filtros` may hold 'ci', 'fecha_desde' and 'fecha_hasta' (on fecha_inicio).
+        """
+        filtros = filtros or {}
+        where, params = ["TRUE"], []
+        if filtros.get('ci'):
+            where.append("sp.ci_participante = %s")
+            params.append(filtros['ci'])
+        if filtros.get('fecha_desde'):
+            where.append("sp.fecha_inicio >= %s")
+            params.append(filtros['fecha_desde'])
+        if filtros.get('fecha_hasta'):
+            where.append("sp.fecha_inicio <= %s")
+            params.append(filtros['fecha_hasta'])
+        key = decode_cursor(cursor, 2)
+        if key:
+            where.append(keyset_condition(['sp.fecha_inicio', 'sp.id_sancion'], descending=True))
+            params += keyset_params(key)
+        
+        query = f"""
+            SELECT sp.*, p.nombre, p.apellido, p.email, p.ci
+            FROM sancion_participante sp
+            JOIN participante p ON sp.ci_participante = p.ci
+            WHERE {' AND '.join(where)}
+            ORDER BY sp.fecha_inicio DESC, sp.id_sancion DESC
+            LIMIT %s
+        """
+        rows = self.db.execute_query(query, tuple(params + [page_size + 1]), fetch=True) or []
+        return build_page(rows, page_size, ['fecha_inicio', 'id_sancion'])
+    
     def get_user_sanciones(self, ci: str):
         """Get active sanctions for a specific user"""
         return self.db.execute_query(
@@ -710,7 +1092,13 @@ class DatabaseService:
             'sanciones_activas_count': sanciones_activas_count
         }
     
+    def export_rows(self, dataset: str, filtros: Dict = None, chunk_size: int = 1000):
+        """Stream the rows of an export dataset ('reservas', 'asistencia' or 'sanciones')"""
+        filtros = filtros or {}
+        return self.report.iter_export(dataset, filtros.get('fecha_desde'), filtros.get('fecha_hasta'),
+                                       filtros.get('edificio'), chunk_size)
+    
     def get_facultades(self):
         """Get all faculties"""
-        return self.db.execute_query("SELECT * FROM facultad ORDER BY nombre", fetch=True) or []
+        return self.reference.facultades()
 
@@ -0,0 +1,57 @@
+"""
+Database Configuration
+Connection settings for the web app and the maintenance scripts, read
+without prompting: DB_* environment variables first, then a JSON file
+(DB_CONFIG_FILE, default db_config.json next to this module), then the
+local defaults
+"""
+
+import json
+import os
+from typing import Dict
+
+DEFAULT_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': 'rootpassword',
+    'database': 'UCU_SalasDeEstudio'
+}
+
+# Setting -> environment variable overriding it
+ENV_VARS = {
+    'host': 'DB_HOST',
+    'user': 'DB_USER',
+    'password': 'DB_PASSWORD',
+    'database': 'DB_NAME'
+}
+
+
+def config_path() -> str:
+    """File the settings are read from and saved to"""
+    return os.environ.get('DB_CONFIG_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_config.json')
+
+
+def load_db_config() -> Dict:
+    """Merged connection settings; a missing or unreadable file is skipped"""
+    config = dict(DEFAULT_CONFIG)
+    path = config_path()
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+            config.update({key: str(value) for key, value in stored.items() if key in DEFAULT_CONFIG})
+        except (OSError, ValueError) as e:
+            print(f"✗ Ignoring {path}: {e}")
+    for key, variable in ENV_VARS.items():
+        if os.environ.get(variable):
+            config[key] = os.environ[variable]
+    return config
+
+
+def save_db_config(config: Dict) -> str:
+    """Write the settings for later runs (readable by the owner only); returns the path"""
+    path = config_path()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({key: config[key] for key in DEFAULT_CONFIG}, f, indent=2)
+    return path
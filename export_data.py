@@ -0,0 +1,114 @@
+"""
+Data Export
+Streams reservations, attendance and sanctions as CSV or JSON Lines,
+optionally gzip-compressed, without holding the result set in memory
+
+Usage: python export_data.py {reservas,asistencia,sanciones} [--format csv|jsonl]
+       [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD] [--edificio NOMBRE] [--gzip] [-o ARCHIVO]
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Dict
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Rows serialized per yielded chunk
+ROWS_PER_CHUNK = 500
+
+
+def iter_csv(rows: Iterable[Dict], columns: List[str]) -> Iterator[str]:
+    """CSV text in chunks, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+        count += 1
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows: Iterable[Dict], columns: List[str]) -> Iterator[str]:
+    """One JSON object per line, in chunks (dates, times and decimals as strings)"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: row[c] for c in columns}, default=str, ensure_ascii=False))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows: Iterable[Dict], columns: List[str], formato: str = 'csv',
+                  compress: bool = False) -> Iterator[bytes]:
+    """Encode export rows as UTF-8 bytes in the requested format"""
+    if formato not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {formato}")
+    text = iter_csv(rows, columns) if formato == 'csv' else iter_jsonl(rows, columns)
+    chunks = (chunk.encode('utf-8') for chunk in text if chunk)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(dataset: str, formato: str, compress: bool = False) -> str:
+    """Download name such as reservas_20250101_120000.csv.gz"""
+    name = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return name + '.gz' if compress else name
+
+
+def main():
+    """Write an export to a file or stdout"""
+    from db_config import load_db_config
+    from main import DatabaseManager, ReportManager
+
+    parser = argparse.ArgumentParser(description="Export reservations, attendance or sanctions")
+    parser.add_argument('dataset', choices=sorted(ReportManager.EXPORT_COLUMNS))
+    parser.add_argument('--format', dest='formato', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--desde', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date())
+    parser.add_argument('--hasta', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date())
+    parser.add_argument('--edificio')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    db = DatabaseManager(**load_db_config())
+    rows = ReportManager(db).iter_export(args.dataset, args.desde, args.hasta, args.edificio)
+    chunks = stream_export(rows, ReportManager.EXPORT_COLUMNS[args.dataset], args.formato, args.gzip)
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"✓ Export written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,19 @@ Sample Data Generator for UCU Study Room Reservation System
 Generates comprehensive sample data for all database tables
 """
 
+import argparse
+import math
 import os
+import random
+import shutil
+import tempfile
+import time
+import unicodedata
 import bcrypt
 from datetime import datetime, date, timedelta
 from random import choice, randint, sample
-from main import DatabaseManager
+from typing import List, Optional
+from main import DatabaseManager, QuotaLedger
 
 # Database configuration - same as app.py
 DB_CONFIG = {
@@ -17,6 +25,27 @@ DB_CONFIG = {
     'database': os.environ.get('DB_NAME', 'UCU_SalasDeEstudio')
 }
 
+# Sample names
+NOMBRES = [
+    "Juan", "María", "Carlos", "Ana", "Pedro", "Lucía", "Diego", "Laura",
+    "Miguel", "Carmen", "Roberto", "Patricia", "Fernando", "Silvia", "Andrés",
+    "Mónica", "José", "Elena", "Daniel", "Claudia", "Luis", "Marta", "Ricardo",
+    "Paula", "Alejandro", "Cristina", "Sergio", "Natalia", "Pablo", "Valentina",
+    "Gonzalo", "Florencia", "Martín", "Constanza", "Federico", "Isabel", "Sebastián",
+    "Amanda", "Emilio", "Beatriz", "Rafael", "Diana", "Guillermo", "Andrea",
+    "Eduardo", "Vanesa", "Mauricio", "Gabriela", "Ignacio", "Roxana"
+]
+
+APELLIDOS = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez",
+    "Pérez", "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno",
+    "Muñoz", "Álvarez", "Romero", "Alonso", "Gutiérrez", "Navarro", "Torres",
+    "Domínguez", "Vázquez", "Ramos", "Gil", "Ramírez", "Serrano", "Blanco", "Suárez",
+    "Molina", "Morales", "Ortega", "Delgado", "Castro", "Ortiz", "Rubio", "Marín",
+    "Sanz", "Núñez", "Iglesias", "Medina", "Garrido", "Cortés", "Castillo", "Santos",
+    "Lozano", "Guerrero", "Cano", "Prieto", "Méndez", "Calvo", "Cruz", "Gallego"
+]
+
 
 class SampleDataGenerator:
     """Generates comprehensive sample data"""
@@ -37,6 +66,7 @@ class SampleDataGenerator:
         self.generate_participantes()
         self.generate_reservas()
         self.generate_sanciones()
+        self.rebuild_quota_ledger()
         
         print("\n=== Sample Data Generation Complete ===")
     
@@ -228,27 +258,6 @@ class SampleDataGenerator:
         """Generate participants with login and program associations"""
         print("Generating participantes...")
         
-        # Sample names
-        nombres = [
-            "Juan", "María", "Carlos", "Ana", "Pedro", "Lucía", "Diego", "Laura",
-            "Miguel", "Carmen", "Roberto", "Patricia", "Fernando", "Silvia", "Andrés",
-            "Mónica", "José", "Elena", "Daniel", "Claudia", "Luis", "Marta", "Ricardo",
-            "Paula", "Alejandro", "Cristina", "Sergio", "Natalia", "Pablo", "Valentina",
-            "Gonzalo", "Florencia", "Martín", "Constanza", "Federico", "Isabel", "Sebastián",
-            "Amanda", "Emilio", "Beatriz", "Rafael", "Diana", "Guillermo", "Andrea",
-            "Eduardo", "Vanesa", "Mauricio", "Gabriela", "Ignacio", "Roxana"
-        ]
-        
-        apellidos = [
-            "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez",
-            "Pérez", "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno",
-            "Muñoz", "Álvarez", "Romero", "Alonso", "Gutiérrez", "Navarro", "Torres",
-            "Domínguez", "Vázquez", "Ramos", "Gil", "Ramírez", "Serrano", "Blanco", "Suárez",
-            "Molina", "Morales", "Ortega", "Delgado", "Castro", "Ortiz", "Rubio", "Marín",
-            "Sanz", "Núñez", "Iglesias", "Medina", "Garrido", "Cortés", "Castillo", "Santos",
-            "Lozano", "Guerrero", "Cano", "Prieto", "Méndez", "Calvo", "Cruz", "Gallego"
-        ]
-        
         # Get academic programs
         programas = self.db.execute_query(
             "SELECT nombre_programa, id_facultad, tipo FROM programa_academico",
@@ -265,8 +274,8 @@ class SampleDataGenerator:
         # Generate 100 participants
         for i in range(1, 101):
             ci = f"{randint(1000000, 9999999)}-{randint(1, 9)}"
-            nombre = choice(nombres)
-            apellido = choice(apellidos)
+            nombre = choice(NOMBRES)
+            apellido = choice(APELLIDOS)
             email = f"{nombre.lower()}.{apellido.lower()}{i}@ucu.edu.uy"
             
             try:
@@ -504,13 +513,417 @@ class SampleDataGenerator:
                 print(f"  Warning creating sanction: {e}")
         
         print(f"✓ Generated {sanciones_created} sanciones")
+    
+    def rebuild_quota_ledger(self):
+        """Recompute the booking quota counters for the inserted reservations"""
+        print("Rebuilding quota ledger...")
+        ledger = QuotaLedger(self.db)
+        if not ledger.ensure_schema():
+            return
+        result = ledger.rebuild()
+        if result:
+            print(f"✓ Quota ledger rebuilt ({result[0]} daily, {result[1]} weekly rows)")
+
+
+def _ascii(text: str) -> str:
+    """Lowercase ASCII form of a name, valid in an email address"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _tsv_value(value) -> str:
+    """Format one field for LOAD DATA (tab-separated, \\N for NULL)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+class BulkLoader:
+    """Writes generated rows in batches and keeps per-table throughput
+
+    Each batch is one transaction: a multi-row INSERT (executemany), or with
+    `load_data` a LOAD DATA LOCAL INFILE of a temporary tab-separated file
+    (needs local_infile=ON on the server). LOAD DATA LOCAL turns rejected
+    rows into warnings, so a batch that loads fewer rows than sent is reported.
+    """
+
+    def __init__(self, db: DatabaseManager, load_data: bool = False):
+        self.db = db
+        self.load_data = load_data
+        self.directory = tempfile.mkdtemp(prefix='ucu-bulk-') if load_data else None
+        # table -> [rows, seconds]
+        self.stats = {}
+
+    def write(self, table: str, columns: List[str], rows: List[tuple]):
+        """Insert one batch of rows"""
+        if not rows:
+            return
+        started = time.perf_counter()
+        with self.db.transaction() as cursor:
+            if self.load_data:
+                path = os.path.join(self.directory, f"{table}.tsv")
+                with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                    for row in rows:
+                        f.write('\t'.join(_tsv_value(value) for value in row) + '\n')
+                cursor.execute(
+                    f"""LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4
+                        FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+                        ({', '.join(columns)})""",
+                    (path,)
+                )
+                if cursor.rowcount != len(rows):
+                    print(f"  ✗ {table}: the server kept {cursor.rowcount} of {len(rows)} rows")
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                    rows
+                )
+        entry = self.stats.setdefault(table, [0, 0.0])
+        entry[0] += len(rows)
+        entry[1] += time.perf_counter() - started
+
+    def timed(self, label: str, rows: int, seconds: float):
+        """Account work done outside write() (e.g. an UPDATE pass)"""
+        entry = self.stats.setdefault(label, [0, 0.0])
+        entry[0] += rows
+        entry[1] += seconds
+
+    def close(self):
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class BulkDataGenerator:
+    """Production-sized synthetic dataset for load testing
+
+    Deterministic for a given seed. Adds its own rooms ('Sala Carga NNNN'),
+    participants (CIs from CI_BASE) with login and programs, reservations on
+    those rooms over a window of past and upcoming days, and sanctions.
+    Every login reuses one precomputed bcrypt hash. The generated rows respect
+    the schema constraints and the booking rules that matter to the queries:
+    one reservation per room and turno, no participant twice in the same
+    turno, room type matching the requester's role, capacity, and the daily
+    and weekly limits for active reservations.
+
+    Past reservations are inserted with future dates and moved back
+    afterwards when reserva has an INSERT trigger (trg_validar_fecha_reserva
+    rejects past dates on insert).
+    """
+
+    CI_BASE = 40000000
+    SALA_PREFIX = 'Sala Carga'
+    PASSWORD = 'password123'
+
+    def __init__(self, db: DatabaseManager, participantes: int, reservas: int, sanciones: int,
+                 salas: int = 200, seed: int = 42, batch_size: int = 5000, load_data: bool = False,
+                 occupancy: float = 0.5, future_days: int = 28):
+        self.db = db
+        self.num_participantes = participantes
+        self.num_reservas = reservas
+        self.num_sanciones = sanciones
+        self.num_salas = salas
+        self.batch_size = batch_size
+        self.occupancy = occupancy
+        self.future_days = future_days
+        self.rng = random.Random(seed)
+        self.loader = BulkLoader(db, load_data)
+        self.salas = []
+        self.cis = []
+        self.docentes = []
+        self.posgrados = []
+        # Active reservations per (ci, edificio, fecha) and (ci, ISO week), upcoming days only
+        self._daily = {}
+        self._weekly = {}
+
+    def generate_all(self) -> bool:
+        """Generate every table; False if the data is already there or something is missing"""
+        print("=== Generating Bulk Data ===\n")
+        reference = SampleDataGenerator(self.db)
+        reference.generate_facultades()
+        reference.generate_programas()
+        reference.generate_edificios()
+        reference.generate_turnos()
+
+        if self.db.execute_fetchone("SELECT ci FROM participante WHERE ci = %s", (self._ci(0),)):
+            print("✗ Bulk data already present (same CI range); reset the database first")
+            return False
+
+        started = time.perf_counter()
+        try:
+            self.generate_salas()
+            self.generate_participantes()
+            self.generate_reservas()
+            self.generate_sanciones()
+        finally:
+            self.loader.close()
+        SampleDataGenerator(self.db).rebuild_quota_ledger()
+        self.db.execute_query(
+            "ANALYZE TABLE participante, participante_programa_academico, reserva, "
+            "reserva_participante, sancion_participante", fetch=True
+        )
+        self.report(time.perf_counter() - started)
+        return True
+
+    def _ci(self, i: int) -> str:
+        number = self.CI_BASE + i
+        return f"{number}-{number % 9 + 1}"
+
+    def generate_salas(self):
+        """Generate the rooms that hold the bulk reservations"""
+        print("Generating salas...")
+        edificios = [row['nombre_edificio'] for row in
+                     self.db.execute_query("SELECT nombre_edificio FROM edificio ORDER BY nombre_edificio", fetch=True) or []]
+        if not edificios:
+            raise RuntimeError("No edificios found")
+        for i in range(self.num_salas):
+            tipo = self.rng.choices(['libre', 'posgrado', 'docente'], weights=[8, 1, 1])[0]
+            self.salas.append((f"{self.SALA_PREFIX} {i + 1:04d}", edificios[i % len(edificios)],
+                               self.rng.randint(4, 20), tipo))
+        for start in range(0, len(self.salas), self.batch_size):
+            self.loader.write('sala', ['nombre_sala', 'edificio', 'capacidad', 'tipo_sala'],
+                              self.salas[start:start + self.batch_size])
+        print(f"✓ Generated {len(self.salas)} salas")
+
+    def generate_participantes(self):
+        """Generate participants with login and 1-2 program associations each"""
+        print("Generating participantes...")
+        programas = self.db.execute_query(
+            "SELECT nombre_programa, id_facultad, tipo FROM programa_academico ORDER BY nombre_programa, id_facultad",
+            fetch=True
+        )
+        if not programas:
+            raise RuntimeError("No programas found")
+        hashed_password = bcrypt.hashpw(self.PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+        participantes, logins, programas_rows = [], [], []
+        for i in range(self.num_participantes):
+            ci = self._ci(i)
+            nombre = self.rng.choice(NOMBRES)
+            apellido = self.rng.choice(APELLIDOS)
+            email = f"{_ascii(nombre)}.{_ascii(apellido)}.{i}@carga.ucu.edu.uy"
+            participantes.append((ci, nombre, apellido, email))
+            logins.append((email, hashed_password))
+
+            afiliaciones = []
+            for prog in self.rng.sample(programas, min(self.rng.randint(1, 2), len(programas))):
+                if prog['tipo'] == 'posgrado':
+                    rol = self.rng.choice(['alumno', 'docente'])
+                else:
+                    rol = 'alumno' if self.rng.randint(1, 10) > 2 else 'docente'
+                afiliaciones.append((rol, prog['tipo'], prog['nombre_programa'], prog['id_facultad']))
+                programas_rows.append((ci, prog['nombre_programa'], prog['id_facultad'], rol))
+
+            # Same primary affiliation as ROLE_PRIORITY_ORDER: docente first, then posgrado
+            rol, tipo, _, _ = min(afiliaciones, key=lambda a: (a[0] != 'docente', a[1] != 'posgrado', a[2], a[3]))
+            self.cis.append(ci)
+            if rol == 'docente':
+                self.docentes.append(ci)
+            if tipo == 'posgrado':
+                self.posgrados.append(ci)
+
+            if len(participantes) >= self.batch_size:
+                self._flush_participantes(participantes, logins, programas_rows)
+        self._flush_participantes(participantes, logins, programas_rows)
+        print(f"✓ Generated {len(self.cis)} participantes ({len(self.docentes)} docentes, "
+              f"{len(self.posgrados)} posgrado)")
+        print(f"  Password for all generated users: {self.PASSWORD}")
+
+    def _flush_participantes(self, participantes: List, logins: List, programas_rows: List):
+        self.loader.write('participante', ['ci', 'nombre', 'apellido', 'email'], participantes)
+        self.loader.write('login', ['correo', 'password'], logins)
+        self.loader.write('participante_programa_academico',
+                          ['ci_participante', 'nombre_programa', 'id_facultad', 'rol'], programas_rows)
+        participantes.clear()
+        logins.clear()
+        programas_rows.clear()
+
+    def _pick(self, pool: List[str], used: set, quota: tuple = None) -> Optional[str]:
+        """Random participant of `pool` not in `used`, or None
+
+        With `quota` = (edificio, fecha, semana) the participant must also be
+        below the daily and weekly limits of active reservations.
+        """
+        for _ in range(10):
+            ci = self.rng.choice(pool)
+            if ci in used:
+                continue
+            if quota is not None:
+                edificio, fecha, semana = quota
+                if self._daily.get((ci, edificio, fecha), 0) >= 2 or self._weekly.get((ci, semana), 0) >= 3:
+                    continue
+            return ci
+        return None
+
+    def generate_reservas(self):
+        """Generate reservations with participants over past and upcoming days"""
+        print("Generating reservas...")
+        turnos = [row['id_turno'] for row in
+                  self.db.execute_query("SELECT id_turno FROM turno ORDER BY hora_inicio", fetch=True) or []]
+        if not turnos or not self.salas or not self.cis:
+            raise RuntimeError("Missing required data (turnos, salas or participantes)")
+
+        cells = len(self.salas) * len(turnos)
+        days = max(1, math.ceil(self.num_reservas / (cells * self.occupancy)))
+        future = min(self.future_days, days)
+        past = days - future
+        today = date.today()
+        first_day = today - timedelta(days=past)
+        # Past rows go in `days` days later, beyond every upcoming row, then move back
+        staged = bool(self.db.execute_fetchone("""
+            SELECT COUNT(*) AS n FROM information_schema.triggers
+            WHERE event_object_schema = DATABASE() AND event_object_table = 'reserva'
+            AND event_manipulation = 'INSERT'
+        """)['n'])
+        first_id = (self.db.execute_fetchone("SELECT COALESCE(MAX(id_reserva), 0) AS n FROM reserva")['n']) + 1
+        next_id = first_id
+        pools = {'libre': self.cis, 'posgrado': self.posgrados, 'docente': self.docentes}
+
+        reservas, participantes = [], []
+        per_day, extra = divmod(self.num_reservas, days)
+        for day in range(days):
+            fecha = first_day + timedelta(days=day)
+            count = min(cells, per_day + (1 if day < extra else 0))
+            semana = fecha.isocalendar()[:2]
+            # Cell c is (turno c // salas, sala c % salas): sorted cells group by turno
+            for turno_index, cell_group in self._group_by_turno(sorted(self.rng.sample(range(cells), count))):
+                used = set()
+                for cell in cell_group:
+                    nombre_sala, edificio, capacidad, tipo_sala = self.salas[cell % len(self.salas)]
+                    if fecha < today:
+                        estado = self.rng.choices(['finalizada', 'sin asistencia', 'cancelada'], weights=[70, 15, 15])[0]
+                    else:
+                        estado = self.rng.choices(['activa', 'cancelada'], weights=[85, 15])[0]
+
+                    quota = (edificio, fecha, semana) if estado == 'activa' else None
+                    pool = pools[tipo_sala]
+                    solicitante = self._pick(pool, used, quota) if pool else None
+                    if solicitante is None:
+                        continue
+                    grupo = [solicitante]
+                    used.add(solicitante)
+                    for _ in range(min(self.rng.randint(1, 4), capacidad) - 1):
+                        ci = self._pick(self.cis, used, quota)
+                        if ci is not None:
+                            grupo.append(ci)
+                            used.add(ci)
+
+                    stored_fecha = fecha + timedelta(days=days) if staged and fecha < today else fecha
+                    reservas.append((next_id, nombre_sala, edificio, stored_fecha, turnos[turno_index], estado))
+                    solicitud = datetime.combine(fecha - timedelta(days=self.rng.randint(1, 14)),
+                                                 datetime.min.time()) + timedelta(minutes=self.rng.randint(480, 1380))
+                    solicitud = min(solicitud, datetime.now().replace(microsecond=0))
+                    for position, ci in enumerate(grupo):
+                        asistencia = estado == 'finalizada' and (position == 0 or self.rng.random() < 0.75)
+                        participantes.append((ci, next_id, solicitud, asistencia))
+                        if estado == 'activa':
+                            self._daily[(ci, edificio, fecha)] = self._daily.get((ci, edificio, fecha), 0) + 1
+                            self._weekly[(ci, semana)] = self._weekly.get((ci, semana), 0) + 1
+                    next_id += 1
+
+                    if len(reservas) >= self.batch_size:
+                        self._flush_reservas(reservas, participantes)
+        self._flush_reservas(reservas, participantes)
+
+        if staged:
+            self._unstage(first_id, next_id - 1, days, today + timedelta(days=future))
+        print(f"✓ Generated {next_id - first_id} reservas over {days} days "
+              f"({past} past, {future} upcoming) on {len(self.salas)} salas")
+
+    def _group_by_turno(self, cells: List[int]):
+        """Split sorted cell numbers into (turno index, cells) runs"""
+        group, current = [], None
+        for cell in cells:
+            turno_index = cell // len(self.salas)
+            if turno_index != current and group:
+                yield current, group
+                group = []
+            current = turno_index
+            group.append(cell)
+        if group:
+            yield current, group
+
+    def _flush_reservas(self, reservas: List, participantes: List):
+        self.loader.write('reserva', ['id_reserva', 'nombre_sala', 'edificio', 'fecha', 'id_turno', 'estado'], reservas)
+        self.loader.write('reserva_participante',
+                          ['ci_participante', 'id_reserva', 'fecha_solicitud_reserva', 'asistencia'], participantes)
+        reservas.clear()
+        participantes.clear()
+
+    def _unstage(self, first_id: int, last_id: int, shift_days: int, staged_from: date):
+        """Move the past reservations inserted with shifted dates back to their real day"""
+        print("  Moving past reservas to their dates...")
+        started = time.perf_counter()
+        moved = 0
+        step = self.batch_size * 10
+        for start in range(first_id, last_id + 1, step):
+            moved += self.db.execute_query(
+                """UPDATE reserva SET fecha = fecha - INTERVAL %s DAY
+                   WHERE id_reserva BETWEEN %s AND %s AND fecha >= %s""",
+                (shift_days, start, min(start + step - 1, last_id), staged_from)
+            ) or 0
+        self.loader.timed('reserva (past dates)', moved, time.perf_counter() - started)
+
+    def generate_sanciones(self):
+        """Generate past, active and upcoming sanctions"""
+        print("Generating sanciones...")
+        today = date.today()
+        rows = []
+        for _ in range(self.num_sanciones):
+            tipo = self.rng.choice(['past', 'active', 'future'])
+            if tipo == 'past':
+                fecha_fin = today - timedelta(days=self.rng.randint(1, 365))
+                fecha_inicio = fecha_fin - timedelta(days=self.rng.randint(30, 60))
+            elif tipo == 'active':
+                fecha_inicio = today - timedelta(days=self.rng.randint(1, 30))
+                fecha_fin = today + timedelta(days=self.rng.randint(1, 60))
+            else:
+                fecha_inicio = today + timedelta(days=self.rng.randint(1, 30))
+                fecha_fin = fecha_inicio + timedelta(days=self.rng.randint(30, 60))
+            rows.append((self.rng.choice(self.cis), fecha_inicio, fecha_fin))
+            if len(rows) >= self.batch_size:
+                self.loader.write('sancion_participante', ['ci_participante', 'fecha_inicio', 'fecha_fin'], rows)
+                rows = []
+        self.loader.write('sancion_participante', ['ci_participante', 'fecha_inicio', 'fecha_fin'], rows)
+        print(f"✓ Generated {self.num_sanciones} sanciones")
+
+    def report(self, elapsed: float):
+        """Print rows written and rows/second per table"""
+        print(f"\n=== Bulk Load ({'LOAD DATA' if self.loader.load_data else 'multi-row INSERT'}) ===")
+        total = 0
+        for table, (rows, seconds) in self.loader.stats.items():
+            rate = rows / seconds if seconds else 0.0
+            print(f"{table:35} {rows:>10} rows {seconds:>9.2f} s {rate:>12,.0f} rows/s")
+            if not table.startswith('reserva ('):
+                total += rows
+        print(f"{'total (including generation)':35} {total:>10} rows {elapsed:>9.2f} s "
+              f"{total / elapsed if elapsed else 0:>12,.0f} rows/s")
 
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Fill the database with demo data, or with --bulk a large seeded dataset for load testing"
+    )
+    parser.add_argument('--bulk', action='store_true', help="Generate a production-sized dataset")
+    parser.add_argument('--participantes', type=int, default=100000)
+    parser.add_argument('--reservas', type=int, default=1000000)
+    parser.add_argument('--sanciones', type=int, default=20000)
+    parser.add_argument('--salas', type=int, default=200, help="Rooms created for the bulk reservations")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch', type=int, default=5000, help="Rows per INSERT / LOAD DATA batch")
+    parser.add_argument('--load-data', action='store_true', help="Use LOAD DATA LOCAL INFILE instead of INSERT")
+    args = parser.parse_args()
+    if args.bulk and (args.participantes < 2 or args.salas < 1 or args.batch < 1):
+        parser.error("--bulk needs at least 2 participantes, 1 sala and a positive --batch")
+    
     print("UCU Study Room Reservation System - Sample Data Generator\n")
     
     db = DatabaseManager(**DB_CONFIG)
+    if args.load_data:
+        db.config['allow_local_infile'] = True
     
     if not db.connect():
         print("Error: Could not connect to database. Please check your configuration.")
@@ -518,7 +931,12 @@ def main():
         return
     
     try:
-        generator = SampleDataGenerator(db)
+        if args.bulk:
+            generator = BulkDataGenerator(db, args.participantes, args.reservas, args.sanciones,
+                                          salas=args.salas, seed=args.seed, batch_size=args.batch,
+                                          load_data=args.load_data)
+        else:
+            generator = SampleDataGenerator(db)
         generator.generate_all()
         
         # Print summary
@@ -532,7 +950,7 @@ def main():
         for table in tables:
             result = db.execute_fetchone(f"SELECT COUNT(*) as cnt FROM {table}")
             if result:
-                print(f"{table:35} {result['cnt']:>5} records")
+                print(f"{table:35} {result['cnt']:>10} records")
         
     except Exception as e:
         print(f"\nError: {e}")
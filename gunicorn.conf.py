@@ -0,0 +1,79 @@
+"""
+Gunicorn settings for the production entry point (wsgi:app)
+
+Each worker process runs WEB_THREADS request threads and opens its own
+connection pool, sized to its thread count. The app is not preloaded, so
+`kill -HUP <master pid>` gracefully replaces every worker with one running
+the current code: new workers start, old ones finish their in-flight
+requests (up to WEB_GRACEFUL_TIMEOUT seconds) and exit.
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from gunicorn.arbiter import Arbiter
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# Recycle workers after this many requests (0 = never), staggered so they do not restart together
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = False
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+
+# Every request thread pins one pooled connection; fewer would make threads queue for one
+os.environ['DB_POOL_SIZE'] = str(max(int(os.environ.get('DB_POOL_SIZE', '0')), threads))
+
+
+def on_starting(server):
+    """Give the workers a shared, empty METRICS_DIR so /metrics sums all of them
+
+    Without one, every scrape would report whichever worker answered it.
+    A directory from the environment is emptied: counters restart with
+    the server.
+    """
+    import metrics
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        metrics.clear_directory(directory)
+    else:
+        os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='ucu-metrics-')
+
+
+def post_worker_init(worker):
+    """Connect before accepting requests, so the first user does not pay for it
+    
+    An outdated schema stops the whole server (a boot error makes the
+    master exit) instead of serving requests against missing tables.
+    """
+    import app
+    try:
+        ready = app.init_db()
+    except app.SchemaOutdated as e:
+        worker.log.error("%s", e)
+        sys.exit(Arbiter.WORKER_BOOT_ERROR)
+    if not ready:
+        worker.log.error("Could not connect to the database; retrying on the first request")
+
+
+def child_exit(server, worker):
+    """Fold the exited worker's metrics file into the totals (runs in the master)"""
+    import metrics
+    metrics.mark_process_dead(os.environ.get('METRICS_DIR'), worker.pid)
+
+
+def worker_exit(server, worker):
+    """Flush buffered token access times and metrics, close the pool"""
+    import app
+    app.shutdown_worker()
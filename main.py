@@ -4,17 +4,205 @@ Console application for managing study room reservations
 """
 
 import mysql.connector
-from mysql.connector import Error
-import bcrypt
+from mysql.connector import Error, errorcode
+from password_hasher import PasswordHasher, HasherBusy
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Tuple, Iterator, Callable
 import getpass
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolExhaustedError(Error):
+    """Raised when no pooled connection becomes available before the timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with health checks and idle recycling"""
+    
+    def __init__(self, config: Dict, size: int = 5, timeout: float = 10.0,
+                 max_idle: float = 300.0, health_check_after: float = 30.0):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.closed = False
+        # Most recently returned connection is reused first so idle ones age out
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'wait_total_ms': 0.0,
+            'wait_max_ms': 0.0,
+            'timeouts': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+    
+    def acquire(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        if self.closed:
+            raise PoolExhaustedError(msg="Connection pool is closed")
+        
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            connection, returned_at = self._next_idle(deadline)
+            if connection is None:
+                connection = self._open()
+            elif not self._is_usable(connection, returned_at):
+                continue
+            
+            waited_ms = (time.monotonic() - start) * 1000
+            with self._lock:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                self._stats['wait_total_ms'] += waited_ms
+                self._stats['wait_max_ms'] = max(self._stats['wait_max_ms'], waited_ms)
+            return connection
+    
+    def release(self, connection):
+        """Return a connection to the pool (broken ones are discarded)"""
+        with self._lock:
+            self._in_use -= 1
+        
+        if self.closed:
+            self._discard(connection, count=False)
+            return
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Error:
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+    
+    def close(self):
+        """Close every idle connection; in-use ones are closed when released"""
+        self.closed = True
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection, count=False)
+    
+    def stats(self) -> Dict:
+        """Pool size, usage and wait-time metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+            })
+        checkouts = stats['checkouts']
+        stats['wait_avg_ms'] = round(stats['wait_total_ms'] / checkouts, 3) if checkouts else 0.0
+        return stats
+    
+    def _next_idle(self, deadline: float):
+        """Take an idle connection, or reserve a slot to open one (returns None)"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return None, None
+        
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise queue.Empty
+            return self._idle.get(timeout=remaining)
+        except queue.Empty:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolExhaustedError(msg=f"No database connection available after {self.timeout}s")
+    
+    def _open(self):
+        try:
+            return mysql.connector.connect(**self.config)
+        except Error:
+            with self._lock:
+                self._created -= 1
+            raise
+    
+    def _is_usable(self, connection, returned_at: float) -> bool:
+        idle_for = time.monotonic() - returned_at
+        if idle_for > self.max_idle:
+            with self._lock:
+                self._stats['recycled'] += 1
+            self._discard(connection, count=False)
+            return False
+        # Only ping connections that sat idle long enough to have been dropped
+        if idle_for > self.health_check_after and not connection.is_connected():
+            self._discard(connection)
+            return False
+        return True
+    
+    def _discard(self, connection, count: bool = True):
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            if count:
+                self._stats['discarded'] += 1
+
+
+class InstrumentedCursor:
+    """Cursor wrapper reporting execute/executemany calls to the manager's listeners"""
+    
+    def __init__(self, cursor, db: 'DatabaseManager'):
+        self._cursor = cursor
+        self._db = db
+    
+    def execute(self, query, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(query, params, *args, **kwargs)
+        except Error as e:
+            self._db._notify(query, params, started, error=e)
+            raise
+        # Buffered cursor: rowcount is the number of rows fetched or affected
+        self._db._notify(query, params, started, self._cursor.rowcount)
+        return result
+    
+    def executemany(self, query, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(query, seq_params, *args, **kwargs)
+        except Error as e:
+            self._db._notify(query, seq_params, started, error=e)
+            raise
+        self._db._notify(query, seq_params, started, self._cursor.rowcount)
+        return result
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+    
+    def __iter__(self):
+        return iter(self._cursor)
 
 
 class DatabaseManager:
     """Handles database connection and operations"""
     
-    def __init__(self, host='localhost', user='root', password='', database='UCU_SalasDeEstudio'):
+    def __init__(self, host='localhost', user='root', password='', database='UCU_SalasDeEstudio',
+                 pool_size: int = 0, pool_timeout: float = 10.0, pool_max_idle: float = 300.0):
         self.config = {
             'host': host,
             'user': user,
@@ -24,69 +212,248 @@ class DatabaseManager:
             'collation': 'utf8mb4_unicode_ci'
         }
         self.connection = None
+        # pool_size > 0 switches to pooled mode (one connection per concurrent request)
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pool_max_idle = pool_max_idle
+        self.pool = None
+        self._local = threading.local()
+        # Callables notified after every statement (see add_listener)
+        self.listeners = []
     
     def connect(self):
         """Establish database connection"""
         try:
+            if self.pool_size > 0:
+                self.pool = ConnectionPool(dict(self.config), self.pool_size,
+                                           self.pool_timeout, self.pool_max_idle)
+                # Open one connection up front so bad credentials fail here
+                self.pool.release(self.pool.acquire())
+                print(f"✓ Connected to MySQL database (pool size {self.pool_size})")
+                return True
             self.connection = mysql.connector.connect(**self.config)
             if self.connection.is_connected():
                 print("✓ Connected to MySQL database")
                 return True
         except Error as e:
+            self.pool = None
             print(f"✗ Error connecting to MySQL: {e}")
             return False
     
     def disconnect(self):
         """Close database connection"""
-        if self.connection and self.connection.is_connected():
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            print("✓ Database connection pool closed")
+        elif self.connection and self.connection.is_connected():
             self.connection.close()
             print("✓ Database connection closed")
     
+    def is_connected(self) -> bool:
+        """Check whether queries can be issued"""
+        if self.pool_size > 0:
+            return self.pool is not None and not self.pool.closed
+        return self.connection is not None and self.connection.is_connected()
+    
+    def checkout(self):
+        """Pin a pooled connection to the current thread (e.g. for one Flask request)"""
+        if self.pool and getattr(self._local, 'connection', None) is None:
+            self._local.connection = self.pool.acquire()
+    
+    def release(self):
+        """Return the connection pinned by checkout() to the pool"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            if self.pool:
+                self.pool.release(connection)
+            else:
+                connection.close()
+    
+    def spawn(self) -> 'DatabaseManager':
+        """Unconnected single-connection manager with the same settings (for background jobs)"""
+        clone = DatabaseManager()
+        clone.config = dict(self.config)
+        return clone
+    
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Register a callable receiving one event per executed statement
+        
+        The event is a dict with 'sql', 'params', 'duration_ms', 'rows'
+        (fetched rows or affected row count) and 'error' (message or None).
+        Listeners run synchronously on the querying thread and must be cheap.
+        """
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[Dict], None]):
+        """Unregister a listener added with add_listener"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def _notify(self, query: str, params, started: float, rows=None, error: Error = None):
+        """Send a statement event to every listener"""
+        if not self.listeners:
+            return
+        event = {
+            'sql': query,
+            'params': params,
+            'duration_ms': (time.perf_counter() - started) * 1000,
+            'rows': rows,
+            'error': str(error) if error else None,
+        }
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                # Instrumentation must never break a query
+                print(f"✗ Query listener error: {e}")
+    
+    def pool_stats(self) -> Optional[Dict]:
+        """Connection pool metrics, or None in single-connection mode"""
+        return self.pool.stats() if self.pool else None
+    
+    @contextmanager
+    def _borrow(self):
+        """Yield the connection to run a statement on"""
+        if self.pool is None:
+            yield self.connection
+            return
+        
+        pinned = getattr(self._local, 'connection', None)
+        if pinned is not None:
+            yield pinned
+            return
+        
+        connection = self.pool.acquire()
+        try:
+            yield connection
+        finally:
+            self.pool.release(connection)
+    
     def execute_query(self, query: str, params: tuple = None, fetch: bool = False):
         """Execute a query with parameterized inputs (prevents SQL injection)"""
-        cursor = None
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-                self.connection.commit()
-                return result
-            else:
-                self.connection.commit()
-                return cursor.rowcount
+            with self._borrow() as connection:
+                cursor = None
+                started = time.perf_counter()
+                try:
+                    cursor = connection.cursor(dictionary=True)
+                    cursor.execute(query, params or ())
+                    
+                    if fetch:
+                        result = cursor.fetchall()
+                        connection.commit()
+                        self._notify(query, params, started, len(result))
+                        return result
+                    else:
+                        connection.commit()
+                        self._notify(query, params, started, cursor.rowcount)
+                        return cursor.rowcount
+                except Error as e:
+                    self._notify(query, params, started, error=e)
+                    connection.rollback()
+                    raise
+                finally:
+                    if cursor:
+                        cursor.close()
         except Error as e:
-            self.connection.rollback()
             print(f"✗ Database error: {e}")
             return None
+    
+    def iter_query(self, query: str, params: tuple = None, chunk_size: int = 1000) -> Iterator[Dict]:
+        """Stream a large result set row by row
+        
+        Runs on a dedicated connection outside the pool, with an unbuffered
+        cursor, fetching `chunk_size` rows at a time, so memory stays flat
+        regardless of the result size. A connection the calling thread
+        pinned with checkout() is still held until release(); a streaming
+        HTTP response should release it before it starts streaming.
+        """
+        connection = mysql.connector.connect(**self.config)
+        cursor = None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
         finally:
-            if cursor:
+            # Closing mid-stream (consumer stopped early) drops the unread rows
+            try:
+                if cursor:
+                    cursor.close()
+            except Error:
+                pass
+            try:
+                connection.close()
+            except Error:
+                pass
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one connection as a single transaction
+        
+        Yields a buffered dictionary cursor. Commits when the block exits
+        normally and rolls back (re-raising) on any exception.
+        """
+        with self._borrow() as connection:
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            try:
+                yield InstrumentedCursor(cursor, self) if self.listeners else cursor
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
                 cursor.close()
     
     def execute_fetchone(self, query: str, params: tuple = None):
         """Execute query and fetch one result"""
-        cursor = None
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            result = cursor.fetchone()
-            self.connection.commit()
-            return result
+            with self._borrow() as connection:
+                cursor = None
+                started = time.perf_counter()
+                try:
+                    cursor = connection.cursor(dictionary=True)
+                    cursor.execute(query, params or ())
+                    # Drain the whole result so the connection is clean for reuse
+                    rows = cursor.fetchall()
+                    connection.commit()
+                    self._notify(query, params, started, len(rows))
+                    return rows[0] if rows else None
+                except Error as e:
+                    self._notify(query, params, started, error=e)
+                    connection.rollback()
+                    raise
+                finally:
+                    if cursor:
+                        cursor.close()
         except Error as e:
-            self.connection.rollback()
             print(f"✗ Database error: {e}")
             return None
-        finally:
-            if cursor:
-                cursor.close()
+
+
+# Which affiliation counts as a user's primary role: docente before alumno,
+# posgrado before grado (the most permissive room access wins)
+ROLE_PRIORITY_ORDER = """ppa.rol = 'docente' DESC, COALESCE(pa.tipo, 'grado') = 'posgrado' DESC,
+                         ppa.nombre_programa, ppa.id_facultad"""
 
 
 class AuthManager:
-    """Handles user authentication"""
+    """Handles user authentication
     
-    def __init__(self, db: DatabaseManager):
+    Passwords are hashed and checked through `hasher` (inline bcrypt by
+    default; the web app passes one backed by a process pool). HasherBusy
+    from it is re-raised so callers can tell "try again" from "wrong
+    password".
+    """
+    
+    def __init__(self, db: DatabaseManager, hasher: PasswordHasher = None):
         self.db = db
+        self.hasher = hasher or PasswordHasher()
     
     def register(self, ci: str, nombre: str, apellido: str, email: str, password: str) -> bool:
         """Register a new user"""
@@ -98,6 +465,9 @@ class AuthManager:
                 print("✗ User with this CI or email already exists")
                 return False
             
+            # Hash first: if the hasher is busy nothing has been written yet
+            hashed = self.hasher.hash(password)
+            
             # Insert participant
             insert_participante = """
                 INSERT INTO participante (ci, nombre, apellido, email)
@@ -105,16 +475,17 @@ class AuthManager:
             """
             self.db.execute_query(insert_participante, (ci, nombre, apellido, email))
             
-            # Hash password and insert login
-            hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            # Insert login
             insert_login = """
                 INSERT INTO login (correo, password)
                 VALUES (%s, %s)
             """
-            self.db.execute_query(insert_login, (email, hashed.decode('utf-8')))
+            self.db.execute_query(insert_login, (email, hashed))
             
             print("✓ User registered successfully")
             return True
+        except HasherBusy:
+            raise
         except Exception as e:
             print(f"✗ Registration error: {e}")
             return False
@@ -130,8 +501,17 @@ class AuthManager:
             """
             user = self.db.execute_fetchone(query, (email,))
             
-            if user and bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+            if user and self.hasher.verify(password, user['password']):
                 print(f"✓ Welcome, {user['nombre']} {user['apellido']}!")
+                if self.hasher.needs_rehash(user['password']):
+                    # The cost changed since this hash was made; store one with the current cost
+                    try:
+                        self.db.execute_query(
+                            "UPDATE login SET password = %s WHERE correo = %s",
+                            (self.hasher.hash(password), user['correo'])
+                        )
+                    except HasherBusy:
+                        pass  # the next login retries
                 return {
                     'ci': user['ci'],
                     'email': user['correo'],
@@ -141,50 +521,31 @@ class AuthManager:
             else:
                 print("✗ Invalid email or password")
                 return None
+        except HasherBusy:
+            raise
         except Exception as e:
             print(f"✗ Login error: {e}")
             return None
     
-    def get_user_role(self, ci: str) -> Optional[Dict]:
-        """Get user's role and program info"""
-        # First try to get full info with JOIN
-        query = """
-            SELECT rol, nombre_programa, id_facultad, tipo
+    def get_user_roles(self, ci: str) -> List[Dict]:
+        """Get every role/program affiliation of a user, highest privilege first
+        
+        A program missing from programa_academico counts as 'grado'.
+        """
+        query = f"""
+            SELECT ppa.rol, ppa.nombre_programa, ppa.id_facultad, COALESCE(pa.tipo, 'grado') as tipo
             FROM participante_programa_academico ppa
-            JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa 
+            LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa 
                 AND ppa.id_facultad = pa.id_facultad
-            WHERE ci_participante = %s
-            LIMIT 1
+            WHERE ppa.ci_participante = %s
+            ORDER BY {ROLE_PRIORITY_ORDER}
         """
-        result = self.db.execute_fetchone(query, (ci,))
-        if result:
-            return result
-        
-        # If JOIN fails, try to get basic info without JOIN (fallback)
-        # This handles cases where there might be data integrity issues
-        query_fallback = """
-            SELECT rol, nombre_programa, id_facultad, 'grado' as tipo
-            FROM participante_programa_academico
-            WHERE ci_participante = %s
-            LIMIT 1
-        """
-        result_fallback = self.db.execute_fetchone(query_fallback, (ci,))
-        if result_fallback:
-            # Try to get the actual tipo from programa_academico if possible
-            tipo_query = """
-                SELECT tipo FROM programa_academico
-                WHERE nombre_programa = %s AND id_facultad = %s
-                LIMIT 1
-            """
-            tipo_result = self.db.execute_fetchone(
-                tipo_query, 
-                (result_fallback['nombre_programa'], result_fallback['id_facultad'])
-            )
-            if tipo_result:
-                result_fallback['tipo'] = tipo_result['tipo']
-            return result_fallback
-        
-        return None
+        return self.db.execute_query(query, (ci,), fetch=True) or []
+    
+    def get_user_role(self, ci: str) -> Optional[Dict]:
+        """Get user's primary role and program info (see get_user_roles)"""
+        roles = self.get_user_roles(ci)
+        return roles[0] if roles else None
     
     def user_has_program(self, ci: str) -> bool:
         """Check if user has at least one academic program associated"""
@@ -199,11 +560,379 @@ class AuthManager:
         return False
 
 
+# Structured rejection reasons returned by the transactional booking path
+REJECTION_MESSAGES = {
+    'room_not_found': "Room not found",
+    'turno_not_found': "Time slot not found",
+    'past_date': "Cannot book a date in the past",
+    'no_program': "User role not found - no academic program associated",
+    'room_posgrado_only': "This room is only for postgraduate students",
+    'room_docente_only': "This room is only for teachers",
+    'daily_limit': "Maximum 2 hours per day per building exceeded",
+    'weekly_limit': "Maximum 3 active reservations per week exceeded",
+    'over_capacity': "Number of participants exceeds room capacity",
+    'sanctioned': "User has an active sanction",
+    'room_taken': "Room already reserved for this time slot",
+    'double_booked': "User already has a reservation in this time slot",
+    'participant_not_found': "Participant not found",
+    'participant_sanctioned': "Participant has an active sanction",
+    'participant_daily_limit': "Participant already has 2 hours booked that day in this building",
+    'participant_weekly_limit': "Participant already has 3 active reservations that week",
+    'participant_double_booked': "Participant already has a reservation in this time slot",
+    'empty_series': "The recurrence rule matches no dates",
+    'series_too_long': "Too many slots in one series",
+    'room_busy': "The room is being booked by someone else, please try again",
+    'database_error': "Database error while creating the reservation",
+    'idempotency_mismatch': "This form was already submitted with different details; reload it and try again",
+}
+
+
+def rejection(code: str, message: str = None) -> Dict:
+    """Build a structured rejection reason"""
+    return {'code': code, 'message': message or REJECTION_MESSAGES[code]}
+
+
+# Participant checks that keep their booking-level code when they concern the requester
+REQUESTER_CODES = {
+    'participant_sanctioned': 'sanctioned',
+    'participant_daily_limit': 'daily_limit',
+    'participant_weekly_limit': 'weekly_limit',
+    'participant_double_booked': 'double_booked',
+}
+
+
+def participant_rejection(code: str, ci: str, is_requester: bool = False) -> Dict:
+    """Rejection tied to one participant (the CI is added to the message)"""
+    if is_requester and code in REQUESTER_CODES:
+        return {**rejection(REQUESTER_CODES[code]), 'ci': ci}
+    return {**rejection(code, f"{REJECTION_MESSAGES[code]}: {ci}"), 'ci': ci}
+
+
+def iso_week(fecha: date) -> int:
+    """ISO week key matching MySQL YEARWEEK(fecha, 3), e.g. 202503"""
+    year, week, _ = fecha.isocalendar()
+    return year * 100 + week
+
+
+def recurrence_slots(fecha_desde: date, fecha_hasta: date, dias_semana: List[int],
+                     id_turnos: List[int]) -> List[Tuple[date, int]]:
+    """(fecha, id_turno) pairs for every listed weekday (0 = Monday) in the range, times every turno"""
+    dias = set(dias_semana)
+    slots = []
+    fecha = fecha_desde
+    while fecha <= fecha_hasta:
+        if fecha.weekday() in dias:
+            slots.extend((fecha, id_turno) for id_turno in id_turnos)
+        fecha += timedelta(days=1)
+    return slots
+
+
+class QuotaLedger:
+    """Per-participant counters of active reservations behind the booking limits
+
+    cuota_diaria holds active reservations per (ci, edificio, fecha) and
+    cuota_semanal per (ci, ISO week), so the 2-per-day-per-building and
+    3-per-week checks are primary-key lookups. Every path that creates a
+    reservation, moves it in or out of 'activa' or deletes it calls
+    `adjust` inside its own transaction: -1 before the change and +1 after,
+    each counting only reservations that are 'activa' at that moment.
+    `rebuild` and `verify` reconcile the counters with reserva.
+    """
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._schema_ready = False
+
+    def ensure_schema(self) -> bool:
+        """Create the ledger tables if missing and fill them from reserva (migration 003)"""
+        if self._schema_ready:
+            return True
+        for statement in (
+            """CREATE TABLE IF NOT EXISTS cuota_diaria (
+                   ci_participante VARCHAR(15) NOT NULL,
+                   edificio VARCHAR(50) NOT NULL,
+                   fecha DATE NOT NULL,
+                   reservas_activas INT NOT NULL DEFAULT 0,
+                   PRIMARY KEY (ci_participante, edificio, fecha),
+                   FOREIGN KEY (ci_participante) REFERENCES participante (ci) ON DELETE CASCADE
+               ) ENGINE = InnoDB""",
+            """CREATE TABLE IF NOT EXISTS cuota_semanal (
+                   ci_participante VARCHAR(15) NOT NULL,
+                   semana INT NOT NULL,
+                   reservas_activas INT NOT NULL DEFAULT 0,
+                   PRIMARY KEY (ci_participante, semana),
+                   FOREIGN KEY (ci_participante) REFERENCES participante (ci) ON DELETE CASCADE
+               ) ENGINE = InnoDB""",
+        ):
+            if self.db.execute_query(statement) is None:
+                return False
+
+        # Databases that predate the ledger (or were loaded by a bulk script) start empty
+        state = self.db.execute_fetchone("""
+            SELECT EXISTS (SELECT 1 FROM cuota_semanal) AS con_cuotas,
+                   EXISTS (SELECT 1 FROM reserva WHERE estado = 'activa') AS con_activas
+        """)
+        if state and state['con_activas'] and not state['con_cuotas']:
+            self.rebuild()
+        self._schema_ready = True
+        return True
+
+    def adjust(self, cursor, reserva_ids: List[int], delta: int):
+        """Add `delta` to the counters of every participant of the given active reservations"""
+        if not reserva_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(reserva_ids))
+        # Fixed row order keeps lock acquisition consistent across transactions
+        cursor.execute(f"""
+            INSERT INTO cuota_diaria (ci_participante, edificio, fecha, reservas_activas)
+            SELECT rp.ci_participante, r.edificio, r.fecha, COUNT(*) * %s
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.id_reserva IN ({placeholders}) AND r.estado = 'activa'
+            GROUP BY rp.ci_participante, r.edificio, r.fecha
+            ORDER BY rp.ci_participante, r.edificio, r.fecha
+            ON DUPLICATE KEY UPDATE reservas_activas = reservas_activas + VALUES(reservas_activas)
+        """, (delta, *reserva_ids))
+        cursor.execute(f"""
+            INSERT INTO cuota_semanal (ci_participante, semana, reservas_activas)
+            SELECT rp.ci_participante, YEARWEEK(r.fecha, 3), COUNT(*) * %s
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.id_reserva IN ({placeholders}) AND r.estado = 'activa'
+            GROUP BY rp.ci_participante, YEARWEEK(r.fecha, 3)
+            ORDER BY rp.ci_participante, YEARWEEK(r.fecha, 3)
+            ON DUPLICATE KEY UPDATE reservas_activas = reservas_activas + VALUES(reservas_activas)
+        """, (delta, *reserva_ids))
+
+    def counts(self, ci: str, edificio: str, fecha: date) -> Tuple[int, int]:
+        """(active reservations that day in the building, active reservations that ISO week)"""
+        row = self.db.execute_fetchone("""
+            SELECT COALESCE((SELECT reservas_activas FROM cuota_diaria
+                             WHERE ci_participante = %s AND edificio = %s AND fecha = %s), 0) AS dia,
+                   COALESCE((SELECT reservas_activas FROM cuota_semanal
+                             WHERE ci_participante = %s AND semana = %s), 0) AS semana
+        """, (ci, edificio, fecha, ci, iso_week(fecha)))
+        return (int(row['dia']), int(row['semana'])) if row else (0, 0)
+
+    def _expected(self) -> Tuple[Dict, Dict]:
+        """Counters recomputed from reserva/reserva_participante"""
+        daily = self.db.execute_query("""
+            SELECT rp.ci_participante, r.edificio, r.fecha, COUNT(*) AS reservas_activas
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.estado = 'activa'
+            GROUP BY rp.ci_participante, r.edificio, r.fecha
+        """, fetch=True) or []
+        weekly = self.db.execute_query("""
+            SELECT rp.ci_participante, YEARWEEK(r.fecha, 3) AS semana, COUNT(*) AS reservas_activas
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.estado = 'activa'
+            GROUP BY rp.ci_participante, YEARWEEK(r.fecha, 3)
+        """, fetch=True) or []
+        return ({(r['ci_participante'], r['edificio'], r['fecha']): r['reservas_activas'] for r in daily},
+                {(r['ci_participante'], r['semana']): r['reservas_activas'] for r in weekly})
+
+    def verify(self) -> Dict[str, List[Dict]]:
+        """Ledger rows that disagree with the raw tables"""
+        expected_daily, expected_weekly = self._expected()
+        ledger_daily = {(r['ci_participante'], r['edificio'], r['fecha']): r['reservas_activas']
+                        for r in self.db.execute_query(
+                            "SELECT * FROM cuota_diaria WHERE reservas_activas <> 0", fetch=True) or []}
+        ledger_weekly = {(r['ci_participante'], r['semana']): r['reservas_activas']
+                         for r in self.db.execute_query(
+                             "SELECT * FROM cuota_semanal WHERE reservas_activas <> 0", fetch=True) or []}
+
+        def diff(expected, ledger, fields):
+            return [{**dict(zip(fields, key)), 'esperado': expected.get(key, 0), 'registrado': ledger.get(key, 0)}
+                    for key in sorted(set(expected) | set(ledger), key=str)
+                    if expected.get(key, 0) != ledger.get(key, 0)]
+
+        return {
+            'diaria': diff(expected_daily, ledger_daily, ('ci_participante', 'edificio', 'fecha')),
+            'semanal': diff(expected_weekly, ledger_weekly, ('ci_participante', 'semana')),
+        }
+
+    def rebuild(self) -> Optional[Tuple[int, int]]:
+        """Recompute both tables from reserva in one transaction; (daily rows, weekly rows)"""
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute("DELETE FROM cuota_diaria")
+                cursor.execute("DELETE FROM cuota_semanal")
+                cursor.execute("""
+                    INSERT INTO cuota_diaria (ci_participante, edificio, fecha, reservas_activas)
+                    SELECT rp.ci_participante, r.edificio, r.fecha, COUNT(*)
+                    FROM reserva r
+                    JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+                    WHERE r.estado = 'activa'
+                    GROUP BY rp.ci_participante, r.edificio, r.fecha
+                """)
+                daily = cursor.rowcount
+                cursor.execute("""
+                    INSERT INTO cuota_semanal (ci_participante, semana, reservas_activas)
+                    SELECT rp.ci_participante, YEARWEEK(r.fecha, 3), COUNT(*)
+                    FROM reserva r
+                    JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+                    WHERE r.estado = 'activa'
+                    GROUP BY rp.ci_participante, YEARWEEK(r.fecha, 3)
+                """)
+                return daily, cursor.rowcount
+        except Error as e:
+            print(f"✗ Error rebuilding quota ledger: {e}")
+            return None
+
+
+# Errors after which InnoDB has rolled the transaction back and it can simply be run again
+RETRYABLE_LOCK_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
 class ReservationManager:
-    """Handles reservation operations"""
+    """Handles reservation operations
+    
+    Bookings use row locks: the room row and then every participant row (in
+    CI order) are locked before anything is checked, so concurrent bookings
+    of the same room or sharing a participant run one after the other and
+    each sees the ones committed before it. The unique key on active slots
+    is the last line of defence, and deadlocks or lock-wait timeouts are
+    retried a few times with a jittered backoff.
+    """
+    
+    # Attendance rows written per UPDATE statement
+    ATTENDANCE_BATCH = 500
+    # Upper bound on the slots booked by one create_reservation_series call
+    MAX_SERIES_SLOTS = 200
+    # Extra attempts after a deadlock / lock-wait timeout, and the base backoff in seconds
+    LOCK_RETRIES = 3
+    LOCK_RETRY_BACKOFF = 0.05
     
     def __init__(self, db: DatabaseManager):
         self.db = db
+        self.auth = AuthManager(db)
+        self.quota = QuotaLedger(db)
+        self._schema_ready = False
+    
+    def ensure_schema(self) -> bool:
+        """Migrate reserva to the re-bookable unique key and create the idempotency table"""
+        if self._schema_ready:
+            return True
+        if not self.quota.ensure_schema():
+            return False
+        
+        state = self.db.execute_fetchone("""
+            SELECT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_schema = DATABASE() AND table_name = 'reserva'
+                           AND column_name = 'slot_activo') AS con_columna,
+                   EXISTS (SELECT 1 FROM information_schema.statistics
+                           WHERE table_schema = DATABASE() AND table_name = 'reserva'
+                           AND index_name = 'uk_reserva_slot_activo') AS con_clave_nueva,
+                   EXISTS (SELECT 1 FROM information_schema.statistics
+                           WHERE table_schema = DATABASE() AND table_name = 'reserva'
+                           AND index_name = 'uk_reserva_sala_fecha_turno') AS con_clave_vieja
+        """)
+        if state is None:
+            return False
+        # The old key covered cancelled reservations too, so their slots could never be booked again
+        changes = []
+        if not state['con_columna']:
+            changes.append("ADD COLUMN slot_activo TINYINT AS (IF(estado = 'activa', 1, NULL)) VIRTUAL INVISIBLE")
+        if not state['con_clave_nueva']:
+            changes.append("ADD UNIQUE KEY uk_reserva_slot_activo (nombre_sala, edificio, fecha, id_turno, slot_activo)")
+        if state['con_clave_vieja']:
+            changes.append("DROP INDEX uk_reserva_sala_fecha_turno")
+        if changes and self.db.execute_query("ALTER TABLE reserva " + ", ".join(changes)) is None:
+            return False
+        
+        result = self.db.execute_query("""
+            CREATE TABLE IF NOT EXISTS reserva_idempotencia (
+                clave VARCHAR(64) NOT NULL,
+                id_reserva INT NOT NULL,
+                ci_solicitante VARCHAR(15) NOT NULL,
+                fecha_creacion DATETIME NOT NULL,
+                PRIMARY KEY (clave, id_reserva),
+                FOREIGN KEY (id_reserva) REFERENCES reserva (id_reserva) ON DELETE CASCADE
+            ) ENGINE = InnoDB
+        """)
+        self._schema_ready = result is not None
+        return self._schema_ready
+    
+    def _lock_booking(self, cursor, nombre_sala: str, edificio: str, participantes: List[str]) -> Optional[Dict]:
+        """Lock the room row, then every participant row in CI order; returns the room or None
+        
+        Must run before any plain SELECT of the transaction: the snapshot
+        those read from is taken at the first one, i.e. after the locks.
+        The fixed order keeps concurrent bookings from deadlocking each other.
+        """
+        cursor.execute(
+            """SELECT tipo_sala, capacidad FROM sala
+               WHERE nombre_sala = %s AND edificio = %s
+               FOR UPDATE""",
+            (nombre_sala, edificio)
+        )
+        sala = cursor.fetchone()
+        if sala:
+            cursor.execute(
+                f"""SELECT ci FROM participante
+                    WHERE ci IN ({", ".join(["%s"] * len(participantes))})
+                    ORDER BY ci
+                    FOR UPDATE""",
+                tuple(participantes)
+            )
+            cursor.fetchall()
+        return sala
+    
+    @staticmethod
+    def _fingerprint(nombre_sala: str, edificio: str, slots: List[Tuple[date, int]],
+                     participantes: List[str]) -> str:
+        """SHA-256 of what a booking request asks for, stored with its idempotency key"""
+        request = [nombre_sala, edificio, sorted((fecha.isoformat(), id_turno) for fecha, id_turno in slots),
+                   sorted(participantes)]
+        return hashlib.sha256(json.dumps(request).encode('utf-8')).hexdigest()
+    
+    def _replayed(self, cursor, idempotency_key: Optional[str], ci: str,
+                  huella: str) -> Tuple[Optional[List[int]], List[Dict]]:
+        """Reservations already created for this idempotency key, if any
+        
+        A key reused for a different request (another room, date, turno or
+        participants) is rejected instead of returning the first booking.
+        """
+        if not idempotency_key:
+            return None, []
+        cursor.execute(
+            """SELECT id_reserva, huella FROM reserva_idempotencia
+               WHERE clave = %s AND ci_solicitante = %s
+               ORDER BY id_reserva""",
+            (idempotency_key, ci)
+        )
+        rows = cursor.fetchall()
+        if any(row['huella'] and row['huella'] != huella for row in rows):
+            return None, [rejection('idempotency_mismatch')]
+        return [row['id_reserva'] for row in rows] or None, []
+    
+    def _remember(self, cursor, idempotency_key: Optional[str], ci: str, huella: str, ids: List[int]):
+        """Record the reservations created for an idempotency key"""
+        if idempotency_key:
+            created = datetime.now()
+            cursor.executemany(
+                """INSERT INTO reserva_idempotencia (clave, id_reserva, ci_solicitante, huella, fecha_creacion)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                [(idempotency_key, id_reserva, ci, huella, created) for id_reserva in ids]
+            )
+    
+    def _retry_locked(self, book: Callable, action: str, *args) -> Tuple[Optional[object], List[Dict]]:
+        """Run a booking transaction, retrying it after deadlocks and lock-wait timeouts"""
+        for attempt in range(self.LOCK_RETRIES + 1):
+            try:
+                return book(*args)
+            except Error as e:
+                if e.errno in RETRYABLE_LOCK_ERRORS and attempt < self.LOCK_RETRIES:
+                    time.sleep(random.uniform(0, self.LOCK_RETRY_BACKOFF * 2 ** attempt))
+                    continue
+                if e.errno == errorcode.ER_DUP_ENTRY:
+                    return None, [rejection('room_taken')]
+                if e.errno in RETRYABLE_LOCK_ERRORS:
+                    return None, [rejection('room_busy')]
+                print(f"✗ Error {action}: {e}")
+                return None, [rejection('database_error', str(e))]
     
     def validate_reservation(self, ci: str, nombre_sala: str, edificio: str, 
                            fecha: date, id_turno: int, participantes: List[str]) -> Tuple[bool, str]:
@@ -220,14 +949,9 @@ class ReservationManager:
             return False, "Room not found"
         
         # Get user role
-        auth = AuthManager(self.db)
-        user_role = auth.get_user_role(ci)
+        user_role = self.auth.get_user_role(ci)
         if not user_role:
-            # Check if user has programs at all
-            if auth.user_has_program(ci):
-                return False, "User role not found - data integrity issue: programs exist but cannot retrieve role information"
-            else:
-                return False, "User role not found - no academic program associated"
+            return False, "User role not found - no academic program associated"
         
         tipo_sala = sala_info['tipo_sala']
         capacidad = sala_info['capacidad']
@@ -247,35 +971,12 @@ class ReservationManager:
         elif tipo_sala == 'posgrado' and tipo_programa == 'posgrado':
             is_exempt = True
         
-        # 2. Check ≤2h/day/building (unless exempt)
+        # 2-3. Check ≤2h/day/building and ≤3 active/week (unless exempt)
         if not is_exempt:
-            query_hours = """
-                SELECT SUM(1) as total_hours
-                FROM reserva r
-                JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
-                WHERE rp.ci_participante = %s
-                AND r.edificio = %s
-                AND r.fecha = %s
-                AND r.estado = 'activa'
-            """
-            result = self.db.execute_fetchone(query_hours, (ci, edificio, fecha))
-            if result and result['total_hours'] and result['total_hours'] >= 2:
+            horas_dia, reservas_semana = self.quota.counts(ci, edificio, fecha)
+            if horas_dia >= 2:
                 return False, "Maximum 2 hours per day per building exceeded"
-        
-        # 3. Check ≤3 active/week (unless exempt)
-        if not is_exempt:
-            week_start = fecha - timedelta(days=fecha.weekday())
-            week_end = week_start + timedelta(days=6)
-            query_week = """
-                SELECT COUNT(DISTINCT r.id_reserva) as total_reservas
-                FROM reserva r
-                JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
-                WHERE rp.ci_participante = %s
-                AND r.fecha BETWEEN %s AND %s
-                AND r.estado = 'activa'
-            """
-            result = self.db.execute_fetchone(query_week, (ci, week_start, week_end))
-            if result and result['total_reservas'] and result['total_reservas'] >= 3:
+            if reservas_semana >= 3:
                 return False, "Maximum 3 active reservations per week exceeded"
         
         # 4. Check capacity
@@ -308,6 +1009,407 @@ class ReservationManager:
     def create_reservation(self, ci: str, nombre_sala: str, edificio: str,
                           fecha: date, id_turno: int, participantes: List[str]) -> Optional[int]:
         """Create a new reservation"""
+        id_reserva, rejections = self.create_reservation_atomic(ci, nombre_sala, edificio,
+                                                                fecha, id_turno, participantes)
+        if id_reserva is None:
+            print(f"✗ Validation failed: {'; '.join(r['message'] for r in rejections)}")
+            return None
+        print(f"✓ Reservation created successfully (ID: {id_reserva})")
+        return id_reserva
+    
+    def create_reservation_atomic(self, ci: str, nombre_sala: str, edificio: str, fecha: date,
+                                  id_turno: int, participantes: List[str],
+                                  idempotency_key: str = None) -> Tuple[Optional[int], List[Dict]]:
+        """Validate and create a reservation in a single transaction
+        
+        The room and participant rows are locked first so concurrent bookings
+        serialize, every rule is evaluated by one aggregate query, and the
+        reservation plus all participants are inserted before committing.
+        A request repeated with the same `idempotency_key` (e.g. a form
+        submitted twice) returns the reservation created the first time;
+        the same key with different details is rejected ('idempotency_mismatch').
+        
+        Returns:
+            (id_reserva, []) on success, or (None, rejections) where each
+            rejection is a dict with 'code' and 'message'
+        """
+        participantes = list(dict.fromkeys(participantes))
+        if ci not in participantes:
+            participantes.insert(0, ci)
+        
+        if fecha < date.today():
+            return None, [rejection('past_date')]
+        
+        return self._retry_locked(self._book_slot, "creating reservation", ci, nombre_sala, edificio,
+                                  fecha, id_turno, participantes, idempotency_key)
+    
+    def _book_slot(self, ci: str, nombre_sala: str, edificio: str, fecha: date, id_turno: int,
+                   participantes: List[str], idempotency_key: Optional[str]) -> Tuple[Optional[int], List[Dict]]:
+        """One attempt of create_reservation_atomic"""
+        with self.db.transaction() as cursor:
+            sala = self._lock_booking(cursor, nombre_sala, edificio, participantes)
+            if not sala:
+                return None, [rejection('room_not_found')]
+            
+            huella = self._fingerprint(nombre_sala, edificio, [(fecha, id_turno)], participantes)
+            replayed, rejections = self._replayed(cursor, idempotency_key, ci, huella)
+            if rejections:
+                return None, rejections
+            if replayed:
+                return replayed[0], []
+            
+            cursor.execute(
+                f"""SELECT ur.rol, ur.tipo,
+                          EXISTS (SELECT 1 FROM turno WHERE id_turno = %s) AS turno_existe,
+                          EXISTS (SELECT 1 FROM reserva
+                                  WHERE nombre_sala = %s AND edificio = %s
+                                  AND fecha = %s AND id_turno = %s AND estado = 'activa') AS ocupada
+                   FROM (SELECT 1) AS base
+                   LEFT JOIN (
+                       SELECT ppa.rol, COALESCE(pa.tipo, 'grado') AS tipo
+                       FROM participante_programa_academico ppa
+                       LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa
+                           AND ppa.id_facultad = pa.id_facultad
+                       WHERE ppa.ci_participante = %s
+                       ORDER BY {ROLE_PRIORITY_ORDER}
+                       LIMIT 1
+                   ) AS ur ON TRUE""",
+                (id_turno, nombre_sala, edificio, fecha, id_turno, ci)
+            )
+            checks = cursor.fetchone()
+            
+            rejections = self._evaluate_booking_rules(sala, checks, len(participantes))
+            # Quotas, sanctions and clashes of every participant (requester included)
+            for result in self.check_participants(participantes, edificio, fecha, id_turno,
+                                                  sala['tipo_sala'], solicitante=ci, cursor=cursor):
+                rejections += result['rejections']
+            if rejections:
+                return None, rejections
+            
+            cursor.execute(
+                """INSERT INTO reserva (nombre_sala, edificio, fecha, id_turno, estado)
+                   VALUES (%s, %s, %s, %s, 'activa')""",
+                (nombre_sala, edificio, fecha, id_turno)
+            )
+            id_reserva = cursor.lastrowid
+            
+            # executemany rewrites this into one multi-row INSERT
+            fecha_solicitud = datetime.now()
+            cursor.executemany(
+                """INSERT INTO reserva_participante (ci_participante, id_reserva, fecha_solicitud_reserva, asistencia)
+                   VALUES (%s, %s, %s, FALSE)""",
+                [(participante_ci, id_reserva, fecha_solicitud) for participante_ci in participantes]
+            )
+            self.quota.adjust(cursor, [id_reserva], 1)
+            self._remember(cursor, idempotency_key, ci, huella, [id_reserva])
+            return id_reserva, []
+    
+    def _evaluate_booking_rules(self, sala: Dict, checks: Dict, num_participantes: int) -> List[Dict]:
+        """Apply the booking rules to the aggregate validation row"""
+        if not checks['turno_existe']:
+            return [rejection('turno_not_found')]
+        if checks['rol'] is None:
+            return [rejection('no_program')]
+        
+        tipo_sala = sala['tipo_sala']
+        rol = checks['rol']
+        tipo_programa = checks['tipo']
+        
+        rejections = []
+        if tipo_sala == 'posgrado' and tipo_programa != 'posgrado':
+            rejections.append(rejection('room_posgrado_only'))
+        if tipo_sala == 'docente' and rol != 'docente':
+            rejections.append(rejection('room_docente_only'))
+        
+        if num_participantes > sala['capacidad']:
+            rejections.append(rejection(
+                'over_capacity',
+                f"Number of participants ({num_participantes}) exceeds room capacity ({sala['capacidad']})"
+            ))
+        if checks['ocupada']:
+            rejections.append(rejection('room_taken'))
+        return rejections
+    
+    def check_participants(self, participantes: List[str], edificio: str, fecha: date, id_turno: int,
+                           tipo_sala: str, solicitante: str = None, cursor=None) -> List[Dict]:
+        """Validate every participant of a booking with one query
+        
+        Checks existence, active sanctions, the daily/weekly quotas (from the
+        quota ledger) and other active reservations in the same turno.
+        Teachers in 'docente' rooms and postgrads in 'posgrado' rooms are
+        exempt from the quotas, each judged by their own program. The
+        requester's rejections keep the booking-level codes.
+        
+        Returns:
+            One dict per participant, in input order, with 'ci' and
+            'rejections' (empty when the participant is fine)
+        """
+        if not participantes:
+            return []
+        lista = " UNION ALL ".join(["SELECT %s AS ci, %s AS pos"] * len(participantes))
+        params = [fecha, id_turno]
+        for pos, participante_ci in enumerate(participantes):
+            params += [participante_ci, pos]
+        params += [edificio, fecha, iso_week(fecha)]
+        
+        query = f"""
+            SELECT l.ci, p.ci IS NOT NULL AS existe,
+                   (SELECT ppa.rol
+                    FROM participante_programa_academico ppa
+                    LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa
+                        AND ppa.id_facultad = pa.id_facultad
+                    WHERE ppa.ci_participante = l.ci
+                    ORDER BY {ROLE_PRIORITY_ORDER}
+                    LIMIT 1) AS rol,
+                   (SELECT COALESCE(pa.tipo, 'grado')
+                    FROM participante_programa_academico ppa
+                    LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa
+                        AND ppa.id_facultad = pa.id_facultad
+                    WHERE ppa.ci_participante = l.ci
+                    ORDER BY {ROLE_PRIORITY_ORDER}
+                    LIMIT 1) AS tipo,
+                   COALESCE(cd.reservas_activas, 0) AS horas_dia,
+                   COALESCE(cs.reservas_activas, 0) AS reservas_semana,
+                   EXISTS (SELECT 1 FROM sancion_participante s
+                           WHERE s.ci_participante = l.ci AND s.fecha_fin >= CURDATE()) AS sancionado,
+                   EXISTS (SELECT 1 FROM reserva r
+                           JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+                           WHERE rp.ci_participante = l.ci AND r.fecha = %s
+                           AND r.id_turno = %s AND r.estado = 'activa') AS ocupado
+            FROM ({lista}) AS l
+            LEFT JOIN participante p ON p.ci = l.ci
+            LEFT JOIN cuota_diaria cd ON cd.ci_participante = l.ci
+                AND cd.edificio = %s AND cd.fecha = %s
+            LEFT JOIN cuota_semanal cs ON cs.ci_participante = l.ci AND cs.semana = %s
+            ORDER BY l.pos
+        """
+        if cursor is not None:
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
+        else:
+            rows = self.db.execute_query(query, tuple(params), fetch=True) or []
+        
+        results = []
+        for row in rows:
+            codes = []
+            if not row['existe']:
+                codes.append('participant_not_found')
+            else:
+                if row['sancionado']:
+                    codes.append('participant_sanctioned')
+                # Teachers/postgrads in their exclusive rooms skip the time limits
+                is_exempt = (tipo_sala == 'docente' and row['rol'] == 'docente') or \
+                            (tipo_sala == 'posgrado' and row['tipo'] == 'posgrado')
+                if not is_exempt:
+                    if row['horas_dia'] >= 2:
+                        codes.append('participant_daily_limit')
+                    if row['reservas_semana'] >= 3:
+                        codes.append('participant_weekly_limit')
+                if row['ocupado']:
+                    codes.append('participant_double_booked')
+            rejections = [participant_rejection(code, row['ci'], row['ci'] == solicitante) for code in codes]
+            results.append({'ci': row['ci'], 'rejections': rejections})
+        return results
+
+    def create_reservation_series(self, ci: str, nombre_sala: str, edificio: str,
+                                  slots: List[Tuple[date, int]],
+                                  participantes: List[str],
+                                  idempotency_key: str = None) -> Tuple[Optional[List[int]], List[Dict]]:
+        """Book the same room for many (fecha, id_turno) slots in one transaction
+
+        All slots are checked together with a fixed number of set-based
+        queries (room clashes, participant clashes, sanctions and the quota
+        ledger, counting the series' own slots towards the daily and weekly
+        limits) and either all are booked or none is. Locking, retries and
+        `idempotency_key` work as in create_reservation_atomic.
+
+        Returns:
+            (ids in slot order, []) on success, or (None, conflicts) where each
+            conflict is a rejection dict, with 'fecha' and 'id_turno' when it
+            concerns a single slot
+        """
+        participantes = list(dict.fromkeys(participantes))
+        if ci not in participantes:
+            participantes.insert(0, ci)
+        slots = sorted(set(slots))
+        if not slots:
+            return None, [rejection('empty_series')]
+        if len(slots) > self.MAX_SERIES_SLOTS:
+            return None, [rejection('series_too_long', f"A series can book at most {self.MAX_SERIES_SLOTS} slots")]
+
+        conflicts = [{**rejection('past_date'), 'fecha': fecha, 'id_turno': id_turno}
+                     for fecha, id_turno in slots if fecha < date.today()]
+        if conflicts:
+            return None, conflicts
+
+        return self._retry_locked(self._book_series, "creating reservation series", ci, nombre_sala,
+                                  edificio, slots, participantes, idempotency_key)
+
+    def _book_series(self, ci: str, nombre_sala: str, edificio: str, slots: List[Tuple[date, int]],
+                     participantes: List[str],
+                     idempotency_key: Optional[str]) -> Tuple[Optional[List[int]], List[Dict]]:
+        """One attempt of create_reservation_series"""
+        with self.db.transaction() as cursor:
+            sala = self._lock_booking(cursor, nombre_sala, edificio, participantes)
+            if not sala:
+                return None, [rejection('room_not_found')]
+
+            huella = self._fingerprint(nombre_sala, edificio, slots, participantes)
+            replayed, rejections = self._replayed(cursor, idempotency_key, ci, huella)
+            if rejections:
+                return None, rejections
+            if replayed:
+                return replayed, []
+
+            conflicts = self._check_series(cursor, ci, sala, nombre_sala, edificio, slots, participantes)
+            if conflicts:
+                return None, conflicts
+
+            cursor.executemany(
+                """INSERT INTO reserva (nombre_sala, edificio, fecha, id_turno, estado)
+                   VALUES (%s, %s, %s, %s, 'activa')""",
+                [(nombre_sala, edificio, fecha, id_turno) for fecha, id_turno in slots]
+            )
+            slot_list = ", ".join(["(%s, %s)"] * len(slots))
+            cursor.execute(
+                f"""SELECT id_reserva, fecha, id_turno FROM reserva
+                    WHERE nombre_sala = %s AND edificio = %s AND estado = 'activa'
+                    AND (fecha, id_turno) IN ({slot_list})""",
+                (nombre_sala, edificio, *[value for slot in slots for value in slot])
+            )
+            ids_by_slot = {(row['fecha'], row['id_turno']): row['id_reserva'] for row in cursor.fetchall()}
+            ids = [ids_by_slot[slot] for slot in slots]
+
+            fecha_solicitud = datetime.now()
+            cursor.executemany(
+                """INSERT INTO reserva_participante (ci_participante, id_reserva, fecha_solicitud_reserva, asistencia)
+                   VALUES (%s, %s, %s, FALSE)""",
+                [(participante_ci, id_reserva, fecha_solicitud)
+                 for id_reserva in ids for participante_ci in participantes]
+            )
+            self.quota.adjust(cursor, ids, 1)
+            self._remember(cursor, idempotency_key, ci, huella, ids)
+            return ids, []
+
+    def _check_series(self, cursor, ci: str, sala: Dict, nombre_sala: str, edificio: str,
+                      slots: List[Tuple[date, int]], participantes: List[str]) -> List[Dict]:
+        """Conflicts of a reservation series, evaluated with five queries whatever its length"""
+        slot_table = " UNION ALL ".join(["SELECT CAST(%s AS DATE) AS fecha, %s AS id_turno"] * len(slots))
+        slot_params = [value for slot in slots for value in slot]
+        people = ", ".join(["%s"] * len(participantes))
+
+        # 1. Per slot: turno exists, room already taken
+        cursor.execute(f"""
+            SELECT s.fecha, s.id_turno,
+                   EXISTS (SELECT 1 FROM turno t WHERE t.id_turno = s.id_turno) AS turno_existe,
+                   EXISTS (SELECT 1 FROM reserva r
+                           WHERE r.nombre_sala = %s AND r.edificio = %s AND r.fecha = s.fecha
+                           AND r.id_turno = s.id_turno AND r.estado = 'activa') AS ocupada
+            FROM ({slot_table}) AS s
+        """, (nombre_sala, edificio, *slot_params))
+        slot_rows = cursor.fetchall()
+
+        # 2. Per participant: exists, role, active sanction
+        participant_table = " UNION ALL ".join(["SELECT %s AS ci"] * len(participantes))
+        cursor.execute(f"""
+            SELECT l.ci, p.ci IS NOT NULL AS existe,
+                   (SELECT ppa.rol
+                    FROM participante_programa_academico ppa
+                    LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa
+                        AND ppa.id_facultad = pa.id_facultad
+                    WHERE ppa.ci_participante = l.ci
+                    ORDER BY {ROLE_PRIORITY_ORDER}
+                    LIMIT 1) AS rol,
+                   (SELECT COALESCE(pa.tipo, 'grado')
+                    FROM participante_programa_academico ppa
+                    LEFT JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa
+                        AND ppa.id_facultad = pa.id_facultad
+                    WHERE ppa.ci_participante = l.ci
+                    ORDER BY {ROLE_PRIORITY_ORDER}
+                    LIMIT 1) AS tipo,
+                   EXISTS (SELECT 1 FROM sancion_participante sp
+                           WHERE sp.ci_participante = l.ci AND sp.fecha_fin >= CURDATE()) AS sancionado
+            FROM ({participant_table}) AS l
+            LEFT JOIN participante p ON p.ci = l.ci
+        """, tuple(participantes))
+        people_rows = {row['ci']: row for row in cursor.fetchall()}
+
+        # 3. Participants already booked in any of the slots
+        cursor.execute(f"""
+            SELECT DISTINCT r.fecha, r.id_turno, rp.ci_participante
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.estado = 'activa' AND rp.ci_participante IN ({people})
+            AND (r.fecha, r.id_turno) IN ({", ".join(["(%s, %s)"] * len(slots))})
+        """, (*participantes, *slot_params))
+        clashes = {(row['fecha'], row['id_turno'], row['ci_participante']) for row in cursor.fetchall()}
+
+        # 4-5. Quota ledger for every (participant, day) and (participant, week) involved
+        fechas = sorted({fecha for fecha, _ in slots})
+        semanas = sorted({iso_week(fecha) for fecha in fechas})
+        cursor.execute(f"""
+            SELECT ci_participante, fecha, reservas_activas FROM cuota_diaria
+            WHERE edificio = %s AND ci_participante IN ({people})
+            AND fecha IN ({", ".join(["%s"] * len(fechas))})
+        """, (edificio, *participantes, *fechas))
+        daily = {(row['ci_participante'], row['fecha']): row['reservas_activas'] for row in cursor.fetchall()}
+        cursor.execute(f"""
+            SELECT ci_participante, semana, reservas_activas FROM cuota_semanal
+            WHERE ci_participante IN ({people})
+            AND semana IN ({", ".join(["%s"] * len(semanas))})
+        """, (*participantes, *semanas))
+        weekly = {(row['ci_participante'], row['semana']): row['reservas_activas'] for row in cursor.fetchall()}
+
+        requester = people_rows.get(ci) or {}
+        if requester.get('existe') and requester.get('rol') is None:
+            return [rejection('no_program')]
+        conflicts = []
+        for participante_ci in participantes:
+            row = people_rows.get(participante_ci)
+            if not row or not row['existe']:
+                conflicts.append(participant_rejection('participant_not_found', participante_ci, participante_ci == ci))
+            elif row['sancionado']:
+                conflicts.append(participant_rejection('participant_sanctioned', participante_ci, participante_ci == ci))
+
+        tipo_sala = sala['tipo_sala']
+        for slot_row in slot_rows:
+            fecha, id_turno = slot_row['fecha'], int(slot_row['id_turno'])
+            checks = {'turno_existe': slot_row['turno_existe'], 'ocupada': slot_row['ocupada'],
+                      'rol': requester.get('rol'), 'tipo': requester.get('tipo')}
+            slot_conflicts = self._evaluate_booking_rules(sala, checks, len(participantes))
+
+            for participante_ci in participantes:
+                row = people_rows.get(participante_ci)
+                if not row or not row['existe']:
+                    continue
+                codes = []
+                if (fecha, id_turno, participante_ci) in clashes:
+                    codes.append('participant_double_booked')
+                # Teachers/postgrads in their exclusive rooms skip the time limits
+                is_exempt = (tipo_sala == 'docente' and row['rol'] == 'docente') or \
+                            (tipo_sala == 'posgrado' and row['tipo'] == 'posgrado')
+                if not is_exempt:
+                    day_key = (participante_ci, fecha)
+                    week_key = (participante_ci, iso_week(fecha))
+                    if daily.get(day_key, 0) >= 2:
+                        codes.append('participant_daily_limit')
+                    if weekly.get(week_key, 0) >= 3:
+                        codes.append('participant_weekly_limit')
+                    # Slots of this series count towards the limits of the later ones
+                    daily[day_key] = daily.get(day_key, 0) + 1
+                    weekly[week_key] = weekly.get(week_key, 0) + 1
+                slot_conflicts += [participant_rejection(code, participante_ci, participante_ci == ci)
+                                   for code in codes]
+            conflicts += [{**conflict, 'fecha': fecha, 'id_turno': id_turno} for conflict in slot_conflicts]
+        return conflicts
+
+    def create_reservation_sequential(self, ci: str, nombre_sala: str, edificio: str,
+                                      fecha: date, id_turno: int, participantes: List[str]) -> Optional[int]:
+        """Create a reservation one autocommitted statement at a time
+        
+        Original creation path, kept as the baseline for
+        benchmarks/bench_reservation_create.py.
+        """
         # Validate first
         valid, message = self.validate_reservation(ci, nombre_sala, edificio, fecha, id_turno, participantes)
         if not valid:
@@ -326,7 +1428,7 @@ class ReservationManager:
             query_id = """
                 SELECT id_reserva FROM reserva
                 WHERE nombre_sala = %s AND edificio = %s
-                AND fecha = %s AND id_turno = %s
+                AND fecha = %s AND id_turno = %s AND estado = 'activa'
             """
             reserva = self.db.execute_fetchone(query_id, (nombre_sala, edificio, fecha, id_turno))
             if not reserva:
@@ -343,6 +1445,9 @@ class ReservationManager:
             for participante_ci in participantes:
                 self.db.execute_query(insert_participante, (participante_ci, id_reserva, fecha_solicitud))
             
+            with self.db.transaction() as cursor:
+                self.quota.adjust(cursor, [id_reserva], 1)
+            
             print(f"✓ Reservation created successfully (ID: {id_reserva})")
             return id_reserva
         except Exception as e:
@@ -355,62 +1460,110 @@ class ReservationManager:
             print("✗ Number of participants and attendance records must match")
             return False
         
+        marks = [(id_reserva, ci, asistencia) for ci, asistencia in zip(participantes_ci, asistencias)]
+        sin_asistencia = self.update_attendance_bulk(marks)
+        if sin_asistencia is None:
+            return False
+        if sin_asistencia:
+            print("✓ Attendance updated. Sanctions created for all participants (no attendance).")
+        else:
+            print("✓ Attendance updated successfully")
+        return True
+    
+    def update_attendance_bulk(self, marks: List[Tuple[int, str, bool]]) -> Optional[List[int]]:
+        """Record attendance for many reservations in one transaction
+        
+        `marks` holds (id_reserva, ci_participante, asistencia) tuples. Every
+        touched reservation is then checked for the no-show rule. Returns the
+        ids moved to 'sin asistencia', or None on error.
+        """
+        if not marks:
+            return []
+        
         try:
-            # Update attendance records
-            update_query = """
-                UPDATE reserva_participante
-                SET asistencia = %s
-                WHERE id_reserva = %s AND ci_participante = %s
-            """
-            for ci, asistencia in zip(participantes_ci, asistencias):
-                self.db.execute_query(update_query, (asistencia, id_reserva, ci))
-            
-            # Check if all participants have FALSE attendance
-            check_query = """
-                SELECT COUNT(*) as total, SUM(asistencia) as asistieron
-                FROM reserva_participante
-                WHERE id_reserva = %s
-            """
-            result = self.db.execute_fetchone(check_query, (id_reserva,))
-            
-            if result and result['total'] > 0 and result['asistieron'] == 0:
-                # All participants have FALSE attendance - create sanction
-                # Get reservation date
-                fecha_query = "SELECT fecha FROM reserva WHERE id_reserva = %s"
-                reserva = self.db.execute_fetchone(fecha_query, (id_reserva,))
-                
-                if reserva:
-                    fecha_reserva = reserva['fecha']
-                    fecha_inicio = fecha_reserva
-                    fecha_fin = fecha_inicio + timedelta(days=60)  # 2 months
-                    
-                    # Get all participants
-                    participantes_query = """
-                        SELECT ci_participante FROM reserva_participante
-                        WHERE id_reserva = %s
-                    """
-                    participantes = self.db.execute_query(participantes_query, (id_reserva,), fetch=True)
-                    
-                    # Create sanctions for all participants
-                    insert_sancion = """
-                        INSERT INTO sancion_participante (ci_participante, fecha_inicio, fecha_fin)
-                        VALUES (%s, %s, %s)
-                    """
-                    for p in participantes:
-                        self.db.execute_query(insert_sancion, (p['ci_participante'], fecha_inicio, fecha_fin))
-                    
-                    # Update reservation state
-                    update_estado = "UPDATE reserva SET estado = 'sin asistencia' WHERE id_reserva = %s"
-                    self.db.execute_query(update_estado, (id_reserva,))
-                    
-                    print("✓ Attendance updated. Sanctions created for all participants (no attendance).")
-            else:
-                print("✓ Attendance updated successfully")
-            
-            return True
-        except Exception as e:
+            with self.db.transaction() as cursor:
+                for i in range(0, len(marks), self.ATTENDANCE_BATCH):
+                    self._write_attendance(cursor, marks[i:i + self.ATTENDANCE_BATCH])
+                reserva_ids = list(dict.fromkeys(id_reserva for id_reserva, _, _ in marks))
+                return self._apply_no_show_rule(cursor, reserva_ids)
+        except Error as e:
             print(f"✗ Error updating attendance: {e}")
-            return False
+            return None
+    
+    def _write_attendance(self, cursor, marks: List[Tuple[int, str, bool]]):
+        """Set asistencia for a batch of (id_reserva, ci, asistencia) and mark it as recorded"""
+        pairs = ", ".join(["(%s, %s)"] * len(marks))
+        attended = [(id_reserva, ci) for id_reserva, ci, asistencia in marks if asistencia]
+        if attended:
+            attended_sql = f"(id_reserva, ci_participante) IN ({', '.join(['(%s, %s)'] * len(attended))})"
+        else:
+            attended_sql = "FALSE"
+        
+        params = [value for pair in attended for value in pair]
+        params += [value for id_reserva, ci, _ in marks for value in (id_reserva, ci)]
+        cursor.execute(
+            f"""UPDATE reserva_participante
+                SET asistencia = {attended_sql}
+                WHERE (id_reserva, ci_participante) IN ({pairs})""",
+            tuple(params)
+        )
+        reserva_ids = list(dict.fromkeys(id_reserva for id_reserva, _, _ in marks))
+        cursor.execute(
+            f"""UPDATE reserva SET asistencia_registrada = NOW()
+                WHERE id_reserva IN ({', '.join(['%s'] * len(reserva_ids))})""",
+            tuple(reserva_ids)
+        )
+    
+    def _apply_no_show_rule(self, cursor, reserva_ids: List[int], recorded_since: Optional[date] = None) -> List[int]:
+        """Sanction every participant of reservations nobody attended
+        
+        Set-based: one SELECT finds the no-show reservations, one
+        INSERT ... SELECT creates the 2-month sanctions and one UPDATE moves
+        them to 'sin asistencia'. Reservations already in that state are
+        skipped so re-saving attendance does not sanction twice.
+        
+        With `recorded_since` (the finalizer) only reservations dated from
+        then on whose attendance was actually recorded count: asistencia
+        defaults to FALSE, so an unrecorded list says nothing about who came.
+        """
+        if not reserva_ids:
+            return []
+        
+        placeholders = ", ".join(["%s"] * len(reserva_ids))
+        params = list(reserva_ids)
+        recorded_sql = ""
+        if recorded_since is not None:
+            recorded_sql = "AND r.asistencia_registrada IS NOT NULL AND r.fecha >= %s"
+            params.append(recorded_since)
+        cursor.execute(f"""
+            SELECT r.id_reserva
+            FROM reserva r
+            WHERE r.id_reserva IN ({placeholders})
+              AND r.estado <> 'sin asistencia'
+              {recorded_sql}
+              AND EXISTS (SELECT 1 FROM reserva_participante rp WHERE rp.id_reserva = r.id_reserva)
+              AND NOT EXISTS (SELECT 1 FROM reserva_participante rp
+                              WHERE rp.id_reserva = r.id_reserva AND rp.asistencia = TRUE)
+            FOR UPDATE
+        """, tuple(params))
+        no_shows = [row['id_reserva'] for row in cursor.fetchall()]
+        if not no_shows:
+            return []
+        
+        placeholders = ", ".join(["%s"] * len(no_shows))
+        cursor.execute(f"""
+            INSERT INTO sancion_participante (ci_participante, fecha_inicio, fecha_fin)
+            SELECT rp.ci_participante, r.fecha, DATE_ADD(r.fecha, INTERVAL 60 DAY)
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.id_reserva IN ({placeholders})
+        """, tuple(no_shows))
+        self.quota.adjust(cursor, no_shows, -1)
+        cursor.execute(
+            f"UPDATE reserva SET estado = 'sin asistencia' WHERE id_reserva IN ({placeholders})",
+            tuple(no_shows)
+        )
+        return no_shows
 
 
 class ReportManager:
@@ -447,6 +1600,76 @@ class ReportManager:
         
         return self.db.execute_query(query, tuple(params), fetch=True)
     
+    # Columns of each exportable dataset, in output order
+    EXPORT_COLUMNS = {
+        'reservas': ['id_reserva', 'fecha', 'hora_inicio', 'hora_fin', 'nombre_sala', 'edificio',
+                     'estado', 'num_participantes'],
+        'asistencia': ['id_reserva', 'fecha', 'hora_inicio', 'hora_fin', 'nombre_sala', 'edificio',
+                       'estado', 'ci_participante', 'nombre', 'apellido', 'fecha_solicitud_reserva', 'asistencia'],
+        'sanciones': ['id_sancion', 'ci_participante', 'nombre', 'apellido', 'email', 'fecha_inicio', 'fecha_fin'],
+    }
+    
+    def export_query(self, dataset: str, fecha_desde: date = None, fecha_hasta: date = None,
+                     edificio: str = None) -> Tuple[str, tuple]:
+        """SQL and parameters for an export dataset
+        
+        Dates filter reserva.fecha (sancion.fecha_inicio for 'sanciones');
+        edificio does not apply to sanciones. Rows come in primary key order
+        so the server can stream them without sorting the whole result.
+        """
+        if dataset not in self.EXPORT_COLUMNS:
+            raise ValueError(f"Unknown export dataset: {dataset}")
+        
+        where, params = [], []
+        if dataset == 'sanciones':
+            query = """
+                SELECT sp.id_sancion, sp.ci_participante, p.nombre, p.apellido, p.email,
+                       sp.fecha_inicio, sp.fecha_fin
+                FROM sancion_participante sp
+                JOIN participante p ON sp.ci_participante = p.ci
+            """
+            fecha_column, order = "sp.fecha_inicio", "sp.id_sancion"
+        else:
+            if dataset == 'reservas':
+                query = """
+                    SELECT r.id_reserva, r.fecha, t.hora_inicio, t.hora_fin, r.nombre_sala, r.edificio, r.estado,
+                           (SELECT COUNT(*) FROM reserva_participante rp WHERE rp.id_reserva = r.id_reserva) as num_participantes
+                    FROM reserva r
+                    JOIN turno t ON r.id_turno = t.id_turno
+                """
+                order = "r.id_reserva"
+            else:
+                query = """
+                    SELECT r.id_reserva, r.fecha, t.hora_inicio, t.hora_fin, r.nombre_sala, r.edificio, r.estado,
+                           rp.ci_participante, p.nombre, p.apellido, rp.fecha_solicitud_reserva, rp.asistencia
+                    FROM reserva r
+                    JOIN turno t ON r.id_turno = t.id_turno
+                    JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
+                    JOIN participante p ON rp.ci_participante = p.ci
+                """
+                order = "r.id_reserva, rp.ci_participante"
+            fecha_column = "r.fecha"
+            if edificio:
+                where.append("r.edificio = %s")
+                params.append(edificio)
+        
+        if fecha_desde:
+            where.append(f"{fecha_column} >= %s")
+            params.append(fecha_desde)
+        if fecha_hasta:
+            where.append(f"{fecha_column} <= %s")
+            params.append(fecha_hasta)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {order}"
+        return query, tuple(params)
+    
+    def iter_export(self, dataset: str, fecha_desde: date = None, fecha_hasta: date = None,
+                    edificio: str = None, chunk_size: int = 1000) -> Iterator[Dict]:
+        """Stream the rows of an export dataset (see export_query)"""
+        query, params = self.export_query(dataset, fecha_desde, fecha_hasta, edificio)
+        return self.db.iter_query(query, params, chunk_size)
+    
     def get_usage_stats(self):
         """Get usage statistics grouped by building and room type"""
         query = """
@@ -622,7 +1845,8 @@ class ConsoleApp:
         print("5. View Active Reservations")
         print("6. View Usage Statistics")
         print("7. View Sanctioned Users")
-        print("8. Exit")
+        print("8. Export Data")
+        print("9. Exit")
     
     def handle_register(self):
         """Handle user registration"""
@@ -826,6 +2050,43 @@ class ConsoleApp:
         else:
             print("No sanctioned users found")
     
+    def handle_export(self):
+        """Handle exporting a dataset to a CSV/JSONL file"""
+        from export_data import EXPORT_FORMATS, stream_export, export_filename
+        
+        print("\n=== Export Data ===")
+        datasets = sorted(ReportManager.EXPORT_COLUMNS)
+        dataset = input(f"Dataset ({'/'.join(datasets)}): ").strip()
+        if dataset not in datasets:
+            print("✗ Invalid dataset")
+            return
+        formato = input("Format (csv/jsonl) [csv]: ").strip() or "csv"
+        if formato not in EXPORT_FORMATS:
+            print("✗ Invalid format")
+            return
+        
+        try:
+            desde = input("From date YYYY-MM-DD (optional): ").strip()
+            hasta = input("To date YYYY-MM-DD (optional): ").strip()
+            fecha_desde = datetime.strptime(desde, "%Y-%m-%d").date() if desde else None
+            fecha_hasta = datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else None
+        except ValueError:
+            print("✗ Invalid date format")
+            return
+        edificio = input("Building (optional): ").strip() or None
+        compress = input("Compress with gzip? (y/N): ").strip().lower() == "y"
+        path = input(f"Output file [{export_filename(dataset, formato, compress)}]: ").strip() \
+            or export_filename(dataset, formato, compress)
+        
+        rows = self.report.iter_export(dataset, fecha_desde, fecha_hasta, edificio)
+        try:
+            with open(path, 'wb') as out:
+                for chunk in stream_export(rows, ReportManager.EXPORT_COLUMNS[dataset], formato, compress):
+                    out.write(chunk)
+            print(f"✓ Export written to {path}")
+        except (Error, OSError) as e:
+            print(f"✗ Export failed: {e}")
+    
     def run(self):
         """Run the main application loop"""
         if not self.setup():
@@ -850,6 +2111,8 @@ class ConsoleApp:
             elif choice == "7":
                 self.handle_sanctioned_users()
             elif choice == "8":
+                self.handle_export()
+            elif choice == "9":
                 print("\nGoodbye!")
                 break
             else:
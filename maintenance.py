@@ -0,0 +1,202 @@
+"""
+Maintenance Scheduler
+One background thread per process that runs the periodic housekeeping
+jobs (token access times, expired tokens, old sanctions, booking
+idempotency keys, report snapshots, the reservation finalizer) on its own
+connection, each at its own interval, recording the duration and row
+count of every run
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from mysql.connector import Error
+
+from main import DatabaseManager
+from metrics import registry as metrics
+
+
+def delete_in_batches(db: DatabaseManager, table: str, where: str, params: tuple = (),
+                      batch_size: int = 1000, stop: threading.Event = None) -> int:
+    """DELETE matching rows `batch_size` at a time, each batch its own short transaction
+
+    Returns the number of rows deleted; raises mysql.connector.Error when a
+    batch fails.
+    """
+    total = 0
+    while stop is None or not stop.is_set():
+        deleted = db.execute_query(f"DELETE FROM {table} WHERE {where} LIMIT %s", params + (batch_size,))
+        if deleted is None:
+            raise Error(msg=f"cleanup of {table} failed")
+        total += deleted
+        if deleted < batch_size:
+            break
+    return total
+
+
+class MaintenanceScheduler:
+    """Runs registered jobs in a daemon thread, each every `interval` seconds
+
+    A job is a callable receiving the scheduler's DatabaseManager and
+    returning the number of rows it touched. Jobs run one at a time, so
+    they share one connection and never hold more than one at once.
+    With `exclusive` (the default) a job first takes a MySQL named lock
+    without waiting, so when several worker processes run a scheduler only
+    one of them does each pass and the others skip it. The connection is
+    checked (and reopened if MySQL restarted or timed it out) before every
+    run; a run that cannot reach the database counts as an error, not a skip.
+    """
+
+    def __init__(self, db: DatabaseManager, lock_prefix: str = 'ucu_job_'):
+        self.db = db
+        self.lock_prefix = lock_prefix
+        self.jobs = {}
+        self._thread = None
+        # Set by stop(); long jobs may check it between batches
+        self.stopping = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, function: Callable[[DatabaseManager], int], interval: float,
+            exclusive: bool = True):
+        """Register a job; an interval <= 0 leaves it out"""
+        if interval <= 0:
+            return
+        self.jobs[name] = {
+            'function': function, 'interval': interval, 'exclusive': exclusive,
+            'next_run': time.monotonic(), 'last_run': None,
+            'totals': {'runs': 0, 'skipped': 0, 'errors': 0, 'rows': 0},
+        }
+
+    def _acquire(self, name: str) -> Optional[bool]:
+        """True if taken, False if another worker holds it, None if the query failed"""
+        row = self.db.execute_fetchone("SELECT GET_LOCK(%s, 0) AS locked", (self.lock_prefix + name,))
+        if row is None or row['locked'] is None:
+            return None
+        return bool(row['locked'])
+
+    def _release(self, name: str):
+        self.db.execute_fetchone("SELECT RELEASE_LOCK(%s) AS released", (self.lock_prefix + name,))
+
+    def run_job(self, name: str) -> Dict:
+        """Run one job now, returning (and recording) its result"""
+        job = self.jobs[name]
+        started = time.perf_counter()
+        result = {'started_at': datetime.now().isoformat(timespec='seconds'),
+                  'status': 'ok', 'rows': 0, 'error': None}
+        locked = True
+        if not (self.db.is_connected() or self.db.connect()):
+            locked = None
+        elif job['exclusive']:
+            locked = self._acquire(name)
+        if locked is None:
+            result['status'], result['error'] = 'error', 'database unavailable'
+            print(f"✗ Maintenance job {name} failed: database unavailable")
+        elif not locked:
+            result['status'] = 'skipped'
+        else:
+            try:
+                result['rows'] = job['function'](self.db) or 0
+            except Exception as e:
+                # Any failure is recorded; the thread must keep running the other jobs
+                result['status'], result['error'] = 'error', str(e)
+                print(f"✗ Maintenance job {name} failed: {e}")
+            finally:
+                if job['exclusive']:
+                    self._release(name)
+        duration = time.perf_counter() - started
+        result['duration_ms'] = round(duration * 1000, 1)
+
+        with self._lock:
+            job['last_run'] = result
+            totals = job['totals']
+            totals['runs'] += 1
+            totals['rows'] += result['rows']
+            if result['status'] == 'skipped':
+                totals['skipped'] += 1
+            elif result['status'] == 'error':
+                totals['errors'] += 1
+        metrics.inc('ucu_maintenance_runs_total', (name, result['status']))
+        if result['status'] != 'skipped':
+            metrics.inc('ucu_maintenance_rows_total', (name,), result['rows'])
+            metrics.observe('ucu_maintenance_duration_seconds', (name,), duration)
+        return result
+
+    def run_due(self) -> float:
+        """Run every job whose time has come; seconds until the next one is due"""
+        for name, job in self.jobs.items():
+            if self.stopping.is_set():
+                break
+            if time.monotonic() >= job['next_run']:
+                self.run_job(name)
+                job['next_run'] = time.monotonic() + job['interval']
+        if not self.jobs:
+            return 60.0
+        return max(0.0, min(job['next_run'] for job in self.jobs.values()) - time.monotonic())
+
+    def stats(self) -> Dict:
+        """Interval, last run and cumulative counters of every job"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'jobs': {name: {'interval': job['interval'],
+                                'next_run_in': round(max(0.0, job['next_run'] - now), 1),
+                                'last_run': job['last_run'],
+                                'totals': dict(job['totals'])}
+                         for name, job in self.jobs.items()},
+            }
+
+    # ==================== BACKGROUND THREAD ====================
+
+    def start(self):
+        """Run the jobs in a daemon thread until stop()"""
+        if (self._thread is not None and self._thread.is_alive()) or not self.jobs:
+            return
+        self.stopping.clear()
+
+        def loop():
+            while not self.stopping.is_set():
+                self._wake.wait(self.run_due())
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name='maintenance', daemon=True)
+        self._thread.start()
+
+    def trigger(self, name: Optional[str] = None) -> bool:
+        """Make one job (or all of them) run now instead of at its next interval"""
+        if name is not None and name not in self.jobs:
+            return False
+        for job_name, job in self.jobs.items():
+            if name is None or job_name == name:
+                job['next_run'] = 0.0
+        self._wake.set()
+        return True
+
+    def stop(self):
+        """Ask the thread to finish after the current job"""
+        self.stopping.set()
+        self._wake.set()
+
+
+# ==================== JOBS ====================
+
+def purge_expired_tokens(db: DatabaseManager, batch_size: int = 1000, stop: threading.Event = None) -> int:
+    """Delete expired access tokens and revocations whose tokens have all expired"""
+    return (delete_in_batches(db, 'access_token', 'fecha_expiracion < NOW()', batch_size=batch_size, stop=stop)
+            + delete_in_batches(db, 'token_revocado', 'expira < NOW()', batch_size=batch_size, stop=stop))
+
+
+def purge_old_sanctions(db: DatabaseManager, retention_days: int, batch_size: int = 1000,
+                        stop: threading.Event = None) -> int:
+    """Delete sanctions that ended more than `retention_days` days ago"""
+    return delete_in_batches(db, 'sancion_participante', 'fecha_fin < CURDATE() - INTERVAL %s DAY',
+                             (retention_days,), batch_size=batch_size, stop=stop)
+
+
+def purge_idempotency_keys(db: DatabaseManager, ttl_hours: int, batch_size: int = 1000,
+                           stop: threading.Event = None) -> int:
+    """Delete booking idempotency keys older than `ttl_hours`"""
+    return delete_in_batches(db, 'reserva_idempotencia', 'fecha_creacion < NOW() - INTERVAL %s HOUR',
+                             (ttl_hours,), batch_size=batch_size, stop=stop)
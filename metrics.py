@@ -0,0 +1,285 @@
+"""
+Application Metrics
+In-process counters and histograms rendered in the Prometheus text format.
+With a shared directory each worker process periodically writes its values
+to its own file and a scrape merges every file, so /metrics reports the
+whole deployment whichever worker answers it. When a worker exits, the
+master folds its file into the totals of exited workers
+(mark_process_dead), so counters never go down when workers restart.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional, Dict, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# name -> (type, help, label names, histogram buckets)
+METRICS = {
+    'ucu_http_request_duration_seconds': (
+        'histogram', 'Request latency by route', ('endpoint', 'method', 'status'), REQUEST_BUCKETS),
+    'ucu_db_query_duration_seconds': (
+        'histogram', 'Database statement latency by route', ('endpoint',), QUERY_BUCKETS),
+    'ucu_db_query_errors_total': (
+        'counter', 'Database statements that raised an error, by route', ('endpoint',), None),
+    'ucu_db_connects_total': (
+        'counter', 'Database (re)connection attempts from init_db', ('result',), None),
+    'ucu_startup_seconds': (
+        'histogram', 'Time from the first init_db call to a ready service, per process', (), REQUEST_BUCKETS),
+    'ucu_login_attempts_total': (
+        'counter', 'Login attempts by outcome (ok, failed, throttled, busy)', ('result',), None),
+    'ucu_token_validations_total': (
+        'counter', 'Access token validations by outcome (cache hit, cache miss, invalid, signed, revoked)', ('result',), None),
+    'ucu_reservations_total': (
+        'counter', 'Reservation attempts by outcome and rejection reason', ('result', 'reason'), None),
+    'ucu_report_render_seconds': (
+        'histogram', 'Report page render time by report', ('report',), REQUEST_BUCKETS),
+    'ucu_maintenance_runs_total': (
+        'counter', 'Maintenance job runs by outcome (ok, error, skipped while another worker ran it)',
+        ('job', 'status'), None),
+    'ucu_maintenance_rows_total': (
+        'counter', 'Rows deleted or updated by maintenance jobs', ('job',), None),
+    'ucu_maintenance_duration_seconds': (
+        'histogram', 'Maintenance job run time', ('job',), REQUEST_BUCKETS),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple, values: Tuple, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Totals of exited workers in a METRICS_DIR, plus the names of the files folded into them
+EXITED_FILE = 'exited.json'
+
+
+def _empty_exited() -> Dict:
+    return {'counters': [], 'histograms': [], 'merged': []}
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict):
+    """Write `data` to `path` with an atomic replace"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _merge(dumps) -> Tuple[Dict, Dict]:
+    """Sum the counters and histograms of several process dumps"""
+    counters, histograms = {}, {}
+    for dump in dumps:
+        for name, labels, value in dump['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, bucket_counts, total, count in dump['histograms']:
+            key = (name, tuple(labels))
+            merged = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def clear_directory(directory: str):
+    """Remove every metrics file left in `directory` by a previous run"""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')) + [os.path.join(directory, EXITED_FILE)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def mark_process_dead(directory: Optional[str], pid: int):
+    """Fold an exited worker's metrics file into the exited totals and remove it
+
+    Called by the gunicorn master (child_exit hook), the only writer of the
+    totals file. Without this, files of dead workers pile up, and the
+    scrape total drops whenever a worker restarts.
+    """
+    if not directory:
+        return
+    exited_path = os.path.join(directory, EXITED_FILE)
+    exited = _read_json(exited_path) or _empty_exited()
+    dumps = {os.path.basename(path): _read_json(path)
+             for path in glob.glob(os.path.join(directory, f'metrics-{pid}-*.json'))}
+    dumps = {name: dump for name, dump in dumps.items() if dump is not None}
+    if not dumps:
+        return
+    counters, histograms = _merge([exited] + list(dumps.values()))
+    # Keep only the names whose files still exist (those being removed now)
+    live = {os.path.basename(path) for path in glob.glob(os.path.join(directory, 'metrics-*.json'))}
+    _write_json(exited_path, {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), list(data[0]), data[1], data[2]]
+                       for (name, labels), data in histograms.items()],
+        'merged': sorted((set(exited['merged']) & live) | set(dumps)),
+    })
+    for name in dumps:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (metric name, label values)
+
+    `inc` and `observe` only touch a dict under a lock, so they are cheap
+    enough for per-request and per-statement use. Call `configure(directory)`
+    to share values between worker processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.directory = None
+        self.flush_interval = 5.0
+        self._flusher = None
+        self._started = time.time()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def configure(self, directory: Optional[str], flush_interval: float = 5.0):
+        """Enable multi-process mode, writing this process's values under `directory`"""
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _after_fork(self):
+        # A forked worker starts from zero; the parent's values stay in the parent's file
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flusher = None
+        self._started = time.time()
+        if self.directory:
+            self._start_flusher()
+
+    # ==================== RECORDING ====================
+
+    def inc(self, name: str, labels: Tuple = (), amount: float = 1):
+        """Increment a counter"""
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: Tuple, value: float):
+        """Record one histogram sample"""
+        key = (name, labels)
+        buckets = METRICS[name][3]
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                # per-bucket counts (+Inf last), sum, count
+                data = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            data[0][bisect_left(buckets, value)] += 1
+            data[1] += value
+            data[2] += 1
+
+    # ==================== MULTI-PROCESS ====================
+
+    def _dump(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(data[0]), data[1], data[2]]
+                               for (name, labels), data in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this process's values to its file (atomic replace)
+
+        The file name carries the process start time as well as the pid, so
+        a new worker that reuses a pid never overwrites an older file.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}-{int(self._started * 1000)}.json')
+        _write_json(path, self._dump())
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"✗ Could not write metrics file: {e}")
+
+    def _collect(self) -> Tuple[Dict, Dict]:
+        """Counters and histograms summed over every process, live and exited"""
+        if not self.directory:
+            return _merge([self._dump()])
+        self.flush()
+        # Live files are read before the exited totals: a file the master
+        # folds in meanwhile is then listed in `merged` and skipped, never
+        # counted twice or missed
+        live = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            dump = _read_json(path)
+            if dump is not None:
+                live[os.path.basename(path)] = dump
+        exited = _read_json(os.path.join(self.directory, EXITED_FILE)) or _empty_exited()
+        merged = set(exited['merged'])
+        return _merge([exited] + [dump for name, dump in live.items() if name not in merged])
+
+    # ==================== EXPOSITION ====================
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        counters, histograms = self._collect()
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(label_names, labels)} {_format_value(value)}')
+                continue
+            for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], bucket_counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                    lines.append(f'{name}_bucket{_format_labels(label_names, labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(label_names, labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(label_names, labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
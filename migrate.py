@@ -0,0 +1,168 @@
+"""
+Database Migrations
+Brings an existing database up to the current schema, recording every
+applied step in schema_migracion so each one runs once, and with --seed
+fills the reference tables (turnos, facultades, programas, edificios,
+salas) when they are empty. Run it once per deploy, before the web app
+starts; the app never migrates or seeds, and refuses to start while
+migrations are pending.
+
+Usage: python migrate.py [--seed] [--status]
+"""
+
+import argparse
+import time
+from typing import List, Optional
+
+from db_config import load_db_config
+from main import DatabaseManager, DataInitializer, QuotaLedger, ReservationManager
+from report_snapshots import ReportSnapshotEngine
+from reservation_finalizer import ReservationFinalizer
+from signed_tokens import RevocationList
+
+class SchemaOutdated(Exception):
+    """Raised by the web app at startup when migrations are pending"""
+
+
+def add_index(table: str, name: str, columns: str):
+    """Step creating an index unless it already exists"""
+    def step(db: DatabaseManager) -> bool:
+        exists = db.execute_fetchone(
+            """SELECT COUNT(*) AS n FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+            (table, name)
+        )
+        if exists is None:
+            return False
+        return bool(exists['n']) or db.execute_query(f"CREATE INDEX {name} ON {table} ({columns})") is not None
+    return step
+
+
+def add_column(table: str, column: str, definition: str):
+    """Step adding a column unless it already exists"""
+    def step(db: DatabaseManager) -> bool:
+        exists = db.execute_fetchone(
+            """SELECT COUNT(*) AS n FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+            (table, column)
+        )
+        if exists is None:
+            return False
+        return bool(exists['n']) or db.execute_query(f"ALTER TABLE {table} ADD COLUMN {column} {definition}") is not None
+    return step
+
+
+# (name, step) in application order; every step is idempotent and returns True on success
+MIGRATIONS = [
+    ('001_report_snapshot', lambda db: ReportSnapshotEngine(db).ensure_schema()),
+    ('002_job_checkpoint', lambda db: ReservationFinalizer(db).ensure_schema()),
+    ('003_cuota_ledger', lambda db: QuotaLedger(db).ensure_schema()),
+    ('004_reserva_slot_activo_idempotencia', lambda db: ReservationManager(db).ensure_schema()),
+    ('005_token_revocado', lambda db: RevocationList(db).ensure_schema()),
+    ('006_idx_reserva_estado_fecha', add_index('reserva', 'idx_reserva_estado_fecha', 'estado, fecha')),
+    ('007_idx_sancion_fecha_inicio', add_index('sancion_participante', 'idx_sancion_fecha_inicio', 'fecha_inicio')),
+    ('008_idx_participante_apellido_nombre',
+     add_index('participante', 'idx_participante_apellido_nombre', 'apellido, nombre')),
+    ('009_reserva_idempotencia_huella',
+     add_column('reserva_idempotencia', 'huella', "CHAR(64) NOT NULL DEFAULT '' AFTER ci_solicitante")),
+    ('010_idx_reserva_idempotencia_fecha',
+     add_index('reserva_idempotencia', 'idx_reserva_idempotencia_fecha', 'fecha_creacion')),
+    ('011_reserva_asistencia_registrada',
+     add_column('reserva', 'asistencia_registrada', 'DATETIME NULL AFTER estado')),
+]
+
+LOCK_NAME = 'ucu_migrate'
+
+
+def ensure_migration_table(db: DatabaseManager) -> bool:
+    """Create schema_migracion on databases that predate it"""
+    return db.execute_query("""
+        CREATE TABLE IF NOT EXISTS schema_migracion (
+            nombre VARCHAR(64) NOT NULL,
+            fecha_aplicacion DATETIME NOT NULL,
+            duracion_ms INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (nombre)
+        ) ENGINE = InnoDB
+    """) is not None
+
+
+def pending_migrations(db: DatabaseManager) -> Optional[List[str]]:
+    """Names of the migrations not applied yet (all of them if the table is missing), None on error"""
+    exists = db.execute_fetchone(
+        "SELECT COUNT(*) AS n FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = 'schema_migracion'"
+    )
+    if exists is None:
+        return None
+    if not exists['n']:
+        return [name for name, _ in MIGRATIONS]
+    rows = db.execute_query("SELECT nombre FROM schema_migracion", fetch=True)
+    if rows is None:
+        return None
+    applied = {row['nombre'] for row in rows}
+    return [name for name, _ in MIGRATIONS if name not in applied]
+
+
+def apply_migrations(db: DatabaseManager) -> bool:
+    """Run the pending migrations in order; needs a single-connection manager for the named lock"""
+    if not ensure_migration_table(db):
+        return False
+    # Concurrent deploys wait here instead of migrating twice
+    locked = db.execute_fetchone(f"SELECT GET_LOCK('{LOCK_NAME}', 300) AS locked")
+    if not locked or not locked['locked']:
+        print("✗ Could not acquire the migration lock")
+        return False
+    try:
+        pending = pending_migrations(db)
+        if pending is None:
+            return False
+        steps = dict(MIGRATIONS)
+        for name in pending:
+            started = time.perf_counter()
+            if not steps[name](db):
+                print(f"✗ Migration {name} failed")
+                return False
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            db.execute_query(
+                "INSERT INTO schema_migracion (nombre, fecha_aplicacion, duracion_ms) VALUES (%s, NOW(), %s)",
+                (name, elapsed_ms)
+            )
+            print(f"✓ Applied {name} ({elapsed_ms} ms)")
+        if not pending:
+            print("✓ Schema up to date")
+        return True
+    finally:
+        db.execute_fetchone(f"SELECT RELEASE_LOCK('{LOCK_NAME}') AS released")
+
+
+def main():
+    """Apply pending migrations and optionally seed the reference tables"""
+    parser = argparse.ArgumentParser(description="Migrate (and optionally seed) the database")
+    parser.add_argument('--seed', action='store_true', help="Fill empty reference tables with the sample data")
+    parser.add_argument('--status', action='store_true', help="Only list the pending migrations")
+    args = parser.parse_args()
+
+    db = DatabaseManager(**load_db_config())
+    if not db.connect():
+        raise SystemExit(1)
+    try:
+        if args.status:
+            pending = pending_migrations(db)
+            if pending is None:
+                raise SystemExit(1)
+            for name in pending:
+                print(f"  pending: {name}")
+            print(f"{len(pending)} pending migration(s)")
+            return
+
+        started = time.perf_counter()
+        if not apply_migrations(db):
+            raise SystemExit(1)
+        if args.seed:
+            DataInitializer(db).check_and_populate()
+        print(f"✓ Database ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Keyset Pagination
+Helpers for paging admin lists by the values of the last row shown
+instead of OFFSET, so every page costs the same regardless of depth
+"""
+
+import base64
+import binascii
+from typing import Optional, List, Dict, Tuple, Sequence
+from report_snapshots import encode_rows, decode_rows
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def clamp_page_size(page_size, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Parse a requested page size, falling back to `default` and capping it"""
+    try:
+        page_size = int(page_size)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque, URL-safe token holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(encode_rows(list(values)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token: str, size: int) -> Optional[Tuple]:
+    """Inverse of encode_cursor; None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        values = decode_rows(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return tuple(values)
+
+
+def keyset_condition(columns: Sequence[str], descending: bool) -> str:
+    """SQL predicate selecting rows strictly after a cursor in (columns...) order
+
+    Expanded as `a <op> %s OR (a = %s AND (b <op> %s OR ...))` and prefixed
+    with `a <op>= %s` so the leading column can use an index range. Bind
+    its parameters with `keyset_params`.
+    """
+    op = '<' if descending else '>'
+
+    def nested(i: int) -> str:
+        if i == len(columns) - 1:
+            return f"{columns[i]} {op} %s"
+        return f"({columns[i]} {op} %s OR ({columns[i]} = %s AND {nested(i + 1)}))"
+
+    return f"{columns[0]} {op}= %s AND {nested(0)}"
+
+
+def keyset_params(cursor: Tuple) -> List:
+    """Parameters for keyset_condition in placeholder order"""
+    params = [cursor[0]]
+    for value in cursor[:-1]:
+        params += [value, value]
+    params.append(cursor[-1])
+    return params
+
+
+def build_page(rows: List[Dict], page_size: int, key_columns: Sequence[str]) -> Dict:
+    """Turn `page_size + 1` fetched rows into a page with the next cursor"""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor([rows[-1][column] for column in key_columns])
+    return {'rows': rows, 'next_cursor': next_cursor, 'has_more': has_more, 'page_size': page_size}
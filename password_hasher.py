@@ -0,0 +1,205 @@
+"""
+Password Hashing
+Runs bcrypt in a small process pool instead of on the request thread,
+with a cap on queued calls, and throttles failed logins per email and
+per client address so that a flood of guesses is turned away before it
+costs any hashing
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashing calls are already queued"""
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification, inline or in a bounded process pool
+
+    With `workers` > 0 each call is sent to a pool of that many processes
+    (created on first use, per process) and at most `max_pending` calls
+    may be running or queued; beyond that HasherBusy is raised at once
+    instead of letting requests pile up behind the CPU. With `workers` = 0
+    (console app, scripts) bcrypt runs in the calling thread.
+
+    `rounds` is the cost of new hashes. needs_rehash() tells whether a
+    stored hash was made with a different cost.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 0, max_pending: int = 32, timeout: float = 10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.rejected = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's pool (and its management thread) is unusable here
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Not fork: this process has threads and open sockets a child would inherit
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy(f"{self.max_pending} password hashing calls already pending")
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._pool().submit(function, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot is freed when the task ends, not when the caller stops waiting,
+        # so calls that timed out still count against max_pending while they run
+        future.add_done_callback(self._finished)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HasherBusy(f"Password hashing took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self.close()
+            raise
+
+    def _finished(self, _future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """bcrypt hash of a password with the configured cost"""
+        return self._run(_hash, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Whether a password matches a stored hash (False for malformed hashes)"""
+        try:
+            return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Whether a stored hash ($2b$<cost>$...) uses a cost other than `rounds`"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'rounds': self.rounds, 'workers': self.workers, 'max_pending': self.max_pending,
+                    'pending': self.pending, 'rejected': self.rejected}
+
+    def close(self):
+        """Shut the process pool down (a later call starts a new one)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginThrottle:
+    """Failed login counters per email and per client address
+
+    After `max_failures` failures for an email (or `ip_max_failures` from
+    one address) within `window` seconds further attempts are refused for
+    `lockout` seconds, doubling with every extra failure up to
+    `max_lockout`. A successful login clears the email's counter.
+    `ip_max_failures` <= 0 turns the per-address limit off.
+
+    Counters are kept per process, in an LRU of at most `max_entries` keys.
+    Each worker process counts on its own, so with N workers an attacker
+    spreading guesses across them gets up to N times the limits.
+    """
+
+    def __init__(self, max_failures: int = 5, ip_max_failures: int = 0, window: float = 900.0,
+                 lockout: float = 30.0, max_lockout: float = 900.0, max_entries: int = 100000):
+        self.max_failures = max_failures
+        self.ip_max_failures = ip_max_failures
+        self.window = window
+        self.lockout = lockout
+        self.max_lockout = max_lockout
+        self.max_entries = max_entries
+        # key -> [failures, first failure, blocked until] (monotonic seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    def _keys(self, email: str, ip: str):
+        keys = [('email', email.strip().lower())]
+        if self.ip_max_failures > 0:
+            keys.append(('ip', ip))
+        return keys
+
+    def retry_after(self, email: str, ip: str) -> float:
+        """Seconds until this email/address may try again (0 if allowed now)"""
+        now = time.monotonic()
+        with self._lock:
+            wait = max((entry[2] - now for key in self._keys(email, ip)
+                        if (entry := self._entries.get(key)) is not None), default=0.0)
+            if wait > 0:
+                self.refused += 1
+                return wait
+            return 0.0
+
+    def failure(self, email: str, ip: str):
+        """Count a failed attempt against the email and the address"""
+        now = time.monotonic()
+        with self._lock:
+            for key, limit in zip(self._keys(email, ip), (self.max_failures, self.ip_max_failures)):
+                entry = self._entries.get(key)
+                if entry is None or now - entry[1] > self.window:
+                    entry = self._entries[key] = [0, now, 0.0]
+                self._entries.move_to_end(key)
+                entry[0] += 1
+                if entry[0] >= limit:
+                    entry[2] = now + min(self.lockout * 2 ** (entry[0] - limit), self.max_lockout)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def success(self, email: str):
+        """Forget the email's failures"""
+        with self._lock:
+            self._entries.pop(self._keys(email, '')[0], None)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {'tracked': len(self._entries), 'refused': self.refused,
+                    'locked': sum(1 for entry in self._entries.values() if entry[2] > now)}
@@ -0,0 +1,254 @@
+"""
+Query Statistics
+DatabaseManager listener that aggregates statement latency per SQL shape
+and per Flask endpoint, and attributes slow statements to their calling
+DatabaseService method and writes them with their EXPLAIN plan to a log
+"""
+
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Optional, List, Dict
+from main import DatabaseManager
+
+slow_log = logging.getLogger('ucu.slow_queries')
+
+# Distinct statement shapes tracked before new ones are folded into one bucket
+MAX_FINGERPRINTS = 500
+OTHER_FINGERPRINT = '<other>'
+# Slow statements waiting for the EXPLAIN thread; beyond this they are logged without a plan
+EXPLAIN_QUEUE_SIZE = 100
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)(?:\s*,\s*\(\s*%s(?:\s*,\s*%s)*\s*\))*')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so executions that differ only in values group together"""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def _caller() -> str:
+    """Name of the closest DatabaseService method on the stack (walks the stack: slow path only)"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename.endswith('database_service.py'):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return '-'
+
+
+def _new_bucket() -> Dict:
+    return {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+
+
+def _add(bucket: Dict, event: Dict):
+    bucket['count'] += 1
+    bucket['total_ms'] += event['duration_ms']
+    bucket['max_ms'] = max(bucket['max_ms'], event['duration_ms'])
+    if event['error']:
+        bucket['errors'] += 1
+    elif isinstance(event['rows'], int) and event['rows'] > 0:
+        bucket['rows'] += event['rows']
+
+
+def _summary(bucket: Dict) -> Dict:
+    return {**bucket,
+            'total_ms': round(bucket['total_ms'], 3),
+            'max_ms': round(bucket['max_ms'], 3),
+            'avg_ms': round(bucket['total_ms'] / bucket['count'], 3) if bucket['count'] else 0.0}
+
+
+class QueryStats:
+    """Aggregates DatabaseManager statement events
+
+    Attach it with `attach(db)`. Flask calls `begin_request(endpoint)` and
+    `end_request()` around each request so statements are attributed to the
+    endpoint and repeated statements within one request (N+1 patterns) are
+    reported. Statements slower than `slow_ms` are attributed to their
+    DatabaseService method (the stack is only walked for those) and logged
+    to the 'ucu.slow_queries' logger together with their EXPLAIN output.
+    The EXPLAIN runs on a background thread with its own connection, at
+    most once per statement shape every `explain_interval` seconds, so the
+    request that hit the slow statement never waits for it.
+    """
+
+    def __init__(self, slow_ms: float = 200.0, repeat_threshold: int = 10, explain_interval: float = 60.0):
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+        self.explain_interval = explain_interval
+        self.db = None
+        self._explain_db = None
+        self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self._last_explained = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The EXPLAIN thread and its connection stay in the parent
+        self._explain_db = None
+        self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+
+    def attach(self, db: DatabaseManager):
+        """Start receiving events from `db`"""
+        if self.db is not None:
+            self.db.remove_listener(self.record)
+        self.db = db
+        db.add_listener(self.record)
+
+    def reset(self):
+        """Clear every counter"""
+        with self._lock:
+            self._statements = defaultdict(_new_bucket)
+            self._callers = defaultdict(_new_bucket)
+            self._endpoints = defaultdict(lambda: {'requests': 0, 'queries': 0, 'total_ms': 0.0,
+                                                   'max_queries': 0, 'repeated': {}})
+            self._slow = 0
+            self._since = time.time()
+
+    # ==================== REQUEST SCOPE ====================
+
+    def begin_request(self, endpoint: Optional[str]):
+        """Attribute the following statements on this thread to `endpoint`"""
+        self._local.endpoint = endpoint or '-'
+        self._local.queries = 0
+        self._local.total_ms = 0.0
+        self._local.shapes = defaultdict(int)
+
+    def end_request(self):
+        """Fold the current request's statements into the endpoint counters"""
+        endpoint = getattr(self._local, 'endpoint', None)
+        if endpoint is None:
+            return
+        self._local.endpoint = None
+        with self._lock:
+            stats = self._endpoints[endpoint]
+            stats['requests'] += 1
+            stats['queries'] += self._local.queries
+            stats['total_ms'] += self._local.total_ms
+            stats['max_queries'] = max(stats['max_queries'], self._local.queries)
+            for shape, count in self._local.shapes.items():
+                if count >= self.repeat_threshold:
+                    stats['repeated'][shape] = max(stats['repeated'].get(shape, 0), count)
+
+    # ==================== EVENTS ====================
+
+    def record(self, event: Dict):
+        """DatabaseManager listener"""
+        shape = fingerprint(event['sql'])
+        slow = event['duration_ms'] >= self.slow_ms
+        caller = _caller() if slow else None
+        endpoint = getattr(self._local, 'endpoint', None)
+        if endpoint is not None:
+            self._local.queries += 1
+            self._local.total_ms += event['duration_ms']
+            self._local.shapes[shape] += 1
+
+        with self._lock:
+            if shape not in self._statements and len(self._statements) >= MAX_FINGERPRINTS:
+                shape = OTHER_FINGERPRINT
+            _add(self._statements[shape], event)
+            if slow:
+                _add(self._callers[caller], event)
+                self._slow += 1
+
+        if slow:
+            self._queue_slow(event, shape, caller, endpoint)
+
+    # ==================== SLOW STATEMENTS ====================
+
+    def _queue_slow(self, event: Dict, shape: str, caller: str, endpoint: Optional[str]):
+        """Hand a slow statement to the EXPLAIN thread (logged without a plan if it is backed up)"""
+        self._start_explainer()
+        try:
+            self._explain_queue.put_nowait((event, shape, caller, endpoint))
+        except queue.Full:
+            self._log_slow(event, caller, endpoint, None)
+
+    def _start_explainer(self):
+        if self._explainer is not None:
+            return
+        with self._explainer_lock:
+            if self._explainer is None:
+                self._explainer = threading.Thread(target=self._explain_loop, name='query-explain', daemon=True)
+                self._explainer.start()
+
+    def _explain_loop(self):
+        while True:
+            event, shape, caller, endpoint = self._explain_queue.get()
+            try:
+                plan = self._explain(event, shape)
+            except Exception as e:
+                # The thread must outlive one bad plan
+                plan = [f"failed: {e}"]
+            self._log_slow(event, caller, endpoint, plan)
+
+    def _log_slow(self, event: Dict, caller: str, endpoint: Optional[str], plan: Optional[List]):
+        slow_log.warning(
+            "%.1f ms | endpoint=%s caller=%s rows=%s%s\n  %s%s",
+            event['duration_ms'], endpoint or '-', caller, event['rows'],
+            f" error={event['error']}" if event['error'] else '',
+            _WHITESPACE.sub(' ', event['sql']).strip(),
+            ''.join(f"\n  EXPLAIN: {row}" for row in plan or [])
+        )
+
+    def _explain(self, event: Dict, shape: str) -> Optional[List[Dict]]:
+        """EXPLAIN a slow SELECT on a dedicated connection (EXPLAIN thread only)"""
+        if self.db is None or not shape.upper().startswith(('SELECT', 'WITH')):
+            return None
+        params = event['params']
+        if isinstance(params, list):
+            # executemany parameter list - nothing single to explain
+            return None
+        now = time.monotonic()
+        if now - self._last_explained.get(shape, -self.explain_interval) < self.explain_interval:
+            return None
+        self._last_explained[shape] = now
+        if self._explain_db is None or not self._explain_db.is_connected():
+            self._explain_db = self.db.spawn()
+            if not self._explain_db.connect():
+                self._explain_db = None
+                return None
+        return self._explain_db.execute_query("EXPLAIN " + event['sql'], params, fetch=True)
+
+    # ==================== REPORTING ====================
+
+    def stats(self, top: int = 25) -> Dict:
+        """Top statements, callers (of slow statements) and endpoints by total time"""
+        with self._lock:
+            statements = sorted(self._statements.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)
+            callers = sorted(self._callers.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)
+            endpoints = sorted(self._endpoints.items(), key=lambda kv: kv[1]['queries'], reverse=True)
+            return {
+                'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._since)),
+                'slow_ms': self.slow_ms,
+                'slow_statements': self._slow,
+                'statements': [{'sql': sql, **_summary(b)} for sql, b in statements[:top]],
+                'callers': [{'caller': name, **_summary(b)} for name, b in callers[:top]],
+                'endpoints': [{
+                    'endpoint': name,
+                    'requests': e['requests'],
+                    'queries': e['queries'],
+                    'queries_per_request': round(e['queries'] / e['requests'], 2) if e['requests'] else 0.0,
+                    'max_queries': e['max_queries'],
+                    'avg_ms': round(e['total_ms'] / e['requests'], 3) if e['requests'] else 0.0,
+                    'repeated_statements': dict(e['repeated']),
+                } for name, e in endpoints[:top]],
+            }
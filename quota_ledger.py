@@ -0,0 +1,48 @@
+"""
+Quota Ledger Maintenance
+Verifies the cuota_diaria/cuota_semanal counters against reserva and
+rebuilds them when they drift (e.g. after rows were edited by hand)
+
+Usage: python quota_ledger.py {verify,rebuild}
+"""
+
+import argparse
+from db_config import load_db_config
+from main import DatabaseManager, QuotaLedger
+
+
+def main():
+    """Verify or rebuild the quota ledger"""
+    parser = argparse.ArgumentParser(description="Reconcile the booking quota ledger with reserva")
+    parser.add_argument('action', choices=['verify', 'rebuild'])
+    args = parser.parse_args()
+
+    db = DatabaseManager(**load_db_config())
+    if not db.connect():
+        raise SystemExit(1)
+    try:
+        ledger = QuotaLedger(db)
+        if not ledger.ensure_schema():
+            raise SystemExit(1)
+        if args.action == 'rebuild':
+            result = ledger.rebuild()
+            if result is None:
+                raise SystemExit(1)
+            print(f"✓ Quota ledger rebuilt ({result[0]} daily, {result[1]} weekly rows)")
+            return
+
+        mismatches = ledger.verify()
+        for tabla, rows in mismatches.items():
+            for row in rows:
+                print(f"✗ cuota_{tabla}: {row}")
+        total = sum(len(rows) for rows in mismatches.values())
+        if total:
+            print(f"✗ {total} mismatch(es); run 'python quota_ledger.py rebuild'")
+            raise SystemExit(1)
+        print("✓ Quota ledger matches reserva")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
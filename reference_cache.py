@@ -0,0 +1,149 @@
+"""
+Reference Data Cache
+In-memory copy of the small lookup tables (turno, edificio, facultad,
+programa_academico) used to render forms and resolve ids
+"""
+
+import threading
+import time
+from typing import Optional, List, Dict
+from main import DatabaseManager
+
+
+# Query loading each cached table, in the order the dropdowns show it
+REFERENCE_QUERIES = {
+    'turno': "SELECT * FROM turno ORDER BY hora_inicio",
+    'edificio': "SELECT * FROM edificio ORDER BY nombre_edificio",
+    'facultad': "SELECT * FROM facultad ORDER BY nombre",
+    'programa': """SELECT pa.*, f.nombre as nombre_facultad
+                   FROM programa_academico pa
+                   JOIN facultad f ON pa.id_facultad = f.id_facultad
+                   ORDER BY f.nombre, pa.nombre_programa""",
+}
+
+
+class ReferenceDataCache:
+    """Versioned cache of reference tables with O(1) key lookups
+
+    Each table is loaded on first use together with a dict index on its
+    key. Write paths call `invalidate(table)`, which bumps the table's
+    version and drops it so the next read reloads. Entries also expire
+    after `max_age` seconds so changes made by other worker processes or
+    directly in MySQL are picked up.
+    """
+
+    def __init__(self, db: DatabaseManager, max_age: float = 300.0):
+        self.db = db
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._index = {}
+        self._loaded_at = {}
+        self._versions = {table: 0 for table in REFERENCE_QUERIES}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(table: str, row: Dict):
+        if table == 'turno':
+            return row['id_turno']
+        if table == 'edificio':
+            return row['nombre_edificio']
+        if table == 'facultad':
+            return row['id_facultad']
+        return (row['nombre_programa'], row['id_facultad'])
+
+    def _table(self, table: str) -> List[Dict]:
+        with self._lock:
+            loaded_at = self._loaded_at.get(table)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.max_age:
+                self.hits += 1
+                return self._rows[table]
+            self.misses += 1
+            version = self._versions[table]
+
+        rows = self.db.execute_query(REFERENCE_QUERIES[table], fetch=True)
+        if rows is None:
+            # Don't cache a failed load
+            return []
+
+        with self._lock:
+            # A write that happened while loading makes this copy stale
+            if self._versions[table] == version:
+                self._rows[table] = rows
+                self._index[table] = {self._key(table, row): row for row in rows}
+                self._loaded_at[table] = time.monotonic()
+        return rows
+
+    def _lookup(self, table: str, key) -> Optional[Dict]:
+        self._table(table)
+        with self._lock:
+            row = self._index.get(table, {}).get(key)
+        return dict(row) if row else None
+
+    def invalidate(self, table: str = None):
+        """Drop one table (or all of them) after a write"""
+        with self._lock:
+            for name in ([table] if table else list(REFERENCE_QUERIES)):
+                self._versions[name] += 1
+                self._loaded_at.pop(name, None)
+
+    def version(self, table: str) -> int:
+        """Current version of a table (bumped on every invalidation)"""
+        with self._lock:
+            return self._versions[table]
+
+    # ==================== LISTS ====================
+
+    def turnos(self) -> List[Dict]:
+        """All turnos ordered by start time"""
+        return [dict(row) for row in self._table('turno')]
+
+    def edificios(self) -> List[Dict]:
+        """All buildings ordered by name"""
+        return [dict(row) for row in self._table('edificio')]
+
+    def facultades(self) -> List[Dict]:
+        """All faculties ordered by name"""
+        return [dict(row) for row in self._table('facultad')]
+
+    def programas(self) -> List[Dict]:
+        """All programs with their faculty name, ordered by faculty and program"""
+        return [dict(row) for row in self._table('programa')]
+
+    # ==================== LOOKUPS ====================
+
+    def turno(self, id_turno: int) -> Optional[Dict]:
+        """Turno by id"""
+        return self._lookup('turno', id_turno)
+
+    def turno_starting_at(self, hora_inicio) -> Optional[Dict]:
+        """Turno starting at `hora_inicio` (a timedelta, as MySQL returns TIME)"""
+        return next((dict(t) for t in self._table('turno') if t['hora_inicio'] == hora_inicio), None)
+
+    def edificio(self, nombre_edificio: str) -> Optional[Dict]:
+        """Building by name"""
+        return self._lookup('edificio', nombre_edificio)
+
+    def facultad(self, id_facultad: int) -> Optional[Dict]:
+        """Faculty by id"""
+        return self._lookup('facultad', id_facultad)
+
+    def programa(self, nombre_programa: str, id_facultad: int) -> Optional[Dict]:
+        """Program by (nombre_programa, id_facultad)"""
+        return self._lookup('programa', (nombre_programa, id_facultad))
+
+    def programa_tipo(self, nombre_programa: str, id_facultad: int) -> Optional[str]:
+        """'grado' or 'posgrado' for a program"""
+        programa = self.programa(nombre_programa, id_facultad)
+        return programa['tipo'] if programa else None
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and table versions"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'versions': dict(self._versions),
+                'loaded': sorted(self._loaded_at),
+            }
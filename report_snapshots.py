@@ -0,0 +1,331 @@
+"""
+Report Snapshots
+Pre-computed results for the admin reports, stored in the report_snapshot
+table so a report page is a single primary-key lookup
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Optional, List, Dict, Tuple
+from db_config import load_db_config
+from main import DatabaseManager
+
+
+# Aggregate query behind each report, keyed by report name
+REPORT_QUERIES = {
+    'salas_mas_reservadas': """
+        SELECT s.nombre_sala, s.edificio, s.tipo_sala, s.capacidad,
+               COUNT(r.id_reserva) as total_reservas
+        FROM sala s
+        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
+        GROUP BY s.nombre_sala, s.edificio, s.tipo_sala, s.capacidad
+        ORDER BY total_reservas DESC, s.edificio, s.nombre_sala
+    """,
+    'turnos_mas_demandados': """
+        SELECT t.id_turno, t.hora_inicio, t.hora_fin,
+               COUNT(r.id_reserva) as total_reservas
+        FROM turno t
+        LEFT JOIN reserva r ON t.id_turno = r.id_turno
+        GROUP BY t.id_turno, t.hora_inicio, t.hora_fin
+        ORDER BY total_reservas DESC, t.hora_inicio
+    """,
+    'promedio_participantes_sala': """
+        SELECT s.nombre_sala, s.edificio, s.capacidad,
+               COUNT(DISTINCT r.id_reserva) as total_reservas,
+               COUNT(rp.ci_participante) as total_participantes,
+               CASE
+                   WHEN COUNT(DISTINCT r.id_reserva) > 0
+                   THEN ROUND(COUNT(rp.ci_participante) / COUNT(DISTINCT r.id_reserva), 2)
+                   ELSE 0
+               END as promedio_participantes
+        FROM sala s
+        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
+        LEFT JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
+        GROUP BY s.nombre_sala, s.edificio, s.capacidad
+        ORDER BY promedio_participantes DESC, s.edificio, s.nombre_sala
+    """,
+    'reservas_por_carrera_facultad': """
+        SELECT f.nombre as facultad, pa.nombre_programa, pa.tipo,
+               COUNT(DISTINCT r.id_reserva) as total_reservas,
+               COUNT(DISTINCT rp.ci_participante) as total_participantes
+        FROM facultad f
+        JOIN programa_academico pa ON f.id_facultad = pa.id_facultad
+        LEFT JOIN participante_programa_academico ppa ON pa.nombre_programa = ppa.nombre_programa AND pa.id_facultad = ppa.id_facultad
+        LEFT JOIN reserva_participante rp ON ppa.ci_participante = rp.ci_participante
+        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
+        GROUP BY f.nombre, pa.nombre_programa, pa.tipo
+        ORDER BY f.nombre, pa.nombre_programa
+    """,
+    'ocupacion_por_edificio': """
+        SELECT e.nombre_edificio, e.direccion,
+               COUNT(DISTINCT s.nombre_sala) as total_salas,
+               COUNT(DISTINCT CASE WHEN r.estado = 'activa' THEN r.id_reserva END) as reservas_activas,
+               COUNT(DISTINCT r.id_reserva) as total_reservas,
+               CASE
+                   WHEN COUNT(DISTINCT s.nombre_sala) > 0
+                   THEN ROUND((COUNT(DISTINCT CASE WHEN r.estado = 'activa' THEN r.id_reserva END) * 100.0) / COUNT(DISTINCT s.nombre_sala), 2)
+                   ELSE 0
+               END as porcentaje_ocupacion
+        FROM edificio e
+        LEFT JOIN sala s ON e.nombre_edificio = s.edificio
+        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
+        GROUP BY e.nombre_edificio, e.direccion
+        ORDER BY porcentaje_ocupacion DESC, e.nombre_edificio
+    """,
+    'reservas_asistencias_profesores_alumnos': """
+        SELECT ppa.rol, pa.tipo,
+               COUNT(DISTINCT r.id_reserva) as total_reservas,
+               COUNT(DISTINCT CASE WHEN rp.asistencia = TRUE THEN r.id_reserva END) as reservas_con_asistencia,
+               COUNT(rp.ci_participante) as total_participaciones,
+               SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) as total_asistencias,
+               CASE
+                   WHEN COUNT(rp.ci_participante) > 0
+                   THEN ROUND((SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) * 100.0) / COUNT(rp.ci_participante), 2)
+                   ELSE 0
+               END as porcentaje_asistencia
+        FROM participante_programa_academico ppa
+        JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa AND ppa.id_facultad = pa.id_facultad
+        LEFT JOIN reserva_participante rp ON ppa.ci_participante = rp.ci_participante
+        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
+        GROUP BY ppa.rol, pa.tipo
+        ORDER BY ppa.rol, pa.tipo
+    """,
+    'sanciones_profesores_alumnos': """
+        SELECT ppa.rol, pa.tipo,
+               COUNT(DISTINCT sp.id_sancion) as total_sanciones,
+               COUNT(DISTINCT sp.ci_participante) as participantes_sancionados
+        FROM participante_programa_academico ppa
+        JOIN programa_academico pa ON ppa.nombre_programa = pa.nombre_programa AND ppa.id_facultad = pa.id_facultad
+        LEFT JOIN sancion_participante sp ON ppa.ci_participante = sp.ci_participante
+        WHERE sp.fecha_fin >= CURDATE() OR sp.id_sancion IS NULL
+        GROUP BY ppa.rol, pa.tipo
+        ORDER BY ppa.rol, pa.tipo
+    """,
+    'porcentaje_reservas_utilizadas': """
+        SELECT
+            COUNT(*) as total_reservas,
+            SUM(CASE WHEN estado = 'activa' THEN 1 ELSE 0 END) as reservas_activas,
+            SUM(CASE WHEN estado = 'finalizada' THEN 1 ELSE 0 END) as reservas_finalizadas,
+            SUM(CASE WHEN estado = 'cancelada' THEN 1 ELSE 0 END) as reservas_canceladas,
+            SUM(CASE WHEN estado = 'sin asistencia' THEN 1 ELSE 0 END) as reservas_sin_asistencia,
+            CASE
+                WHEN COUNT(*) > 0
+                THEN ROUND((SUM(CASE WHEN estado = 'finalizada' THEN 1 ELSE 0 END) * 100.0) / COUNT(*), 2)
+                ELSE 0
+            END as porcentaje_utilizadas,
+            CASE
+                WHEN COUNT(*) > 0
+                THEN ROUND(((SUM(CASE WHEN estado = 'cancelada' THEN 1 ELSE 0 END) + SUM(CASE WHEN estado = 'sin asistencia' THEN 1 ELSE 0 END)) * 100.0) / COUNT(*), 2)
+                ELSE 0
+            END as porcentaje_no_utilizadas
+        FROM reserva
+    """,
+    'reservas_por_mes': """
+        SELECT
+            DATE_FORMAT(fecha, '%Y-%m') as mes,
+            COUNT(*) as total_reservas,
+            COUNT(DISTINCT nombre_sala, edificio) as salas_utilizadas,
+            COUNT(DISTINCT rp.ci_participante) as participantes_unicos
+        FROM reserva r
+        LEFT JOIN reserva_participante rp ON r.id_reserva = rp.id_reserva
+        GROUP BY DATE_FORMAT(fecha, '%Y-%m')
+        ORDER BY mes DESC
+    """,
+    'participantes_mas_activos': """
+        SELECT
+            p.ci, p.nombre, p.apellido, p.email,
+            COUNT(DISTINCT r.id_reserva) as total_reservas,
+            SUM(CASE WHEN rp.asistencia = TRUE THEN 1 ELSE 0 END) as total_asistencias,
+            COUNT(DISTINCT sp.id_sancion) as total_sanciones
+        FROM participante p
+        LEFT JOIN reserva_participante rp ON p.ci = rp.ci_participante
+        LEFT JOIN reserva r ON rp.id_reserva = r.id_reserva
+        LEFT JOIN sancion_participante sp ON p.ci = sp.ci_participante
+        GROUP BY p.ci, p.nombre, p.apellido, p.email
+        HAVING total_reservas > 0
+        ORDER BY total_reservas DESC, total_asistencias DESC
+        LIMIT 20
+    """,
+    'eficiencia_uso_salas': """
+        SELECT
+            s.nombre_sala, s.edificio, s.capacidad, s.tipo_sala,
+            COUNT(DISTINCT r.id_reserva) as total_reservas,
+            AVG((SELECT COUNT(*) FROM reserva_participante rp2 WHERE rp2.id_reserva = r.id_reserva)) as promedio_participantes,
+            SUM(CASE WHEN r.estado = 'finalizada' THEN 1 ELSE 0 END) as reservas_completadas,
+            SUM(CASE WHEN r.estado = 'sin asistencia' THEN 1 ELSE 0 END) as reservas_no_asistidas,
+            CASE
+                WHEN COUNT(DISTINCT r.id_reserva) > 0
+                THEN ROUND((SUM(CASE WHEN r.estado = 'finalizada' THEN 1 ELSE 0 END) * 100.0) / COUNT(DISTINCT r.id_reserva), 2)
+                ELSE 0
+            END as tasa_uso
+        FROM sala s
+        LEFT JOIN reserva r ON s.nombre_sala = r.nombre_sala AND s.edificio = r.edificio
+        GROUP BY s.nombre_sala, s.edificio, s.capacidad, s.tipo_sala
+        ORDER BY tasa_uso DESC, total_reservas DESC
+    """,
+}
+
+
+def _encode_value(value):
+    # MySQL hands back Decimal/timedelta/date values; tag them so the
+    # templates get exactly the same types back from a snapshot
+    if isinstance(value, Decimal):
+        return {'__type__': 'decimal', 'value': str(value)}
+    if isinstance(value, timedelta):
+        return {'__type__': 'timedelta', 'value': value.total_seconds()}
+    if isinstance(value, datetime):
+        return {'__type__': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, date):
+        return {'__type__': 'date', 'value': value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in a report snapshot")
+
+
+def _decode_value(obj: Dict):
+    kind = obj.get('__type__')
+    if kind == 'decimal':
+        return Decimal(obj['value'])
+    if kind == 'timedelta':
+        return timedelta(seconds=obj['value'])
+    if kind == 'datetime':
+        return datetime.fromisoformat(obj['value'])
+    if kind == 'date':
+        return date.fromisoformat(obj['value'])
+    return obj
+
+
+def encode_rows(rows: List[Dict]) -> str:
+    """Serialize report rows to JSON, preserving MySQL value types"""
+    return json.dumps(rows, default=_encode_value)
+
+
+def decode_rows(data: str) -> List[Dict]:
+    """Inverse of encode_rows"""
+    return json.loads(data, object_hook=_decode_value)
+
+
+class ReportSnapshotEngine:
+    """Stores and serves pre-computed report results
+
+    Reading a report is one lookup by primary key in report_snapshot,
+    whatever the snapshot's age: `refresh_all` recomputes them on a
+    schedule (the web app's maintenance job, or cron). A read computes a
+    report only when it was never stored or a refresh is forced.
+    """
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._schema_ready = False
+        self._refresh_lock = threading.Lock()
+
+    def ensure_schema(self) -> bool:
+        """Create the report_snapshot table on databases that predate it"""
+        if self._schema_ready:
+            return True
+        result = self.db.execute_query("""
+            CREATE TABLE IF NOT EXISTS report_snapshot (
+                nombre_reporte VARCHAR(64) NOT NULL,
+                datos LONGTEXT NOT NULL,
+                fecha_generacion DATETIME NOT NULL,
+                duracion_ms INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (nombre_reporte)
+            ) ENGINE = InnoDB
+        """)
+        self._schema_ready = result is not None
+        return self._schema_ready
+
+    def _load(self, nombre: str) -> Optional[Dict]:
+        return self.db.execute_fetchone(
+            "SELECT datos, fecha_generacion FROM report_snapshot WHERE nombre_reporte = %s",
+            (nombre,)
+        )
+
+    def refresh(self, nombre: str) -> Optional[Tuple[List[Dict], datetime]]:
+        """Recompute one report and store it, returning (rows, generated_at)"""
+        if nombre not in REPORT_QUERIES:
+            return None
+        started = time.perf_counter()
+        rows = self.db.execute_query(REPORT_QUERIES[nombre], fetch=True)
+        if rows is None:
+            return None
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        generated_at = datetime.now().replace(microsecond=0)
+        self.db.execute_query(
+            """INSERT INTO report_snapshot (nombre_reporte, datos, fecha_generacion, duracion_ms)
+               VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE datos = VALUES(datos),
+                                       fecha_generacion = VALUES(fecha_generacion),
+                                       duracion_ms = VALUES(duracion_ms)""",
+            (nombre, encode_rows(rows), generated_at, duration_ms)
+        )
+        return rows, generated_at
+
+    def get(self, nombre: str, force_refresh: bool = False) -> Tuple[List[Dict], Optional[datetime]]:
+        """Rows of a report and when they were computed
+
+        Falls back to the stored copy if a forced refresh fails; returns
+        ([], None) only when the report has never been computed and cannot be.
+        """
+        requested_at = datetime.now().replace(microsecond=0)
+        snapshot = None if force_refresh else self._load(nombre)
+        if snapshot:
+            return decode_rows(snapshot['datos']), snapshot['fecha_generacion']
+
+        with self._refresh_lock:
+            # Another reader may have computed it while this one waited for the lock
+            snapshot = self._load(nombre)
+            if snapshot and (not force_refresh or snapshot['fecha_generacion'] >= requested_at):
+                return decode_rows(snapshot['datos']), snapshot['fecha_generacion']
+            refreshed = self.refresh(nombre)
+
+        if refreshed:
+            return refreshed
+        if snapshot:
+            return decode_rows(snapshot['datos']), snapshot['fecha_generacion']
+        return [], None
+
+    def refresh_all(self, max_age: float = None) -> Dict[str, Optional[int]]:
+        """Recompute every report (or only those older than `max_age` seconds)
+
+        Returns elapsed ms per recomputed report (None on failure).
+        """
+        nombres = list(REPORT_QUERIES)
+        if max_age is not None:
+            cutoff = datetime.now() - timedelta(seconds=max_age)
+            fresh = {row['nombre_reporte'] for row in self.status() if row['fecha_generacion'] > cutoff}
+            nombres = [nombre for nombre in nombres if nombre not in fresh]
+        timings = {}
+        for nombre in nombres:
+            started = time.perf_counter()
+            with self._refresh_lock:
+                ok = self.refresh(nombre) is not None
+            timings[nombre] = int((time.perf_counter() - started) * 1000) if ok else None
+        return timings
+
+    def status(self) -> List[Dict]:
+        """Generation time and cost of every stored snapshot"""
+        return self.db.execute_query(
+            "SELECT nombre_reporte, fecha_generacion, duracion_ms FROM report_snapshot ORDER BY nombre_reporte",
+            fetch=True
+        ) or []
+
+
+def main():
+    """Refresh every report snapshot (suitable for a cron job)"""
+    db = DatabaseManager(**load_db_config())
+    if not db.connect():
+        raise SystemExit(1)
+    try:
+        for nombre, elapsed in ReportSnapshotEngine(db).refresh_all().items():
+            if elapsed is None:
+                print(f"✗ {nombre}: refresh failed")
+            else:
+                print(f"✓ {nombre}: {elapsed} ms")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
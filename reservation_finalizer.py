@@ -0,0 +1,215 @@
+"""
+Reservation Finalizer
+Job that closes reservations whose turno is over: 'sin asistencia' (with
+sanctions) when attendance was recorded and nobody came, 'finalizada'
+otherwise. The web app runs it from the maintenance scheduler; cron can
+run this module
+"""
+
+import threading
+import time
+from datetime import datetime, date
+from typing import Dict, Optional
+from mysql.connector import Error
+from db_config import load_db_config
+from main import DatabaseManager, ReservationManager
+
+
+JOB_NAME = 'finalizar_reservas'
+# Without an explicit `since`, sanctions start from the day this migration ran
+SINCE_MIGRATION = '011_reserva_asistencia_registrada'
+
+
+class ReservationFinalizer:
+    """Moves expired 'activa' reservations to their final state in batches
+
+    Each batch is one transaction: lock up to `batch_size` expired
+    reservations (SKIP LOCKED, so rows held by an in-flight attendance
+    update are left for the next pass instead of waited on), apply the
+    no-show rule, finalize the rest and advance the checkpoint in
+    job_checkpoint. A run interrupted half-way resumes after the last
+    committed id; a completed pass resets the checkpoint to 0. Concurrent
+    runs (e.g. one per worker process) serialize on the checkpoint row.
+
+    A turno counts as over `grace_minutes` after it ends, which leaves time
+    to record attendance before the no-show rule applies. The rule only
+    sanctions reservations whose attendance was recorded (an unrecorded
+    list is all FALSE) and dated on or after `since`; every other expired
+    reservation is just 'finalizada'. `since` defaults to the day
+    reserva.asistencia_registrada was added, so the first pass never
+    backfills sanctions onto older rows.
+    """
+
+    def __init__(self, db: DatabaseManager, batch_size: int = 500, grace_minutes: int = 120,
+                 since: Optional[date] = None):
+        self.db = db
+        self.batch_size = batch_size
+        self.grace_minutes = grace_minutes
+        self.since = since
+        self.reservation = ReservationManager(db)
+        self._schema_ready = False
+        self._stop = threading.Event()
+        # Optional callable receiving the metrics of every run
+        self.on_run = None
+        self._lock = threading.Lock()
+        self.last_run = None
+        self.totals = {'runs': 0, 'batches': 0, 'finalizadas': 0, 'sin_asistencia': 0, 'errors': 0}
+
+    def ensure_schema(self) -> bool:
+        """Create the job_checkpoint table on databases that predate it"""
+        if self._schema_ready:
+            return True
+        result = self.db.execute_query("""
+            CREATE TABLE IF NOT EXISTS job_checkpoint (
+                nombre_job VARCHAR(64) NOT NULL,
+                ultimo_id INT NOT NULL DEFAULT 0,
+                fecha_actualizacion DATETIME NOT NULL,
+                PRIMARY KEY (nombre_job)
+            ) ENGINE = InnoDB
+        """)
+        self._schema_ready = result is not None
+        return self._schema_ready
+
+    def _checkpoint(self, cursor) -> int:
+        cursor.execute(
+            "SELECT ultimo_id FROM job_checkpoint WHERE nombre_job = %s FOR UPDATE", (JOB_NAME,)
+        )
+        row = cursor.fetchone()
+        return row['ultimo_id'] if row else 0
+
+    def _save_checkpoint(self, cursor, ultimo_id: int):
+        cursor.execute(
+            """INSERT INTO job_checkpoint (nombre_job, ultimo_id, fecha_actualizacion)
+               VALUES (%s, %s, NOW())
+               ON DUPLICATE KEY UPDATE ultimo_id = VALUES(ultimo_id),
+                                       fecha_actualizacion = VALUES(fecha_actualizacion)""",
+            (JOB_NAME, ultimo_id)
+        )
+
+    def _since(self, cursor) -> date:
+        if self.since is not None:
+            return self.since
+        cursor.execute("SELECT DATE(fecha_aplicacion) AS desde FROM schema_migracion WHERE nombre = %s",
+                       (SINCE_MIGRATION,))
+        row = cursor.fetchone()
+        # Not migrated yet (cron against an old schema): nothing before today
+        self.since = row['desde'] if row else date.today()
+        return self.since
+
+    def run_batch(self) -> Dict:
+        """Close one batch in a single transaction, returning its counts"""
+        with self.db.transaction() as cursor:
+            after_id = self._checkpoint(cursor)
+            cursor.execute("""
+                SELECT r.id_reserva
+                FROM reserva r
+                JOIN turno t ON r.id_turno = t.id_turno
+                WHERE r.estado = 'activa'
+                  AND r.fecha <= CURDATE()
+                  AND TIMESTAMP(r.fecha, t.hora_fin) <= NOW() - INTERVAL %s MINUTE
+                  AND r.id_reserva > %s
+                ORDER BY r.id_reserva
+                LIMIT %s
+                FOR UPDATE OF r SKIP LOCKED
+            """, (self.grace_minutes, after_id, self.batch_size))
+            ids = [row['id_reserva'] for row in cursor.fetchall()]
+
+            if not ids:
+                # Pass complete: the next run starts from the beginning again
+                self._save_checkpoint(cursor, 0)
+                return {'reservas': 0, 'finalizadas': 0, 'sin_asistencia': 0, 'done': True}
+
+            sin_asistencia = self.reservation._apply_no_show_rule(cursor, ids, recorded_since=self._since(cursor))
+            resto = [i for i in ids if i not in set(sin_asistencia)]
+            if resto:
+                self.reservation.quota.adjust(cursor, resto, -1)
+                cursor.execute(
+                    f"UPDATE reserva SET estado = 'finalizada' WHERE id_reserva IN ({', '.join(['%s'] * len(resto))})",
+                    tuple(resto)
+                )
+            self._save_checkpoint(cursor, ids[-1])
+            return {'reservas': len(ids), 'finalizadas': len(resto),
+                    'sin_asistencia': len(sin_asistencia), 'done': len(ids) < self.batch_size}
+
+    def run(self, max_batches: int = None) -> Dict:
+        """Process batches until no expired reservation is left (or `max_batches`)"""
+        with self._lock:
+            # A stop() meant for an earlier run must not end this one at once
+            self._stop.clear()
+            started = time.perf_counter()
+            metrics = {'started_at': datetime.now().isoformat(timespec='seconds'),
+                       'batches': 0, 'finalizadas': 0, 'sin_asistencia': 0, 'error': None}
+            try:
+                while max_batches is None or metrics['batches'] < max_batches:
+                    batch = self.run_batch()
+                    if batch['reservas']:
+                        metrics['batches'] += 1
+                        metrics['finalizadas'] += batch['finalizadas']
+                        metrics['sin_asistencia'] += batch['sin_asistencia']
+                    if batch['done'] or self._stop.is_set():
+                        break
+            except Error as e:
+                metrics['error'] = str(e)
+                self.totals['errors'] += 1
+                print(f"✗ Reservation finalizer error: {e}")
+
+            metrics['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self.totals['runs'] += 1
+            for key in ('batches', 'finalizadas', 'sin_asistencia'):
+                self.totals[key] += metrics[key]
+            self.last_run = metrics
+        if self.on_run:
+            self.on_run(metrics)
+        return metrics
+
+    def stats(self, db: DatabaseManager = None) -> Dict:
+        """Cumulative counters, last run metrics and pending backlog
+
+        Pass `db` when calling from another thread than the one running the job.
+        """
+        db = db or self.db
+        pending = db.execute_fetchone("""
+            SELECT COUNT(*) AS pendientes
+            FROM reserva r
+            JOIN turno t ON r.id_turno = t.id_turno
+            WHERE r.estado = 'activa'
+              AND r.fecha <= CURDATE()
+              AND TIMESTAMP(r.fecha, t.hora_fin) <= NOW() - INTERVAL %s MINUTE
+        """, (self.grace_minutes,))
+        checkpoint = db.execute_fetchone(
+            "SELECT ultimo_id, fecha_actualizacion FROM job_checkpoint WHERE nombre_job = %s", (JOB_NAME,)
+        )
+        return {
+            'running': self._lock.locked(),
+            'batch_size': self.batch_size,
+            'grace_minutes': self.grace_minutes,
+            'since': self.since.isoformat() if self.since else None,
+            'pending': pending['pendientes'] if pending else None,
+            'checkpoint': checkpoint['ultimo_id'] if checkpoint else 0,
+            'last_run': self.last_run,
+            'totals': dict(self.totals),
+        }
+
+    def stop(self):
+        """Make a run in progress end after the current batch; the next run() starts afresh"""
+        self._stop.set()
+
+
+def main():
+    """Run one finalizer pass (suitable for a cron job)"""
+    db = DatabaseManager(**load_db_config())
+    if not db.connect():
+        raise SystemExit(1)
+    try:
+        metrics = ReservationFinalizer(db).run()
+        if metrics['error']:
+            print(f"✗ Finalizer failed: {metrics['error']}")
+        else:
+            print(f"✓ {metrics['finalizadas']} finalizada(s), {metrics['sin_asistencia']} sin asistencia "
+                  f"in {metrics['batches']} batch(es), {metrics['duration_ms']} ms")
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Role Cache
+Keeps each participant's program affiliations in memory so role checks
+don't query participante_programa_academico on every request
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict
+from main import AuthManager
+
+
+class RoleCache:
+    """TTL/LRU cache of AuthManager.get_user_roles keyed by ci
+
+    Writes to a participant's programs go through DatabaseService, which
+    calls `invalidate(ci)`. Entries expire after `ttl` seconds so changes
+    made by other worker processes are picked up. Users without any
+    program are cached too (as an empty list).
+    """
+
+    def __init__(self, auth: AuthManager, max_entries: int = 10000, ttl: float = 300.0):
+        self.auth = auth
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def roles(self, ci: str) -> List[Dict]:
+        """All affiliations of a participant, highest privilege first"""
+        with self._lock:
+            entry = self._entries.get(ci)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(ci)
+                self.hits += 1
+                return [dict(role) for role in entry[0]]
+            self.misses += 1
+
+        roles = self.auth.get_user_roles(ci)
+        with self._lock:
+            self._entries[ci] = (roles, time.monotonic() + self.ttl)
+            self._entries.move_to_end(ci)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [dict(role) for role in roles]
+
+    def primary(self, ci: str) -> Optional[Dict]:
+        """The affiliation that decides room access, or None without programs"""
+        roles = self.roles(ci)
+        return roles[0] if roles else None
+
+    def invalidate(self, ci: str = None):
+        """Forget one participant (or everyone)"""
+        with self._lock:
+            if ci is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ci, None)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -26,6 +26,14 @@ if errorlevel 1 (
     exit /b 1
 )
 
+REM Apply pending migrations and seed empty reference tables
+python migrate.py --seed
+if errorlevel 1 (
+    echo ERROR: Database migration failed!
+    pause
+    exit /b 1
+)
+
 REM Run the Flask application
 echo Starting Flask application...
 echo.
@@ -1,5 +1,5 @@
 #!/bin/bash
 # Script to run the Flask web application with the correct virtual environment
 cd "$(dirname "$0")"
-./venv/bin/python app.py
+./venv/bin/python migrate.py --seed && ./venv/bin/python app.py
 
@@ -119,8 +119,10 @@ CREATE TABLE IF NOT EXISTS `reserva` (
   `fecha` DATE NOT NULL,
   `id_turno` INT NOT NULL, -- Clave Foránea 3/3.
   `estado` ENUM('activa', 'cancelada', 'sin asistencia', 'finalizada') NOT NULL,
+  `asistencia_registrada` DATETIME NULL, -- Última vez que se registró la asistencia; NULL si nunca se registró.
+  `slot_activo` TINYINT AS (IF(`estado` = 'activa', 1, NULL)) VIRTUAL INVISIBLE, -- 1 solo en reservas activas.
   PRIMARY KEY (`id_reserva`),
-  UNIQUE KEY `uk_reserva_sala_fecha_turno` (`nombre_sala`, `edificio`, `fecha`, `id_turno`), -- Una sala solo se puede reservar una vez por turno en un día.
+  UNIQUE KEY `uk_reserva_slot_activo` (`nombre_sala`, `edificio`, `fecha`, `id_turno`, `slot_activo`), -- Una sala solo puede tener una reserva activa por turno en un día; las canceladas (NULL) no bloquean el turno.
   FOREIGN KEY (`nombre_sala`, `edificio`)
     REFERENCES `sala` (`nombre_sala`, `edificio`)
     ON DELETE RESTRICT
@@ -188,6 +190,104 @@ CREATE TABLE IF NOT EXISTS `access_token` (
   INDEX `idx_participante` (`ci_participante`) -- Índice para búsquedas por participante
 ) ENGINE = InnoDB;
 
+-- -----------------------------------------------------
+-- Tabla `report_snapshot`
+-- Resultados precalculados de los reportes administrativos
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `report_snapshot` (
+  `nombre_reporte` VARCHAR(64) NOT NULL, -- Nombre del reporte (clave de REPORT_QUERIES)
+  `datos` LONGTEXT NOT NULL, -- Filas del reporte serializadas en JSON
+  `fecha_generacion` DATETIME NOT NULL, -- Momento en que se calcularon los datos
+  `duracion_ms` INT NOT NULL DEFAULT 0, -- Tiempo que tomó calcular el reporte
+  PRIMARY KEY (`nombre_reporte`)
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `job_checkpoint`
+-- Progreso de los procesos por lotes (permite reanudarlos)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `job_checkpoint` (
+  `nombre_job` VARCHAR(64) NOT NULL, -- Nombre del proceso
+  `ultimo_id` INT NOT NULL DEFAULT 0, -- Último id procesado y confirmado
+  `fecha_actualizacion` DATETIME NOT NULL,
+  PRIMARY KEY (`nombre_job`)
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `cuota_diaria`
+-- Reservas activas por participante, edificio y día (límite de 2 horas diarias)
+-- Se mantiene en las mismas transacciones que modifican `reserva`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cuota_diaria` (
+  `ci_participante` VARCHAR(15) NOT NULL, -- Clave primaria compuesta 1/3 y Clave Foránea.
+  `edificio` VARCHAR(50) NOT NULL, -- Clave primaria compuesta 2/3.
+  `fecha` DATE NOT NULL, -- Clave primaria compuesta 3/3.
+  `reservas_activas` INT NOT NULL DEFAULT 0, -- Cantidad de reservas en estado 'activa'
+  PRIMARY KEY (`ci_participante`, `edificio`, `fecha`),
+  FOREIGN KEY (`ci_participante`)
+    REFERENCES `participante` (`ci`)
+    ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `cuota_semanal`
+-- Reservas activas por participante y semana ISO (límite de 3 semanales)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `cuota_semanal` (
+  `ci_participante` VARCHAR(15) NOT NULL, -- Clave primaria compuesta 1/2 y Clave Foránea.
+  `semana` INT NOT NULL, -- YEARWEEK(fecha, 3), por ejemplo 202503. Clave primaria compuesta 2/2.
+  `reservas_activas` INT NOT NULL DEFAULT 0, -- Cantidad de reservas en estado 'activa'
+  PRIMARY KEY (`ci_participante`, `semana`),
+  FOREIGN KEY (`ci_participante`)
+    REFERENCES `participante` (`ci`)
+    ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `reserva_idempotencia`
+-- Claves de los formularios de reserva: reenviar el mismo formulario devuelve
+-- las reservas ya creadas en lugar de duplicarlas. Se borran pasadas
+-- IDEMPOTENCY_KEY_TTL_HOURS horas (tarea de mantenimiento)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `reserva_idempotencia` (
+  `clave` VARCHAR(64) NOT NULL,
+  `id_reserva` INT NOT NULL,
+  `ci_solicitante` VARCHAR(15) NOT NULL,
+  `huella` CHAR(64) NOT NULL DEFAULT '', -- SHA-256 de sala, edificio, turnos y participantes pedidos
+  `fecha_creacion` DATETIME NOT NULL,
+  PRIMARY KEY (`clave`, `id_reserva`),
+  INDEX `idx_reserva_idempotencia_fecha` (`fecha_creacion`),
+  FOREIGN KEY (`id_reserva`)
+    REFERENCES `reserva` (`id_reserva`)
+    ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `token_revocado`
+-- Revocaciones de los tokens firmados (TOKEN_MODE=signed): un token (tipo 'token',
+-- clave = jti) o todos los emitidos a un participante hasta `marca_ms` (tipo 'ci')
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `token_revocado` (
+  `id` INT NOT NULL AUTO_INCREMENT, -- Clave primaria.
+  `tipo` ENUM('token', 'ci') NOT NULL,
+  `clave` VARCHAR(64) NOT NULL, -- jti del token o CI del participante
+  `marca_ms` BIGINT NOT NULL, -- Emisión del token / momento de la revocación (epoch ms)
+  `expira` DATETIME NOT NULL, -- A partir de aquí la fila ya no cubre tokens vigentes
+  PRIMARY KEY (`id`),
+  INDEX `idx_token_revocado_expira` (`expira`)
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Tabla `schema_migracion`
+-- Migraciones aplicadas por migrate.py (cada una se ejecuta una sola vez)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `schema_migracion` (
+  `nombre` VARCHAR(64) NOT NULL,
+  `fecha_aplicacion` DATETIME NOT NULL,
+  `duracion_ms` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`nombre`)
+) ENGINE = InnoDB;
+
 -- -----------------------------------------------------
 -- Configuración inicial de administradores
 -- Establece el usuario con email "matipousi22@gmail.com" como administrador
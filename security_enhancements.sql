@@ -238,6 +238,9 @@ CREATE INDEX `idx_reserva_fecha` ON `reserva` (`fecha`);
 -- Índice para búsquedas de reservas por estado
 CREATE INDEX `idx_reserva_estado` ON `reserva` (`estado`);
 
+-- Índice para el cierre automático de reservas vencidas (estado activa + fecha pasada)
+CREATE INDEX `idx_reserva_estado_fecha` ON `reserva` (`estado`, `fecha`);
+
 -- Índice compuesto para búsquedas de salas por edificio y tipo
 CREATE INDEX `idx_sala_edificio_tipo` ON `sala` (`edificio`, `tipo_sala`);
 
@@ -247,6 +250,10 @@ CREATE INDEX `idx_sala_edificio_tipo` ON `sala` (`edificio`, `tipo_sala`);
 -- Índice para búsquedas de sanciones activas
 CREATE INDEX `idx_sancion_fecha_fin` ON `sancion_participante` (`fecha_fin`);
 
+-- Índices para la paginación de los listados de administración
+CREATE INDEX `idx_sancion_fecha_inicio` ON `sancion_participante` (`fecha_inicio`);
+CREATE INDEX `idx_participante_apellido_nombre` ON `participante` (`apellido`, `nombre`);
+
 -- Índice para búsquedas de reservas por participante
 CREATE INDEX `idx_reserva_participante_ci` ON `reserva_participante` (`ci_participante`);
 
@@ -0,0 +1,198 @@
+"""
+Signed Access Tokens
+Self-contained HMAC-SHA256 tokens carrying the user's CI, admin flag,
+names and expiry, verified without touching the database, and the
+revocation list that replaces deleting rows from access_token
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict
+
+from main import DatabaseManager
+
+TOKEN_PREFIX = 'v1'
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class TokenSigner:
+    """Issues and verifies `v1.<payload>.<signature>` tokens
+
+    The payload is compact JSON: ci, adm (admin flag), n/a/e (nombre,
+    apellido, email as of login), iat/exp (epoch milliseconds) and jti
+    (random id used to revoke one token).
+    """
+
+    def __init__(self, secret: bytes, ttl: timedelta = timedelta(days=7)):
+        self.secret = secret
+        self.ttl = ttl
+
+    def _sign(self, body: str) -> str:
+        return _b64encode(hmac.new(self.secret, body.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, user: Dict) -> str:
+        """New token for a user dict (ci, is_admin, nombre, apellido, email)"""
+        now = _now_ms()
+        claims = {
+            'ci': user['ci'], 'adm': bool(user.get('is_admin')),
+            'n': user.get('nombre'), 'a': user.get('apellido'), 'e': user.get('email'),
+            'iat': now, 'exp': now + int(self.ttl.total_seconds() * 1000),
+            'jti': secrets.token_urlsafe(12),
+        }
+        body = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        return f"{TOKEN_PREFIX}.{body}.{self._sign(body)}"
+
+    def decode(self, token: str, verify_expiry: bool = True) -> Optional[Dict]:
+        """Claims of a correctly signed token, or None (also when expired, unless told not to check)"""
+        try:
+            prefix, body, signature = token.split('.')
+        except ValueError:
+            return None
+        if prefix != TOKEN_PREFIX or not hmac.compare_digest(signature, self._sign(body)):
+            return None
+        try:
+            claims = json.loads(_b64decode(body))
+        except (binascii.Error, ValueError):
+            return None
+        if verify_expiry and claims.get('exp', 0) <= _now_ms():
+            return None
+        return claims
+
+    @staticmethod
+    def user(claims: Dict) -> Dict:
+        """The user dict stored in the session, from a token's claims"""
+        return {'ci': claims['ci'], 'nombre': claims['n'], 'apellido': claims['a'],
+                'email': claims['e'], 'is_admin': claims['adm']}
+
+    @staticmethod
+    def expires_at(claims: Dict) -> datetime:
+        return datetime.fromtimestamp(claims['exp'] / 1000)
+
+
+class RevocationList:
+    """Revoked token ids and per-participant cut-offs, mirrored from token_revocado
+
+    A 'token' row revokes one jti; a 'ci' row revokes every token of that
+    participant issued up to its `marca_ms`. Revocations made in this
+    process apply immediately; those made by other workers are picked up
+    by refresh(), which runs at most every `refresh_interval` seconds (from
+    is_revoked()) and reloads every unexpired row. Rows whose tokens have
+    all expired are deleted by the maintenance job, so the table stays small.
+    """
+
+    # Seconds an own revocation is re-applied over a reload that may have
+    # been read before its INSERT committed
+    LOCAL_GRACE = 60.0
+
+    def __init__(self, db: DatabaseManager, token_ttl: timedelta = timedelta(days=7),
+                 refresh_interval: float = 30.0):
+        self.db = db
+        self.token_ttl = token_ttl
+        self.refresh_interval = refresh_interval
+        self._tokens = {}       # jti -> expiry (epoch ms)
+        self._cutoffs = {}      # ci -> (revoked up to, expiry) (epoch ms)
+        self._local = []        # (monotonic time, tipo, clave, marca_ms, expira_ms) made here
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def ensure_schema(self) -> bool:
+        """Create the token_revocado table on databases that predate it"""
+        if self._schema_ready:
+            return True
+        result = self.db.execute_query("""
+            CREATE TABLE IF NOT EXISTS token_revocado (
+                id INT NOT NULL AUTO_INCREMENT,
+                tipo ENUM('token', 'ci') NOT NULL,
+                clave VARCHAR(64) NOT NULL,
+                marca_ms BIGINT NOT NULL,
+                expira DATETIME NOT NULL,
+                PRIMARY KEY (id),
+                INDEX idx_token_revocado_expira (expira)
+            ) ENGINE = InnoDB
+        """)
+        self._schema_ready = result is not None
+        return self._schema_ready
+
+    def _apply(self, tipo: str, clave: str, marca_ms: int, expira_ms: int):
+        if tipo == 'token':
+            self._tokens[clave] = expira_ms
+        elif marca_ms > self._cutoffs.get(clave, (0, 0))[0]:
+            self._cutoffs[clave] = (marca_ms, expira_ms)
+
+    def _store(self, tipo: str, clave: str, marca_ms: int, expira_ms: int) -> bool:
+        with self._lock:
+            self._apply(tipo, clave, marca_ms, expira_ms)
+            self._local.append((time.monotonic(), tipo, clave, marca_ms, expira_ms))
+        return self.db.execute_query(
+            "INSERT INTO token_revocado (tipo, clave, marca_ms, expira) VALUES (%s, %s, %s, %s)",
+            (tipo, clave, marca_ms, datetime.fromtimestamp(expira_ms / 1000))
+        ) is not None
+
+    def revoke_token(self, claims: Dict) -> bool:
+        """Revoke one token (logout)"""
+        return self._store('token', claims['jti'], claims['iat'], claims['exp'])
+
+    def revoke_ci(self, ci: str) -> bool:
+        """Revoke every token issued to a participant so far"""
+        now = _now_ms()
+        return self._store('ci', ci, now, now + int(self.token_ttl.total_seconds() * 1000))
+
+    def refresh(self) -> bool:
+        """Reload every unexpired revocation
+
+        Not incremental by id: AUTO_INCREMENT ids can commit out of order,
+        and a row committed behind one already read would be missed for good.
+        """
+        rows = self.db.execute_query(
+            "SELECT tipo, clave, marca_ms, expira FROM token_revocado WHERE expira > NOW()", fetch=True
+        )
+        if rows is None:
+            return False
+        now, since = _now_ms(), time.monotonic() - self.LOCAL_GRACE
+        with self._lock:
+            self._tokens, self._cutoffs = {}, {}
+            for row in rows:
+                self._apply(row['tipo'], row['clave'], row['marca_ms'], int(row['expira'].timestamp() * 1000))
+            self._local = [entry for entry in self._local if entry[0] >= since and entry[4] > now]
+            for entry in self._local:
+                self._apply(*entry[1:])
+        return True
+
+    def is_revoked(self, claims: Dict) -> bool:
+        """Whether a verified token was revoked (refreshing first when due)"""
+        now = time.monotonic()
+        with self._lock:
+            due = now >= self._next_refresh
+            if due:
+                self._next_refresh = now + self.refresh_interval
+        if due:
+            self.refresh()
+        with self._lock:
+            if claims['jti'] in self._tokens:
+                return True
+            cutoff = self._cutoffs.get(claims['ci'])
+            return cutoff is not None and claims['iat'] <= cutoff[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'tokens': len(self._tokens), 'participants': len(self._cutoffs),
+                    'refresh_interval': self.refresh_interval}
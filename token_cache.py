@@ -0,0 +1,98 @@
+"""
+Access Token Cache
+Keeps validated access tokens in memory so requests don't hit the
+access_token table every time
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, List, Dict
+
+
+class TokenCache:
+    """TTL/LRU cache of validated tokens keyed by token hash
+
+    Besides caching, it collects which tokens were used so that the
+    `ultimo_acceso` column can be updated in one batched statement every
+    `flush_interval` seconds instead of once per request.
+
+    Entries live at most `ttl` seconds, so a revocation done by another
+    worker process is picked up within that time; revocations in this
+    process evict immediately.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0, flush_interval: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()
+        self._touched = set()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash: str) -> Optional[Dict]:
+        """Cached user info for a token, or None if absent/expired"""
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, cached_until, fecha_expiracion = entry
+            if time.monotonic() > cached_until or datetime.now() >= fecha_expiracion:
+                del self._entries[token_hash]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return dict(user)
+
+    def put(self, token_hash: str, user: Dict, fecha_expiracion: datetime):
+        """Cache a validated token until the TTL or its own expiry, whichever is first"""
+        with self._lock:
+            self._entries[token_hash] = (dict(user), time.monotonic() + self.ttl, fecha_expiracion)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, token_hash: str):
+        """Drop a token (used on revoke/logout)"""
+        with self._lock:
+            self._entries.pop(token_hash, None)
+            self._touched.discard(token_hash)
+
+    def evict_ci(self, ci: str):
+        """Drop every cached token belonging to a participant"""
+        with self._lock:
+            for token_hash in [h for h, (user, _, _) in self._entries.items() if user['ci'] == ci]:
+                del self._entries[token_hash]
+                self._touched.discard(token_hash)
+
+    def touch(self, token_hash: str):
+        """Remember that a token was used since the last flush"""
+        with self._lock:
+            self._touched.add(token_hash)
+
+    def drain_touched(self, force: bool = False) -> List[str]:
+        """Token hashes to flush to `ultimo_acceso`, if a flush is due"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_flush < self.flush_interval:
+                return []
+            self._last_flush = now
+            touched = list(self._touched)
+            self._touched.clear()
+            return touched
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'pending_touches': len(self._touched),
+                'hits': self.hits,
+                'misses': self.misses,
+            }